@@ -0,0 +1,77 @@
+"""
+Benchmark of the market basket analysis (Core/basket.py) against the usual
+pandas approach, a self-merge of the (invoice, product) lines on InvoiceNo
+that materializes every pair of every invoice before counting them. The
+transactions are generated directly with the catalogue size as a parameter
+and some products planted as bundles bought together, so larger catalogues
+can be tested. Both pair counts are checked to agree, and the memory of the
+sparse incidence matrix is set against the dense matrix and the merged pairs.
+
+    python -m Benchmarks.bench_basket --rows 400k --products 4k
+    python -m Benchmarks.bench_basket --rows 10M --products 100k --naive-limit 2M
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from Core.basket import MarketBasket, MIN_SUPPORT
+from Core.synthetic import parse_size
+from Core.utils import Utils
+
+def transactions(rows, products, seed):
+    #invoices of about 20 lines with zipf-like product popularity, a tenth of the lines complete a bundle of 4 products
+    rng = np.random.default_rng(seed)
+    invoice = np.cumsum(rng.random(rows) < 0.05)
+    weights = 1.0 / np.arange(1, products + 1) ** 0.9
+    product = rng.choice(products, rows, p=weights / weights.sum())
+    bundled = rng.random(rows) < 0.1
+    product[bundled] = product[bundled] // 4 * 4 + rng.integers(0, 4, bundled.sum())
+    codes = pd.Categorical.from_codes(product, (21000 + np.arange(products)).astype(str))
+    return pd.DataFrame({"InvoiceNo": pd.Categorical((536365 + invoice).astype(str)), "StockCode": codes, "Description": codes})
+
+
+def naive(dataframe, min_support):
+    lines = dataframe[["InvoiceNo", "StockCode"]].astype(str).drop_duplicates()
+    invoices = lines["InvoiceNo"].nunique()
+    min_count = max(np.ceil(min_support * invoices), 2)
+    pairs = lines.merge(lines, on="InvoiceNo")
+    pairs = pairs[pairs["StockCode_x"] < pairs["StockCode_y"]]
+    counts = pairs.groupby(["StockCode_x", "StockCode_y"]).size()
+    return counts[counts >= min_count], len(pairs)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sparse market basket analysis against a pandas self-merge")
+    parser.add_argument("--rows", type=parse_size, default=parse_size("400k"))
+    parser.add_argument("--products", type=parse_size, default=parse_size("4k"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-support", type=float, default=MIN_SUPPORT)
+    parser.add_argument("--naive-limit", type=parse_size, default=parse_size("2M"), help="only run the self-merge up to this many rows")
+    args = parser.parse_args()
+    dataframe = transactions(args.rows, args.products, args.seed)
+    basket, seconds = timed(MarketBasket, dataframe, args.min_support)
+    rules = basket.rules()
+    print(f"{args.rows:,} rows, {basket.invoices:,} invoices, {len(basket.item_ids):,} products, {len(basket.frequent):,} above the minimum support")
+    print(f"  sparse incidence + product {seconds:>10.3f} s, {len(rules):,} pairs")
+    print(f"  incidence matrix           {Utils.size_format(basket.nbytes):>12} sparse, {Utils.size_format(basket.invoices * len(basket.item_ids)):>12} dense (1 byte a cell)")
+    if args.rows > args.naive_limit:
+        print("  pandas self-merge             skipped")
+        return
+    (counts, merged), naive_seconds = timed(naive, dataframe, args.min_support)
+    print(f"  pandas self-merge          {naive_seconds:>10.3f} s, {merged:,} pair rows materialized ({naive_seconds / seconds:.1f}x slower)")
+    codes = basket.item_ids.astype(str).to_numpy()
+    a, b = codes[basket.pair_items[0]], codes[basket.pair_items[1]]
+    fast = pd.Series(basket.pair_counts, index=pd.MultiIndex.from_arrays([np.where(a < b, a, b), np.where(a < b, b, a)])).sort_index()
+    counts = counts.sort_index()
+    assert fast.index.equals(counts.index) and (fast.to_numpy() == counts.to_numpy()).all(), "the pair counts differ"
+    print("  identical pair counts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark of the batched monthly revenue forecasts (Core/forecast.py)
+against fitting one series at a time, the usual loop over the countries and
+products. The synthetic series mix a level, a trend, a yearly season and
+noise in random proportions, so each of the models wins somewhere. Both
+must choose the same model and give the same forecasts and bands.
+
+    python -m Benchmarks.bench_forecast --series 5k --months 24
+    python -m Benchmarks.bench_forecast --series 100k --months 36 --naive-limit 5k
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from Core.forecast import SeriesForecast, MODELS, SEASON
+from Core.synthetic import parse_size
+
+def monthly_series(series, months, seed):
+    rng = np.random.default_rng(seed)
+    t = np.arange(months)
+    level = rng.lognormal(8, 1, (series, 1))
+    trend = rng.normal(0, 0.02, (series, 1)) * level * t
+    season = rng.uniform(0, 0.5, (series, 1)) * level * np.sin(2 * np.pi * (t + rng.integers(0, SEASON, (series, 1))) / SEASON)
+    noise = rng.uniform(0.02, 0.4, (series, 1)) * level * rng.standard_normal((series, months))
+    return np.maximum(level + trend + season + noise, 0)
+
+
+def one_at_a_time(values, first):
+    forecasts = [SeriesForecast(row[None, :], first) for row in values]
+    return {field: np.concatenate([getattr(forecast, field) for forecast in forecasts]) for field in ["model", "forecast", "lower", "upper"]}
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batched monthly forecasts against a per-series loop")
+    parser.add_argument("--series", type=parse_size, default=parse_size("5k"))
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--naive-limit", type=parse_size, default=parse_size("20k"), help="only run the per-series loop up to this many series")
+    args = parser.parse_args()
+    values = monthly_series(args.series, args.months, args.seed)
+    first = 2010 * 12 + 11
+    batch, seconds = timed(SeriesForecast, values, first)
+    models = pd.Series(np.array(MODELS)[batch.model]).value_counts()
+    print(f"{args.series:,} series of {args.months} months, {batch.horizon} forecast, backtested over {len(batch.origins)} origins")
+    print(f"  batched       {seconds:>10.3f} s  " + ", ".join(f"{model} {models.get(model, 0):,}" for model in MODELS))
+    if args.series > args.naive_limit:
+        print("  one at a time    skipped")
+        return
+    single, single_seconds = timed(one_at_a_time, values, first)
+    print(f"  one at a time {single_seconds:>10.3f} s  ({single_seconds / seconds:.1f}x slower)")
+    assert (single["model"] == batch.model).all(), "the chosen models differ"
+    for field in ["forecast", "lower", "upper"]:
+        assert np.allclose(single[field], getattr(batch, field)), f"the {field} values differ"
+    print("  identical models, forecasts and bands")
+
+
+if __name__ == "__main__":
+    main()
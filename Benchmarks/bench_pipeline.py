@@ -0,0 +1,182 @@
+"""
+Benchmark of the whole report pipeline on synthetic data: ingest, clean,
+features, KPIs, each plot and the Level 3 PDF build are timed and memory
+profiled at every requested size. Runs fully offline; the generated data is
+kept under --data-dir and reused. Results are written as JSON and can be
+compared with the results of another commit.
+
+    python -m Benchmarks.bench_pipeline --sizes 10k 1M 50M
+    python -m Benchmarks.bench_pipeline --sizes 10k --compare Data/Benchmarks/pipeline_1f885ba.json
+    python -m Benchmarks.bench_pipeline --sizes 10k 1M --chart-format vector
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from Core.data_loader import DataLoader
+from Core.streaming import StreamingLoader
+from Core.synthetic import SyntheticRetail, parse_size
+from Core.plots import Plots
+from Core.plot_specs import LEVEL_2_PLOTS, LEVEL_3_PLOTS
+from Core.vector import ChartDrawing
+from Core.report_generator import ReportGenerator
+from Core.metrics import peak_rss, reset_peak_rss
+
+class FrameLoader(DataLoader):
+    #DataLoader over an already read frame, without the download and the excel read
+    def __init__(self, dataframe):
+        self.frame = dataframe
+        super().__init__(plot_workers=1, plot_cache=False)
+
+    def read_data(self):
+        dataframe, self.frame = self.frame, None
+        return dataframe
+
+
+class StageRecorder:
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        record = {"stage": name, "rows": rows}
+        reset_peak_rss()
+        rss_before = peak_rss()
+        if self.trace_memory:
+            tracemalloc.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - wall, 4)
+            record["cpu_seconds"] = round(time.process_time() - cpu, 4)
+            if self.trace_memory:
+                record["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+                tracemalloc.stop()
+            record["peak_rss_mb"] = round(peak_rss() / 2**20, 2)
+            record["peak_rss_delta_mb"] = round((peak_rss() - rss_before) / 2**20, 2)
+            self.stages.append(record)
+            print(f"  {name:<44}{record['seconds']:>10.3f} s{record['peak_rss_delta_mb']:>10.1f} MB")
+
+
+def data_file(data_dir, rows, seed, recorder):
+    extension = "parquet"
+    try:
+        import pyarrow
+    except ImportError:
+        extension = "csv.gz"
+    path = os.path.join(data_dir, f"retail_{rows}_{seed}.{extension}")
+    if not os.path.exists(path):
+        with recorder.stage("generate", rows):
+            SyntheticRetail(rows, seed).write(path)
+    return path
+
+
+def run_size(rows, args, workdir):
+    recorder = StageRecorder(args.trace_memory)
+    path = data_file(args.data_dir, rows, args.seed, recorder)
+    if rows <= args.in_memory_limit:
+        with recorder.stage("ingest", rows):
+            dataframe = DataLoader.compact(pd.concat(StreamingLoader.read_chunks(path, args.chunk_size)))
+        loader = FrameLoader(dataframe)
+        #the pipeline nodes one at a time, in the order a Level 3 report pulls them
+        with recorder.stage("clean", rows) as record:
+            record["rows_out"] = len(loader.pipeline["clean"])
+        with recorder.stage("features", record["rows_out"]):
+            loader.pipeline["features"]
+        with recorder.stage("periods", record["rows_out"]):
+            loader.pipeline["periods"]
+    else:
+        #a frame of this size does not fit in memory, the streaming path covers ingest to aggregation
+        with recorder.stage("stream", rows):
+            loader = StreamingLoader(path, chunksize=args.chunk_size, plot_workers=1, plot_cache=False)
+    with recorder.stage("kpis", rows):
+        level_1_data = loader._handle_level_1()
+    with recorder.stage("aggregate", rows):
+        plot_data = loader.plot_data(LEVEL_2_PLOTS + LEVEL_3_PLOTS)
+    plots = {}
+    for name in LEVEL_2_PLOTS + LEVEL_3_PLOTS:
+        params = Plots.params(name, args.chart_format)
+        with recorder.stage(f"plot:{name}", len(plot_data[name])):
+            if args.chart_format == "vector":
+                buffer = io.BytesIO()
+                getattr(Plots, name)(plot_data[name], buffer, params)
+                plots[name] = ChartDrawing.from_bytes(buffer.getvalue())
+            else:
+                plots[name] = os.path.join(workdir, f"{name}.png")
+                getattr(Plots, name)(plot_data[name], plots[name], params)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with recorder.stage("pdf:level_3"):
+            ReportGenerator(3, level_1_data, {name: plots[name] for name in LEVEL_2_PLOTS}, {name: plots[name] for name in LEVEL_3_PLOTS})
+    finally:
+        os.chdir(cwd)
+    return {"rows": rows, "total_seconds": round(sum(stage["seconds"] for stage in recorder.stages if stage["stage"] != "generate"), 4), "stages": recorder.stages}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    print(f"\nCompared with {baseline['environment']['commit']} (ratio < 1 is faster now)")
+    for size, result in results["sizes"].items():
+        before = {stage["stage"]: stage for stage in baseline["sizes"].get(size, {}).get("stages", [])}
+        for stage in result["stages"]:
+            if stage["stage"] in before and before[stage["stage"]]["seconds"]:
+                print(f"  {size:>12} {stage['stage']:<44}{stage['seconds'] / before[stage['stage']]['seconds']:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the report pipeline on synthetic data")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "1M", "50M"], help="row counts, e.g. 10k 1M 50M")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="rows per chunk when reading or streaming")
+    parser.add_argument("--in-memory-limit", type=parse_size, default=parse_size("5M"), help="larger sizes go through the streaming loader")
+    parser.add_argument("--data-dir", default="./Data/Synthetic")
+    parser.add_argument("--output", help="JSON results path (default ./Data/Benchmarks/pipeline_<commit>.json)")
+    parser.add_argument("--compare", metavar="JSON", help="results of an earlier run to compare against")
+    parser.add_argument("--chart-format", choices=["png", "vector"], default="png", help="draw the charts as PNG files or as in-memory vector drawings")
+    parser.add_argument("--trace-memory", action="store_true", help="also record the tracemalloc peak, which slows allocation heavy stages")
+    args = parser.parse_args()
+    results = {"environment": environment(), "seed": args.seed, "chart_format": args.chart_format, "sizes": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            rows = parse_size(size)
+            print(f"{rows:,} rows")
+            results["sizes"][str(rows)] = run_size(rows, args, workdir)
+    if args.compare:
+        compare(results, args.compare)
+    output = args.output or os.path.join("./Data/Benchmarks", f"pipeline_{results['environment']['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
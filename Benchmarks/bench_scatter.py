@@ -0,0 +1,72 @@
+"""
+Benchmark of the density-aware thinning of the Quantity vs Revenue scatter
+(Core/density.py) on synthetic data: the time to select the points and draw
+the chart, thinned and with every point, the points drawn and how well the
+thinned chart keeps the full one (occupied cells covered, and the
+correlation of the per-cell point counts on a log scale).
+
+    python -m Benchmarks.bench_scatter --sizes 100k 1M
+    python -m Benchmarks.bench_scatter --sizes 10M --full-limit 1M
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from Core.aggregation import AggregationPlanner
+from Core.data_loader import DataLoader
+from Core.density import grid_cells
+from Core.plots import Plots
+from Core.synthetic import SyntheticRetail, parse_size
+
+SCATTER = "top_10_country_qunatity_vs_revenue"
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def cell_counts(points):
+    groups = points["Country"].astype("category").cat.codes.to_numpy()
+    return np.unique(groups.astype(np.int64) * 10**6 + grid_cells(points["Quantity"], points["Revenue"]), return_counts=True)
+
+
+def run_size(rows, args, workdir):
+    raw = SyntheticRetail(rows, args.seed).frame()
+    features = DataLoader.add_features(DataLoader.clean(raw))
+    result = {"rows": rows}
+    for cap in [args.scatter_cap, 0]:
+        label = "thinned" if cap else "full"
+        points, select = timed(AggregationPlanner(features, raw, cap).quantity_revenue)
+        result[label] = {"points": len(points), "select_seconds": round(select, 3)}
+        if cap or len(points) <= args.full_limit:
+            _, draw = timed(getattr(Plots, SCATTER), points, os.path.join(workdir, f"{label}.png"), Plots.params(SCATTER))
+            result[label]["draw_seconds"] = round(draw, 3)
+        result[label]["cells"] = cell_counts(points)
+    (thinned_cells, thinned_counts), (full_cells, full_counts) = result["thinned"].pop("cells"), result["full"].pop("cells")
+    result["cell_coverage"] = round(np.isin(full_cells, thinned_cells).mean(), 4)
+    #where the points pile up: per-cell counts, log scaled like the eye reads marker density
+    shared = np.isin(full_cells, thinned_cells)
+    result["density_correlation"] = round(float(np.corrcoef(np.log1p(full_counts[shared]), np.log1p(thinned_counts))[0, 1]), 4) if shared.sum() > 1 else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the density-aware thinning of the scatter plot")
+    parser.add_argument("--sizes", nargs="+", default=["100k", "1M"], help="row counts, e.g. 100k 1M 10M")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scatter-cap", type=int, default=5000, help="points per country besides one per occupied cell")
+    parser.add_argument("--full-limit", type=parse_size, default=parse_size("2M"), help="only draw the unthinned chart up to this many points")
+    args = parser.parse_args()
+    print(f"{'rows':>12}{'points':>10}{'thinned':>10}{'select s':>10}{'draw s':>10}{'full draw s':>13}{'cells':>8}{'density r':>11}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            result = run_size(parse_size(size), args, workdir)
+            thinned, full = result["thinned"], result["full"]
+            full_draw = f"{full['draw_seconds']:.2f}" if "draw_seconds" in full else "skipped"
+            print(f"{result['rows']:>12,}{full['points']:>10,}{thinned['points']:>10,}{thinned['select_seconds']:>10.3f}{thinned['draw_seconds']:>10.2f}{full_draw:>13}{result['cell_coverage']:>8.1%}{result['density_correlation'] or 0:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
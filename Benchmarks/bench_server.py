@@ -0,0 +1,86 @@
+"""
+Benchmark of the report server (Core/server.py) on synthetic data. The
+server is started in-process; the script times the one-off warm-up (what
+every main.py run pays again), the first and the warm latency of each
+endpoint, concurrent identical requests for a report that is not rendered
+yet (which must share a single render) and the KPI throughput of several
+keep-alive clients.
+
+    python -m Benchmarks.bench_server --rows 100k --workers 2
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from Benchmarks.bench_pipeline import FrameLoader
+from Core.server import ReportServer, CHARTS
+from Core.synthetic import SyntheticRetail, parse_size
+
+def get(connection, path):
+    start = time.perf_counter()
+    connection.request("GET", path)
+    response = connection.getresponse()
+    body = response.read()
+    assert response.status == 200, (path, response.status, body[:200])
+    return body, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the report server on synthetic data")
+    parser.add_argument("--rows", type=parse_size, default=parse_size("100k"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="render processes of the server (default: one per core)")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="KPI requests per client")
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    #the charts and plot cache of the run go to the temporary directory
+    os.chdir(workdir)
+    server = ReportServer(FrameLoader(SyntheticRetail(args.rows, args.seed).frame()), port=0, workers=args.workers, pdf_options={})
+    start = time.perf_counter()
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    if not server.ready.wait(timeout=600):
+        raise SystemExit("The report server did not start")
+    print(f"{args.rows:,} rows, {server.workers} workers")
+    print(f"  warm-up (load, clean, aggregate){time.perf_counter() - start:>14.3f} s")
+    try:
+        connection = http.client.HTTPConnection(server.host, server.port)
+        for path in ["/kpis", f"/charts/{CHARTS[0]}.png", "/reports/level_1.pdf"]:
+            _, first = get(connection, path)
+            warm = [get(connection, path)[1] for _ in range(20)]
+            print(f"  {path:<44}first {first * 1000:>9.1f} ms   warm p50 {np.median(warm) * 1000:>7.2f} ms")
+
+        #identical requests for a report nobody asked for yet share one render
+        def fetch(path):
+            return get(http.client.HTTPConnection(server.host, server.port), path)
+        with ThreadPoolExecutor(args.clients) as clients:
+            start = time.perf_counter()
+            bodies = list(clients.map(fetch, ["/reports/level_3.pdf"] * args.clients))
+        print(f"  {args.clients} concurrent /reports/level_3.pdf      {time.perf_counter() - start:>14.3f} s, {len({body for body, _ in bodies})} distinct PDF")
+
+        def hammer(_):
+            client = http.client.HTTPConnection(server.host, server.port)
+            return [get(client, "/kpis")[1] for _ in range(args.requests)]
+        with ThreadPoolExecutor(args.clients) as clients:
+            start = time.perf_counter()
+            latencies = np.concatenate(list(clients.map(hammer, range(args.clients))))
+        elapsed = time.perf_counter() - start
+        print(f"  /kpis x {len(latencies):,} from {args.clients} clients{'':>12}{len(latencies) / elapsed:>10.0f} req/s, p99 {np.percentile(latencies, 99) * 1000:.2f} ms")
+        metrics = json.loads(get(connection, "/metrics")[0])
+        print(f"  coalesced {metrics['coalesced']}, served from memory {metrics['memory_hits']}, {metrics['requests']} requests")
+        assert metrics["coalesced"] >= args.clients - 1, "concurrent identical reports were rendered more than once"
+    finally:
+        server.stop()
+        thread.join()
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark of the memory-mapped dataset snapshot (Core/snapshot.py) shared by
+worker processes. Several fresh worker processes get the cleaned frame of
+synthetic data either as a pickle (what a process pool does with a frame
+argument) or by attaching the snapshot. Each then reads every column. The
+script prints, for each worker, the startup time and how much its resident
+memory grew. The growth is split into private anonymous pages and pages
+backed by the mapped file, which the page cache shares between processes.
+With the snapshot the private memory must not grow with the data.
+
+    python -m Benchmarks.bench_snapshot --rows 1M --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from Core.data_loader import DataLoader
+from Core.snapshot import Snapshot, MASKED_ARRAYS
+from Core.synthetic import SyntheticRetail, parse_size
+
+def memory():
+    #resident anonymous (private) and file-backed pages, in bytes
+    fields = {}
+    with open("/proc/self/status") as status:
+        for line in status:
+            name, _, value = line.partition(":")
+            if name in ("RssAnon", "RssFile"):
+                fields[name] = int(value.split()[0]) * 1024
+    return fields
+
+
+def touch(frame):
+    #reads every buffer of every column in place, as a report's aggregations would, without temporaries
+    total = 0.0
+    for _, values in frame.items():
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            data = values.array.codes
+        elif isinstance(values.array, MASKED_ARRAYS):
+            data = values.array._data
+        else:
+            data = values.to_numpy()
+        total += float((data.view(np.int64) if data.dtype.kind == "M" else data).sum(dtype=np.float64))
+    return total
+
+
+def load(mode, source):
+    if mode == "pickle":
+        with open(source, "rb") as file:
+            return pickle.load(file)
+    return Snapshot(source).frame("features")
+
+
+def worker(mode, source, warm_up, results):
+    #the code pandas imports lazily on a first frame is loaded with a few rows first, it is not per row
+    touch(load(mode, warm_up))
+    before = memory()
+    start = time.perf_counter()
+    frame = load(mode, source)
+    ready = time.perf_counter() - start
+    checksum = touch(frame)
+    after = memory()
+    results.put((mode, os.getpid(), ready, after["RssAnon"] - before["RssAnon"], after["RssFile"] - before["RssFile"], checksum))
+
+
+def run(mode, source, warm_up, workers):
+    #fresh interpreters, so nothing is inherited from the parent's frame
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(mode, source, warm_up, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-worker memory of the memory-mapped snapshot")
+    parser.add_argument("--rows", type=parse_size, default=parse_size("1M"))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    features = DataLoader.add_revenue(DataLoader.clean(DataLoader.compact(SyntheticRetail(args.rows, args.seed).frame())))
+    size = features.memory_usage(deep=True).sum()
+    mb = 1024 * 1024
+    with tempfile.TemporaryDirectory() as workdir:
+        pickles = {}
+        for name, frame in [("features", features), ("warm_up", features.head(10))]:
+            pickles[name] = os.path.join(workdir, f"{name}.pkl")
+            with open(pickles[name], "wb") as file:
+                pickle.dump(frame, file, protocol=pickle.HIGHEST_PROTOCOL)
+        warm_up = Snapshot.write(os.path.join(workdir, "warm_up.snap"), {"features": features.head(10)})
+        start = time.perf_counter()
+        snapshot = Snapshot.write(os.path.join(workdir, "features.snap"), {"features": features})
+        print(f"{len(features):,} cleaned rows, {size / mb:,.1f} MB in memory, snapshot written in {time.perf_counter() - start:.3f} s ({os.path.getsize(snapshot) / mb:,.1f} MB)")
+        print(f"{'':>10}{'worker':>8}{'ready s':>10}{'private +MB':>13}{'shared +MB':>12}")
+        growth = {}
+        checksums = set()
+        for mode, source, small in [("pickle", pickles["features"], pickles["warm_up"]), ("snapshot", snapshot, warm_up)]:
+            for _, pid, ready, anon, shared, checksum in run(mode, source, small, args.workers):
+                print(f"{mode:>10}{pid:>8}{ready:>10.3f}{anon / mb:>13.1f}{shared / mb:>12.1f}")
+                growth.setdefault(mode, []).append(anon)
+                checksums.add(round(checksum, 3))
+    assert len(checksums) == 1, "the workers did not read the same data"
+    print(f"private memory of {args.workers} workers: {sum(growth['pickle']) / mb:,.1f} MB with pickles, {sum(growth['snapshot']) / mb:,.1f} MB attached to the snapshot")
+    #attaching only decodes the string dictionaries, a small part of a frame copy
+    assert max(growth["snapshot"]) < 0.25 * size, "the private memory of an attached worker grows with the data"
+
+
+if __name__ == "__main__":
+    main()
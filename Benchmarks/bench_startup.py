@@ -0,0 +1,126 @@
+"""
+Startup benchmark of the app, in fresh interpreters on a synthetic workbook:
+time-to-prompt (interpreter start to the menu prompt), time-to-exit for the
+close option and time-to-first-report (to a written Level 1 PDF). A
+`python -X importtime` run of each path then lists its slowest imports and
+the heavy libraries it loads; none should load before the prompt.
+
+    python -m Benchmarks.bench_startup --repeat 5
+    python -m Benchmarks.bench_startup --rows 100k --output Data/Benchmarks/startup.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from Core.synthetic import SyntheticRetail, parse_size
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ["numpy", "pandas", "pyarrow", "scipy", "matplotlib", "seaborn", "reportlab", "requests"]
+PROMPT = b"Enter your input: "
+CLOSE, LEVEL_1 = "5", "1"
+
+def setup_workdir(workdir, rows, seed):
+    #the app expects the downloaded zip and the extracted workbook under ./Data
+    os.makedirs(os.path.join(workdir, "Data"))
+    shutil.copy(os.path.join(ROOT, "user_instruction.txt"), workdir)
+    workbook = SyntheticRetail(rows, seed).write(os.path.join(workdir, "Data", "Online Retail.xlsx"))
+    with zipfile.ZipFile(os.path.join(workdir, "Data", "online_retail_data.zip"), "w") as archive:
+        archive.write(workbook, "Online Retail.xlsx")
+
+
+def run_app(workdir, choice, importtime=False):
+    """
+    Runs main.py once and answers the menu with choice. Returns the seconds
+    to the prompt and to exit, and the -X importtime log if asked for.
+    """
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + [os.path.join(ROOT, "main.py")]
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    with tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+        #input() flushes the prompt, so it arrives as soon as the menu is shown
+        output = b""
+        while not output.endswith(PROMPT):
+            byte = process.stdout.read(1)
+            if not byte:
+                raise RuntimeError(f"main.py exited before showing the menu: {output.decode(errors='replace')}")
+            output += byte
+        prompt = time.perf_counter() - start
+        process.communicate(f"{choice}\n".encode())
+        finished = time.perf_counter() - start
+        stderr.seek(0)
+        log = stderr.read().decode(errors="replace")
+    if process.returncode:
+        raise RuntimeError(f"main.py failed with exit code {process.returncode}: {log[-2000:]}")
+    return prompt, finished, log
+
+
+def parse_importtime(log):
+    #"import time: self [us] | cumulative | imported package", nesting shown by indentation
+    imports = []
+    for line in log.splitlines():
+        if line.startswith("import time:") and "|" in line and "self [us]" not in line:
+            own, cumulative, name = line[len("import time:"):].split("|")
+            imports.append({"name": name.strip(), "top_level": not name[1:].startswith(" "), "self_ms": int(own) / 1000, "cumulative_ms": int(cumulative) / 1000})
+    return imports
+
+
+def import_report(workdir, choice, top):
+    _, _, log = run_app(workdir, choice, importtime=True)
+    imports = parse_importtime(log)
+    loaded = {entry["name"].split(".")[0] for entry in imports}
+    slowest = sorted((entry for entry in imports if entry["top_level"]), key=lambda entry: entry["cumulative_ms"], reverse=True)[:top]
+    return {"heavy": [name for name in HEAVY if name in loaded], "total_ms": round(sum(entry["self_ms"] for entry in imports), 1), "slowest": slowest}
+
+
+def summarize(samples):
+    return {"median_s": round(statistics.median(samples), 4), "min_s": round(min(samples), 4), "samples": [round(sample, 4) for sample in samples]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the start-up of the app: time-to-prompt and time-to-first-report")
+    parser.add_argument("--rows", type=parse_size, default=parse_size("10k"), help="rows of the synthetic workbook")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports listed per path")
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        setup_workdir(workdir, args.rows, args.seed)
+        #the first report builds the columnar data cache, later runs start from it
+        run_app(workdir, LEVEL_1)
+        timings = {"prompt": [], "close": [], "first_report": []}
+        for _ in range(args.repeat):
+            prompt, finished, _ = run_app(workdir, CLOSE)
+            timings["prompt"].append(prompt)
+            timings["close"].append(finished)
+            _, finished, _ = run_app(workdir, LEVEL_1)
+            timings["first_report"].append(finished)
+        if not os.path.exists(os.path.join(workdir, "Level_1_Report.pdf")):
+            raise RuntimeError("The Level 1 run did not write Level_1_Report.pdf")
+        imports = {"menu": import_report(workdir, CLOSE, args.top), "level_1": import_report(workdir, LEVEL_1, args.top)}
+    results = {"python": sys.version.split()[0], "rows": args.rows, "repeat": args.repeat, "timings": {name: summarize(samples) for name, samples in timings.items()}, "imports": imports}
+    print(f"{args.rows:,} rows, median / best of {args.repeat} fresh interpreters")
+    for name, label in [("prompt", "time-to-prompt"), ("close", "time-to-exit (close option)"), ("first_report", "time-to-first-report (Level 1)")]:
+        print(f"  {label:<34}{results['timings'][name]['median_s']:>8.3f} s{results['timings'][name]['min_s']:>8.3f} s")
+    for path, report in imports.items():
+        print(f"\n{path} path: {report['total_ms']:.0f} ms of imports, heavy libraries: {', '.join(report['heavy']) or 'none'}")
+        for entry in report["slowest"]:
+            print(f"  {entry['name']:<40}{entry['cumulative_ms']:>10.1f} ms")
+    if imports["menu"]["heavy"]:
+        print(f"\nWarning: {', '.join(imports['menu']['heavy'])} imported before the menu prompt")
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
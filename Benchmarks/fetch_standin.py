@@ -0,0 +1,154 @@
+"""
+Local stand-in for the dataset host, to exercise the download path offline.
+It serves a zip holding a synthetic "Online Retail.xlsx" with Range / ETag
+support, and can cut the first connections short to mimic flaky egress.
+
+    python -m Benchmarks.fetch_standin --check       # run the fetcher against it
+    python -m Benchmarks.fetch_standin --serve 8765  # then: python main.py --data-url http://127.0.0.1:8765/online_retail.zip
+
+--check downloads through interrupted connections and verifies the result.
+It then resumes a partial file left by an earlier run, re-fetches a
+truncated archive and rejects a checksum mismatch.
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Core.fetch import DatasetFetcher, FetchError
+from Core.synthetic import SyntheticRetail, parse_size
+
+MEMBER = "Online Retail.xlsx"
+
+class StandInHandler(BaseHTTPRequestHandler):
+    #the server holds the payload, the number of connections to cut and a log of the requests
+    def do_GET(self):
+        server = self.server
+        body = server.payload
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        start, status = 0, 200
+        ranged = self.headers.get("Range")
+        if ranged and self.headers.get("If-Range", etag) == etag:
+            start = int(ranged.removeprefix("bytes=").split("-")[0])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.end_headers()
+                server.requests.append((ranged, 416))
+                return
+            status = 206
+        server.requests.append((ranged, status))
+        self.send_response(status)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(len(body) - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+        end = len(body)
+        if server.cuts > 0:
+            #send a part of the rest, then drop the connection
+            server.cuts -= 1
+            end = start + (len(body) - start) // 3
+        self.wfile.write(body[start:end])
+        if end < len(body):
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def payload(rows, seed):
+    with tempfile.TemporaryDirectory() as workdir:
+        workbook = SyntheticRetail(rows, seed).write(os.path.join(workdir, MEMBER))
+        archive = os.path.join(workdir, "online_retail.zip")
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as file:
+            file.write(workbook, MEMBER)
+            file.writestr("readme.txt", "stand-in archive, only the workbook is extracted\n")
+        with open(archive, "rb") as file:
+            return file.read()
+
+
+def start_server(body, port=0, cuts=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), StandInHandler)
+    server.payload, server.cuts, server.requests = body, cuts, []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/online_retail.zip"
+
+
+def check(body, cuts):
+    expected = hashlib.sha256(body).hexdigest()
+    server, url = start_server(body, cuts=cuts)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "online_retail_data.zip")
+            fetcher = DatasetFetcher(url, path, backoff=0.05)
+            start = time.perf_counter()
+            fetcher.fetch()
+            assert fetcher.digest(path) == expected, "the download does not match the served archive"
+            resumed = sum(status == 206 for _, status in server.requests)
+            print(f"download through {cuts} cut connections: {len(server.requests)} requests, {resumed} resumed, {time.perf_counter() - start:.2f} s")
+            assert resumed == cuts, "a cut connection was downloaded again from the start"
+            workbook = fetcher.extract(MEMBER, os.path.join(workdir, MEMBER))
+            with zipfile.ZipFile(path) as archive:
+                assert open(workbook, "rb").read() == archive.read(MEMBER)
+            assert not os.path.exists(os.path.join(workdir, "readme.txt")), "a member other than the workbook was extracted"
+            print("extracted only the workbook")
+
+            #a partial file left by an interrupted run is resumed, not restarted
+            os.remove(path)
+            with open(path + ".part", "wb") as file:
+                file.write(body[:len(body) // 2])
+            server.requests.clear()
+            fetcher.fetch()
+            assert fetcher.digest(path) == expected and server.requests == [(f"bytes={len(body) // 2}-", 206)], server.requests
+            print("resumed a partial download from the previous run")
+
+            #a truncated archive in place fails verification and is completed
+            with open(path, "r+b") as file:
+                file.truncate(len(body) - 1000)
+            assert not fetcher.verify()
+            server.requests.clear()
+            fetcher.fetch()
+            assert fetcher.digest(path) == expected and len(server.requests) == 1, server.requests
+            print("detected and completed a truncated archive")
+
+            #a pinned checksum that does not match is rejected
+            os.remove(path)
+            try:
+                DatasetFetcher(url, path, sha256="0" * 64, backoff=0.01).fetch()
+                raise AssertionError("a checksum mismatch was accepted")
+            except FetchError as e:
+                assert not os.path.exists(path)
+                print(f"rejected a checksum mismatch: {e}")
+    finally:
+        server.shutdown()
+    print("FETCH OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in server for the dataset download")
+    parser.add_argument("--rows", type=parse_size, default=parse_size("20k"), help="rows of the synthetic workbook in the archive")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cuts", type=int, default=2, help="connections cut short before the download goes through")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="only serve the archive on PORT")
+    parser.add_argument("--check", action="store_true", help="run the fetcher against the stand-in and verify it")
+    args = parser.parse_args()
+    body = payload(args.rows, args.seed)
+    if args.serve is not None:
+        server, url = start_server(body, args.serve, args.cuts)
+        print(f"Serving {len(body):,} bytes at {url} ({args.cuts} connections will be cut), Ctrl+C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        check(body, args.cuts)
+
+
+if __name__ == "__main__":
+    main()
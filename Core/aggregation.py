@@ -0,0 +1,228 @@
+from dataclasses import dataclass, fields
+import numpy as np
+import pandas as pd
+from Core.logger import *
+from Core.density import QUANTITY_LIMIT, REVENUE_LIMIT, grid_cells, thin_points
+
+logger = Logger().setup_logs()
+
+CORR_COLUMNS = ["Quantity", "Revenue", "UnitPrice"]
+
+#the ReportFacts dataset behind each chart
+PLOT_FACTS = {
+    "monthly_revenue_plot": "monthly_revenue",
+    "yearly_revenue_plot": "yearly_revenue",
+    "top_10_country_by_revenue": "country_revenue",
+    "top_10_customer_by_purchase": "customer_revenue",
+    "top_10_country_by_no_of_customers": "customers_by_country",
+    "top_10_country_qunatity_vs_revenue": "quantity_revenue",
+    "top_10_product_by_quantity_sold": "product_quantity",
+    "correlation_matrix_heatmap": "correlation"
+}
+
+@dataclass(frozen=True)
+class KpiFacts:
+    """
+    The KPI scalars behind the Level 1 report.
+    """
+    unclean_total_transaction: int
+    total_transaction: int
+    total_revenue: float
+    unclean_unique_customers: int
+    unique_customers: int
+    num_countries: int
+    top_product: str
+    top_country_customers: str
+    approximate: bool = False
+    error_note: str = ""
+
+    @property
+    def per_cancel_order(self):
+        return 100 - ((self.total_transaction / self.unclean_total_transaction) * 100)
+
+    @property
+    def per_cancel_customer(self):
+        return 100 - ((self.unique_customers / self.unclean_unique_customers) * 100)
+
+    @property
+    def avg_revenue(self):
+        return self.total_revenue / self.total_transaction
+
+
+@dataclass(frozen=True, kw_only=True)
+class ReportFacts(KpiFacts):
+    """
+    Everything the Level 1-3 reports read: KPI scalars and the small
+    pre-aggregated datasets behind each chart.
+    """
+    monthly_revenue: pd.Series
+    yearly_revenue: pd.Series
+    country_revenue: pd.Series
+    customer_revenue: pd.Series
+    customers_by_country: pd.Series
+    product_quantity: pd.Series
+    quantity_revenue: pd.DataFrame
+    correlation: pd.DataFrame
+    #the last transaction, a last month ending before it is partial
+    last_date: pd.Timestamp = None
+
+    def kpis(self):
+        return KpiFacts(**{field.name: getattr(self, field.name) for field in fields(KpiFacts)})
+
+    def plot_data(self):
+        return {name: getattr(self, field) for name, field in PLOT_FACTS.items()}
+
+    @staticmethod
+    def period_labels(series):
+        #integer Year (yyyy) / Month (yyyymm) keys back to the "2011" / "2011-12" labels the charts show
+        labels = [str(key) if key < 10000 else f"{key // 100}-{key % 100:02d}" for key in series.index]
+        return pd.Series(series.to_numpy(), index=pd.Index(labels, name=series.index.name), name=series.name)
+
+    @staticmethod
+    def correlation_from_moments(cross):
+        std = np.sqrt(np.diag(cross))
+        return pd.DataFrame(cross / np.outer(std, std), index=CORR_COLUMNS, columns=CORR_COLUMNS)
+
+
+class AggregationPlanner:
+    """
+    Computes ReportFacts, one dataset at a time or all at once, sharing the
+    work between them. Each key column is factorized once into integer
+    codes (the cleaned frame reuses the raw frame's codes, since its rows
+    are a subset), and every group sum, count and distinct count is a
+    bincount over those codes. Only the per-key results, which are tiny,
+    go back through pandas for sorting and top-10 selection.
+    """
+    def __init__(self, dataframe, unclean_dataframe, scatter_cap=5000):
+        self.dataframe = dataframe
+        self.unclean_dataframe = unclean_dataframe
+        #points of a country drawn in the scatter beyond one per occupied cell, 0 draws every point
+        self.scatter_cap = scatter_cap
+        self.rows = unclean_dataframe.index.get_indexer(dataframe.index)
+        self._codes = {}
+
+    def codes(self, column, raw=False):
+        """
+        Factorize a column once, in first-appearance order so that argmax ties
+        resolve like value_counts().idxmax(). Raw codes are shared with the
+        cleaned frame by row position.
+        """
+        key = (column, raw)
+        if key not in self._codes:
+            frame = self.unclean_dataframe if raw else self.dataframe
+            codes, uniques = pd.factorize(frame[column])
+            #categorical uniques become plain values so the charts only see observed keys
+            self._codes[key] = (codes, np.asarray(uniques))
+        return self._codes[key]
+
+    @staticmethod
+    def distinct(codes, size):
+        valid = codes[codes >= 0]
+        return int(np.count_nonzero(np.bincount(valid, minlength=size)))
+
+    @staticmethod
+    def group_sum(codes, uniques, weights=None, name=None):
+        valid = codes >= 0
+        sums = np.bincount(codes[valid], weights=None if weights is None else weights[valid], minlength=len(uniques))
+        return pd.Series(sums, index=pd.Index(uniques, name=name))
+
+    def kpis(self):
+        invoice_codes, invoice_uniques = self.codes("InvoiceNo", raw=True)
+        customer_codes, customer_uniques = self.codes("CustomerID", raw=True)
+        return KpiFacts(
+            unclean_total_transaction=len(invoice_uniques),
+            total_transaction=self.distinct(invoice_codes[self.rows], len(invoice_uniques)),
+            total_revenue=self.total_revenue(),
+            unclean_unique_customers=len(customer_uniques),
+            unique_customers=self.distinct(customer_codes[self.rows], len(customer_uniques)),
+            num_countries=self.num_countries(),
+            top_product=self.product_rows().idxmax(),
+            top_country_customers=self.country_rows().idxmax()
+        )
+
+    def total_revenue(self):
+        return float(self.dataframe["Revenue"].to_numpy(dtype=float).sum())
+
+    def num_countries(self):
+        country_codes, country_uniques = self.codes("Country")
+        return len(country_uniques) + int((country_codes < 0).any())
+
+    def country_rows(self):
+        country_codes, country_uniques = self.codes("Country")
+        return self.group_sum(country_codes, country_uniques, name="Country").astype(np.int64)
+
+    def product_rows(self):
+        product_codes, product_uniques = self.codes("Description")
+        return self.group_sum(product_codes, product_uniques, name="Description").astype(np.int64)
+
+    def period_revenue(self, keys, name):
+        #keys are the integer Month / Year keys of the cleaned rows
+        codes, uniques = pd.factorize(np.asarray(keys))
+        revenue = self.dataframe["Revenue"].to_numpy(dtype=float)
+        return ReportFacts.period_labels(self.group_sum(codes, uniques, revenue, name).sort_index())
+
+    def country_revenue(self):
+        country_codes, country_uniques = self.codes("Country")
+        revenue = self.dataframe["Revenue"].to_numpy(dtype=float)
+        return self.group_sum(country_codes, country_uniques, revenue, "Country").sort_index().sort_values(ascending=False).head(10)
+
+    def customer_revenue(self):
+        #customer x country pairs share one combined code
+        customer_codes, customer_uniques = self.codes("CustomerID", raw=True)
+        country_codes, country_uniques = self.codes("Country")
+        revenue = self.dataframe["Revenue"].to_numpy(dtype=float)
+        clean_customer = customer_codes[self.rows]
+        paired = (clean_customer >= 0) & (country_codes >= 0)
+        pair_codes, pair_uniques = pd.factorize(clean_customer[paired].astype(np.int64) * len(country_uniques) + country_codes[paired])
+        pair_index = pd.MultiIndex.from_arrays(
+            [customer_uniques[pair_uniques // len(country_uniques)], country_uniques[pair_uniques % len(country_uniques)]],
+            names=["CustomerID", "Country"])
+        customer_revenue = pd.Series(np.bincount(pair_codes, weights=revenue[paired], minlength=len(pair_uniques)), index=pair_index, name="Revenue")
+        return customer_revenue.sort_index().sort_values(ascending=False).head(10)
+
+    def customers_by_country(self):
+        return self.country_rows().sort_index().sort_values(ascending=False).head(10)
+
+    def product_quantity(self):
+        return self.product_rows().sort_index().nlargest(10)
+
+    def quantity_revenue(self):
+        #scatter rows: filtered transactions of the top 10 countries by filtered revenue
+        country_codes, country_uniques = self.codes("Country")
+        revenue = self.dataframe["Revenue"].to_numpy(dtype=float)
+        quantity = self.dataframe["Quantity"].to_numpy()
+        keep = (quantity < QUANTITY_LIMIT) & (revenue < REVENUE_LIMIT)
+        filtered_revenue = self.group_sum(np.where(keep, country_codes, -1), country_uniques, revenue, "Country")
+        top_countries = filtered_revenue.sort_index().nlargest(10).index
+        top_mask = np.isin(country_uniques, top_countries)
+        keep &= (country_codes >= 0) & top_mask[np.maximum(country_codes, 0)]
+        positions = np.flatnonzero(keep)
+        if self.scatter_cap:
+            #overplotted points add nothing to the chart, see Core/density.py
+            chosen = thin_points(country_codes[positions], grid_cells(quantity[positions], revenue[positions]), self.scatter_cap, np.random.default_rng(0))
+            positions = positions[chosen]
+        return self.dataframe[["Quantity", "Revenue", "Country"]].iloc[positions].astype({"Country": object})
+
+    def correlation(self):
+        values = self.dataframe[CORR_COLUMNS].to_numpy(dtype=float)
+        centered = values - values.mean(axis=0)
+        return ReportFacts.correlation_from_moments(centered.T @ centered)
+
+    def facts(self, months, years):
+        """
+        All of ReportFacts at once, the factorized key columns are shared.
+        """
+        facts = ReportFacts(
+            **vars(self.kpis()),
+            monthly_revenue=self.period_revenue(months, "Month"),
+            yearly_revenue=self.period_revenue(years, "Year"),
+            country_revenue=self.country_revenue(),
+            customer_revenue=self.customer_revenue(),
+            customers_by_country=self.customers_by_country(),
+            product_quantity=self.product_quantity(),
+            quantity_revenue=self.quantity_revenue(),
+            correlation=self.correlation(),
+            last_date=self.dataframe["InvoiceDate"].max()
+        )
+        logger.info("Report Facts Aggregated in a Single Pass.")
+        return facts
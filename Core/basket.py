@@ -0,0 +1,74 @@
+import math
+import numpy as np
+import pandas as pd
+from Core.logger import *
+
+logger = Logger().setup_logs()
+
+#share of the invoices a product, and a pair, must appear in to be counted
+MIN_SUPPORT = 0.01
+#a pair needs at least this many invoices, whatever the support threshold of a small slice
+MIN_PAIR_INVOICES = 2
+TOP_RULES = 10
+
+class MarketBasket:
+    """
+    Products bought together. The cleaned transactions become a sparse
+    invoice x product incidence matrix (CSR, one stored 1 per distinct
+    product of an invoice). A pair can only reach the minimum support when
+    both of its products do, so the products below it are dropped first and
+    the pair counts of the rest are one sparse product of the matrix with
+    its transpose; its memory follows the pairs actually bought together,
+    not the square of the catalogue.
+    """
+    def __init__(self, dataframe, min_support=MIN_SUPPORT):
+        #scipy is only imported once a Level 3 report needs the pairs
+        from scipy import sparse
+        invoices = pd.factorize(dataframe["InvoiceNo"])[0]
+        items, self.item_ids = pd.factorize(dataframe["StockCode"])
+        self.invoices = int(invoices.max()) + 1 if len(invoices) else 0
+        self.min_support = min_support
+        self.min_count = max(math.ceil(min_support * self.invoices), MIN_PAIR_INVOICES)
+        #the lines of an invoice repeating a product are summed, then counted once
+        incidence = sparse.csr_array((np.ones(len(items), dtype=np.int32), (invoices, items)), shape=(self.invoices, len(self.item_ids)))
+        incidence.data[:] = 1
+        self.item_counts = np.bincount(incidence.indices, minlength=len(self.item_ids))
+        self.frequent = np.flatnonzero(self.item_counts >= self.min_count)
+        frequent = incidence[:, self.frequent]
+        #invoices with a single frequent product pair with nothing
+        frequent = frequent[np.diff(frequent.indptr) > 1]
+        self.basket_invoices = frequent.shape[0]
+        pairs = sparse.triu(frequent.T @ frequent, k=1, format="coo")
+        keep = pairs.data >= self.min_count
+        self.pair_items = (self.frequent[pairs.row[keep]], self.frequent[pairs.col[keep]])
+        self.pair_counts = pairs.data[keep].astype(np.int64)
+        self.nbytes = incidence.data.nbytes + incidence.indices.nbytes + incidence.indptr.nbytes
+        #the product names, from the first line of each product
+        first = np.unique(items, return_index=True)[1]
+        self.descriptions = dataframe["Description"].iloc[first].to_numpy() if "Description" in dataframe else None
+
+    def name(self, item):
+        description = self.descriptions[item] if self.descriptions is not None else None
+        return str(description).strip() if isinstance(description, str) and description.strip() else str(self.item_ids[item])
+
+    def rules(self):
+        """
+        One association rule per frequent pair, from its less frequent
+        product to the other (the direction of the higher confidence; the
+        support and lift of a pair are the same both ways), by lift.
+        """
+        a, b = self.pair_items
+        swap = self.item_counts[a] > self.item_counts[b]
+        antecedent, consequent = np.where(swap, b, a), np.where(swap, a, b)
+        support = self.pair_counts / max(self.invoices, 1)
+        confidence = self.pair_counts / self.item_counts[antecedent]
+        lift = confidence / (self.item_counts[consequent] / max(self.invoices, 1))
+        rules = pd.DataFrame({
+            "Antecedent": antecedent,
+            "Consequent": consequent,
+            "Invoices": self.pair_counts,
+            "Support": support,
+            "Confidence": confidence,
+            "Lift": lift
+        })
+        return rules.sort_values(["Lift", "Invoices"], ascending=False, kind="stable", ignore_index=True)
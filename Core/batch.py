@@ -0,0 +1,244 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from Core.logger import *
+from Core.metrics import Metrics
+from Core.data_loader import DataLoader
+from Core.plot_specs import LEVEL_2_PLOTS, LEVEL_3_PLOTS, LEVEL_4_PLOTS
+
+logger = Logger().setup_logs()
+
+DEFAULT_OUTPUT = "Level_{level}_Report.pdf"
+DEFAULT_SLICE_OUTPUT = "Reports/{slice}/Level_{level}_Report.pdf"
+SLICE_PLOT_DIR = "./Data/Slices"
+SNAPSHOT_PATH = "./Data/Snapshots/batch_{pid}.snap"
+#path -> loader over the attached snapshot, once per worker process
+_attached = {}
+
+def month_key(timestamp):
+    return timestamp.year * 100 + timestamp.month
+
+
+@dataclass(frozen=True)
+class ReportSlice:
+    """
+    A country, a set of whole months or an InvoiceDate range the batch
+    reports can be limited to. name is used in the output paths, scope in
+    the report text. Rows are selected through the loader's partition index
+    by Country or by Month.
+    """
+    name: str
+    scope: str
+    country: str = None
+    #yyyymm keys, for quarters and months
+    months: tuple = ()
+    start: pd.Timestamp = None
+    #exclusive, the day after the last day of the range
+    end: pd.Timestamp = None
+
+    @classmethod
+    def for_country(cls, country):
+        return cls(re.sub(r"[^\w-]+", "_", country).strip("_"), country, country=country)
+
+    @classmethod
+    def for_months(cls, name, months):
+        return cls(name, name, months=tuple(int(month) for month in months))
+
+    @classmethod
+    def for_dates(cls, date_range):
+        #"START:END" as YYYY-MM-DD, both days included and either side can be left open
+        start, separator, end = date_range.partition(":")
+        if not separator or not (start or end):
+            raise ValueError(f"A date range is START:END, e.g. 2011-01-01:2011-06-30 or 2011-09-01:, got: {date_range}")
+        start = pd.Timestamp(start).normalize() if start else None
+        end = pd.Timestamp(end).normalize() if end else None
+        if start is not None and end is not None and end < start:
+            raise ValueError(f"The date range ends before it starts: {date_range}")
+        first = start.strftime("%Y-%m-%d") if start is not None else "start"
+        last = end.strftime("%Y-%m-%d") if end is not None else "end"
+        scope = f"{first} to {last}".replace("start to", "up to").replace(" to end", " onwards")
+        return cls(f"{first}_{last}", scope, start=start, end=end + pd.Timedelta(days=1) if end is not None else None)
+
+    @property
+    def partition(self):
+        return "Country" if self.country is not None else "Month"
+
+    @property
+    def columns(self):
+        #the raw columns the partition index is built from
+        return ["Country"] if self.country is not None else ["InvoiceDate"]
+
+    def select(self, dataframe, index):
+        """
+        The rows of the slice in dataframe, through its PartitionIndex; only
+        the rows of the matching partitions are read.
+        """
+        if self.country is not None:
+            return dataframe.iloc[index.positions([index.key(self.country)])]
+        if self.months:
+            return dataframe.iloc[index.positions(self.months)]
+        months = index.keys
+        if self.start is not None:
+            months = months[months >= month_key(self.start)]
+        if self.end is not None:
+            months = months[months <= month_key(self.end - pd.Timedelta(days=1))]
+        #whole months are selected from the index, the first and last are trimmed to the days
+        candidates = dataframe.iloc[index.positions(months)]
+        return candidates[self.mask(candidates)]
+
+    def mask(self, dataframe):
+        if self.country is not None:
+            return (dataframe["Country"] == self.country).to_numpy(dtype=bool)
+        if self.months:
+            return np.isin(DataLoader.period_keys(dataframe)["Month"].to_numpy(), self.months)
+        dates = dataframe["InvoiceDate"]
+        keep = np.ones(len(dataframe), dtype=bool)
+        if self.start is not None:
+            keep = keep & (dates >= self.start).to_numpy()
+        if self.end is not None:
+            keep = keep & (dates < self.end).to_numpy()
+        return keep
+
+
+def _report_task(report_slice, snapshot, levels, output, options, pdf_options):
+    #runs in a worker process on the rows of one partition, cut out of the shared snapshot; the timing goes back to the parent
+    with Metrics.span(f"batch:{report_slice.name}", emit=False) as record:
+        if snapshot not in _attached:
+            _attached[snapshot] = DataLoader.attach(snapshot)
+        source = _attached[snapshot]
+        features = source.select("features", report_slice)
+        record.update(rows=len(features))
+        loader = DataLoader.from_frames(source.select("raw_keys", report_slice), features, scope=report_slice.scope, plot_dir=os.path.join(SLICE_PLOT_DIR, report_slice.name), **options)
+        written = BatchReports(loader, levels, output=output, pdf_options=pdf_options).report(report_slice.name, loader)
+    return written, record
+
+
+class BatchReports:
+    """
+    Non-interactive generation of several report levels, for the whole
+    dataset or for each slice, in one run. The data is read and cleaned once;
+    the levels of a dataset share its KPIs and charts. fan_out adds one slice
+    per partition (the top_countries countries by revenue, every quarter or
+    every month), reported in parallel worker processes.
+    """
+    def __init__(self, loader, levels, slices=(), output=None, fan_out=(), top_countries=10, workers=None, pdf_options=None):
+        self.loader = loader
+        self.levels = sorted(set(levels))
+        self.slices = list(slices)
+        self.fan_out = list(fan_out)
+        self.top_countries = top_countries
+        self.workers = workers or os.cpu_count() or 1
+        #dpi, image_format and jpeg_quality of ReportGenerator
+        self.pdf_options = pdf_options or {}
+        self.output = output or (DEFAULT_SLICE_OUTPUT if self.slices or self.fan_out else DEFAULT_OUTPUT)
+        if (len(self.slices) > 1 or self.fan_out) and "{slice}" not in self.output:
+            raise ValueError(f"The output path needs a {{slice}} placeholder when several slices are reported, got: {self.output}")
+
+    def partition_slices(self):
+        """
+        One ReportSlice per partition of the fan_out kinds, read off the
+        partition indexes of the cleaned data.
+        """
+        slices = []
+        if "country" in self.fan_out:
+            index = self.loader.pipeline["features_by_Country"]
+            revenue = index.totals(self.loader.pipeline["features"]["Revenue"].to_numpy(dtype=float))
+            labels = list(index.labels)
+            for code in revenue[revenue.index >= 0].nlargest(self.top_countries).index:
+                slices.append(ReportSlice.for_country(labels[code]))
+        months = self.loader.pipeline["features_by_Month"].keys if {"quarter", "month"} & set(self.fan_out) else []
+        if "quarter" in self.fan_out:
+            quarters = {}
+            for month in months:
+                quarters.setdefault(f"{month // 100}-Q{(month % 100 - 1) // 3 + 1}", []).append(month)
+            slices += [ReportSlice.for_months(name, keys) for name, keys in quarters.items()]
+        if "month" in self.fan_out:
+            slices += [ReportSlice.for_months(f"{month // 100}-{month % 100:02d}", [month]) for month in months]
+        return slices
+
+    def run(self):
+        """
+        Writes every requested report and returns the written paths and the
+        names of the datasets that failed.
+        """
+        if not self.slices and not self.fan_out:
+            return self._run_targets([("all", self.loader)])
+        #every slice is declared before the first report, the raw data is then reduced once
+        for columns in [report_slice.columns for report_slice in self.slices] + [["Country"] if kind == "country" else ["InvoiceDate"] for kind in self.fan_out]:
+            self.loader.keep_raw_columns(columns)
+        slices = list({report_slice.name: report_slice for report_slice in self.slices + self.partition_slices()}.values())
+        if self.workers > 1 and len(slices) > 1:
+            return self._run_parallel(slices)
+        return self._run_targets([(report_slice.name, self.loader.subset(report_slice)) for report_slice in slices])
+
+    def _run_targets(self, targets):
+        written, failed = [], []
+        for name, loader in targets:
+            with Metrics.span(f"batch:{name}"):
+                try:
+                    written += self.report(name, loader)
+                except Exception as e:
+                    self._failed(name, e)
+                    failed.append(name)
+        return written, failed
+
+    def _run_parallel(self, slices):
+        """
+        Reports the slices on a pool of worker processes. The cleaned data and
+        its partition indexes are written once to a memory-mapped Snapshot
+        that every worker attaches read-only; a task only carries its slice.
+        """
+        written, failed = [], []
+        options = {"plot_cache": self.loader.plot_cache is not None, "approximate": self.loader.approximate, "exchange_rate": self.loader.exchange_rate, "chart_format": self.loader.chart_format, "scatter_cap": self.loader.scatter_cap}
+        workers = min(self.workers, len(slices))
+        snapshot = self.loader.write_snapshot(SNAPSHOT_PATH.format(pid=os.getpid()), sorted({report_slice.partition for report_slice in slices}))
+        try:
+            with Metrics.span("batch:fan_out", workers=workers, slices=len(slices)), ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = {pool.submit(_report_task, report_slice, snapshot, self.levels, self.output, options, self.pdf_options): report_slice.name for report_slice in slices}
+                for future in as_completed(pending):
+                    name = pending[future]
+                    if future.exception() is not None:
+                        self._failed(name, future.exception())
+                        failed.append(name)
+                    else:
+                        paths, record = future.result()
+                        Metrics.record(record)
+                        written.extend(paths)
+        finally:
+            os.remove(snapshot)
+        return written, failed
+
+    @staticmethod
+    def _failed(name, error):
+        print(f"Got Error in generating the reports of {name}: {error}")
+        logger.error(f"Got Error in generating the reports of {name}: {error}")
+
+    def report(self, name, loader):
+        """
+        Writes the requested levels of one dataset, sharing its Level 1 data
+        and charts; returns the written paths.
+        """
+        from Core.report_generator import ReportGenerator
+        if loader.scope and len(loader.pipeline["features"]) == 0:
+            raise ValueError(f"No transactions of {loader.scope} are left after cleaning")
+        top = self.levels[-1]
+        data = [loader._handle_level_1()]
+        if top >= 2:
+            #the charts of every requested level share one process pool
+            loader._render_plots(LEVEL_2_PLOTS + (LEVEL_3_PLOTS if top >= 3 else []) + (LEVEL_4_PLOTS if top >= 4 and "customer_analytics" in loader.pipeline else []))
+            data.append(loader._handle_level_2())
+        if top >= 3:
+            data.append(loader._handle_level_3())
+        if top >= 4:
+            data.append(loader._handle_level_4())
+        written = []
+        for level in self.levels:
+            path = self.output.format(level=level, slice=name)
+            ReportGenerator(level, *data[:level], output=path, **self.pdf_options)
+            print(f"Generated the Level {level} Report: {path}")
+            logger.info(f"Generated the Level {level} Report of {name} to {path}")
+            written.append(path)
+        return written
@@ -0,0 +1,152 @@
+import os
+import json
+import shutil
+import hashlib
+import importlib.util
+import numpy as np
+import pandas as pd
+from Core.logger import *
+
+logger = Logger().setup_logs()
+
+class DataCache:
+    """
+    Columnar on-disk copy of the parsed source workbook.
+
+    The cache is keyed on the source file's size, mtime and sha256 so that a
+    changed workbook is never served stale. Parquet / Feather are used when
+    pyarrow is installed, otherwise the columns are stored as a NumPy .npy
+    bundle (string columns dictionary encoded, no pickling).
+    """
+    version = 1
+    text_columns = ["InvoiceNo", "StockCode", "Description", "Country"]
+
+    def __init__(self, source, cache_dir="./Data/Cache"):
+        self.source = source
+        self.cache_dir = cache_dir
+        self.meta_file = os.path.join(self.cache_dir, "meta.json")
+
+    @staticmethod
+    def file_hash(path, block_size=1 << 20):
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def backend():
+        if importlib.util.find_spec("pyarrow") is not None:
+            return "parquet"
+        return "npy"
+
+    @classmethod
+    def normalize(cls, dataframe):
+        """
+        Give the mixed int/str object columns of the workbook one text type,
+        so cached and freshly parsed frames are identical.
+        """
+        for column in cls.text_columns:
+            if column in dataframe.columns:
+                values = dataframe[column]
+                dataframe[column] = values.where(values.isna(), values.astype(str)).astype("string")
+        return dataframe
+
+    def source_key(self):
+        stat = os.stat(self.source)
+        return {
+            "version": self.version,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": self.file_hash(self.source),
+        }
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_file, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def is_valid(self, key=None):
+        meta = self._read_meta()
+        if meta is None:
+            return False
+        key = key or self.source_key()
+        return all(meta.get(name) == value for name, value in key.items())
+
+    def invalidate(self):
+        if os.path.exists(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+            logger.info(f"Data cache at {self.cache_dir} invalidated.")
+
+    def load(self):
+        """
+        Return the cached dataframe, or None when the cache is missing or stale.
+        """
+        if not os.path.exists(self.source):
+            return None
+        meta = self._read_meta()
+        if meta is None or not self.is_valid():
+            logger.info("Data cache is missing or stale.")
+            return None
+        try:
+            match meta["format"]:
+                case "parquet":
+                    dataframe = pd.read_parquet(os.path.join(self.cache_dir, "data.parquet"))
+                case "feather":
+                    dataframe = pd.read_feather(os.path.join(self.cache_dir, "data.feather"))
+                case _:
+                    dataframe = self._load_npy(meta["columns"])
+        except Exception as e:
+            logger.error(f"Got Error while Reading the Data Cache, it will be rebuilt: {e}")
+            return None
+        logger.info(f"Loaded the Dataset from the {meta['format']} Data Cache.")
+        return dataframe[meta["columns"]]
+
+    def save(self, dataframe):
+        key = self.source_key()
+        tmp_dir = self.cache_dir + ".tmp"
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        fmt = self.backend()
+        try:
+            if fmt == "parquet":
+                try:
+                    dataframe.to_parquet(os.path.join(tmp_dir, "data.parquet"), index=False)
+                except Exception as e:
+                    logger.error(f"Parquet cache failed, falling back to Feather: {e}")
+                    fmt = "feather"
+                    dataframe.reset_index(drop=True).to_feather(os.path.join(tmp_dir, "data.feather"))
+            else:
+                self._save_npy(dataframe, tmp_dir)
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as file:
+                json.dump({**key, "format": fmt, "columns": list(dataframe.columns), "rows": len(dataframe)}, file)
+            self.invalidate()
+            os.replace(tmp_dir, self.cache_dir)
+            logger.info(f"Data cache written in {fmt} format to {self.cache_dir}.")
+        except Exception as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            logger.error(f"Got Error while Writing the Data Cache: {e}")
+
+    def _save_npy(self, dataframe, directory):
+        for column in dataframe.columns:
+            values = dataframe[column]
+            if column in self.text_columns:
+                codes, uniques = pd.factorize(values)
+                np.save(os.path.join(directory, f"{column}.codes.npy"), codes.astype(np.int32))
+                np.save(os.path.join(directory, f"{column}.values.npy"), np.asarray(uniques, dtype=str))
+            else:
+                np.save(os.path.join(directory, f"{column}.npy"), values.to_numpy())
+
+    def _load_npy(self, columns):
+        data = {}
+        for column in columns:
+            if column in self.text_columns:
+                codes = np.load(os.path.join(self.cache_dir, f"{column}.codes.npy"))
+                uniques = np.load(os.path.join(self.cache_dir, f"{column}.values.npy"))
+                data[column] = pd.Series(pd.Categorical.from_codes(codes, categories=uniques)).astype("string")
+            else:
+                data[column] = np.load(os.path.join(self.cache_dir, f"{column}.npy"))
+        return pd.DataFrame(data)
@@ -0,0 +1,10 @@
+#settings shared by the entry point and the loaders, kept free of heavy imports so the menu starts fast
+
+#GBP -> USD rate used for the Revenue column
+EXCHANGE_RATE = 1.34
+
+#the UCI Online Retail archive
+DATA_URL = "https://archive.ics.uci.edu/static/public/352/online+retail.zip"
+
+#resolution the charts are resampled to before they are embedded in the PDF reports, 0 keeps the rendered PNGs
+PRINT_DPI = 150
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+from Core.logger import *
+
+logger = Logger().setup_logs()
+
+#the CustomerAnalytics dataset behind each Level 4 chart
+CUSTOMER_PLOT_FACTS = {
+    "rfm_segments_plot": "rfm_segments",
+    "cohort_retention_heatmap": "cohort_retention"
+}
+
+SCORES = 5
+SEGMENTS = ["Champions", "Loyal Customers", "Potential Loyalists", "New Customers", "Promising", "Need Attention", "About to Sleep", "At Risk", "Can't Lose Them", "Hibernating"]
+#the usual RFM segment map: rows are the Recency score 1-5, columns the Frequency score 1-5
+SEGMENT_GRID = np.array([
+    [9, 9, 7, 7, 8],
+    [9, 9, 7, 7, 8],
+    [6, 6, 5, 1, 1],
+    [4, 2, 2, 1, 1],
+    [3, 2, 2, 0, 0]
+])
+
+def run_starts(*keys):
+    #first position of every run of equal key tuples in arrays sorted by them
+    boundary = np.zeros(len(keys[0]), dtype=bool)
+    boundary[:1] = True
+    for key in keys:
+        boundary[1:] |= key[1:] != key[:-1]
+    return boundary
+
+
+def quintile_scores(values):
+    #1-5 by rank, ties broken by position so that every score holds a fifth of the customers
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[np.argsort(values, kind="stable")] = np.arange(len(values))
+    return (1 + ranks * SCORES // max(len(values), 1)).astype(np.int8)
+
+
+class CustomerAnalytics:
+    """
+    RFM scores and monthly cohort retention of every customer. The
+    transactions are sorted once by (CustomerID, month, InvoiceNo); each
+    customer is then a run of that order and every per-customer figure is a
+    segmented reduction (np.ufunc.reduceat) over the runs, the distinct
+    invoices and active months are run boundaries. Nothing loops or groups
+    per customer, the cost is one sort and a few passes over the rows.
+    An invoice is assumed to have a single InvoiceDate.
+    """
+    def __init__(self, dataframe):
+        customers, self.customer_ids = pd.factorize(dataframe["CustomerID"], sort=True)
+        invoices = pd.factorize(dataframe["InvoiceNo"])[0]
+        dates = dataframe["InvoiceDate"].to_numpy()
+        days = dates.astype("datetime64[D]").astype(np.int64)
+        months = dates.astype("datetime64[M]").astype(np.int64)
+        order = self.sort_order(customers, months, invoices)
+        customers, months, invoices = customers[order], months[order], invoices[order]
+        customer_start = run_starts(customers)
+        starts = np.flatnonzero(customer_start)
+        #Recency in days before the day after the last transaction, Frequency in invoices, Monetary in revenue
+        self.customers = customers[starts]
+        self.recency = days.max() + 1 - np.maximum.reduceat(days[order], starts)
+        self.frequency = np.add.reduceat(run_starts(customers, invoices), starts).astype(np.int64)
+        self.monetary = np.add.reduceat(dataframe["Revenue"].to_numpy(dtype=float)[order], starts)
+        #within a customer the months are sorted, the first row holds the cohort
+        self.first_month = months[starts]
+        active = run_starts(customers, months)
+        self.active_cohort = self.first_month[np.cumsum(customer_start)[active] - 1]
+        self.active_age = months[active] - self.active_cohort
+        self.month_range = (int(months.min()), int(months.max())) if len(months) else (0, -1)
+
+    @staticmethod
+    def sort_order(*keys):
+        """
+        Stable order of the rows by the integer keys, the first key first. One argsort of the keys packed into an int64 when their
+        ranges fit, a lexsort otherwise.
+        """
+        keys = [key - key.min() if len(key) else key for key in keys]
+        bits = [int(key.max()).bit_length() if len(key) else 0 for key in keys]
+        if sum(bits) > 62:
+            return np.lexsort(keys[::-1])
+        packed = np.zeros(len(keys[0]), dtype=np.int64)
+        for key, width in zip(keys, bits):
+            packed = (packed << width) | key.astype(np.int64)
+        return np.argsort(packed, kind="stable")
+
+    def rfm(self):
+        """
+        One row per customer: Recency, Frequency, Monetary, their 1-5 scores
+        (5 is best, so the most recent customers score 5 on Recency) and the
+        segment of the Recency / Frequency scores.
+        """
+        r = (SCORES + 1 - quintile_scores(self.recency)).astype(np.int8)
+        f = quintile_scores(self.frequency)
+        m = quintile_scores(self.monetary)
+        return pd.DataFrame({
+            "Recency": self.recency,
+            "Frequency": self.frequency,
+            "Monetary": self.monetary,
+            "R": r,
+            "F": f,
+            "M": m,
+            "Segment": pd.Categorical.from_codes(SEGMENT_GRID[r - 1, f - 1], SEGMENTS)
+        }, index=pd.Index(self.customer_ids.take(self.customers), name="CustomerID"))
+
+    def segments(self):
+        """
+        Customers, their share, the mean Recency / Frequency / Monetary and
+        the share of the revenue of every segment present, largest first.
+        """
+        rfm = self.rfm()
+        codes = rfm["Segment"].cat.codes.to_numpy()
+        customers = np.bincount(codes, minlength=len(SEGMENTS))
+        present = customers > 0
+        def mean(column):
+            return np.bincount(codes, weights=rfm[column].to_numpy(dtype=float), minlength=len(SEGMENTS))[present] / customers[present]
+        revenue = np.bincount(codes, weights=rfm["Monetary"].to_numpy(), minlength=len(SEGMENTS))
+        summary = pd.DataFrame({
+            "Customers": customers[present],
+            "Customer Share": customers[present] / max(len(rfm), 1) * 100,
+            "Recency": mean("Recency"),
+            "Frequency": mean("Frequency"),
+            "Monetary": mean("Monetary"),
+            "Revenue Share": revenue[present] / (revenue.sum() or 1) * 100
+        }, index=pd.Index(np.array(SEGMENTS)[present], name="Segment"))
+        return summary.sort_values("Customers", ascending=False, kind="stable")
+
+    def retention(self):
+        """
+        Share of each monthly cohort (customers by the month of their first
+        purchase) buying again 0, 1, 2, ... months later. Ages past the end
+        of the data are NaN.
+        """
+        first, last = self.month_range
+        size = last - first + 1
+        counts = self.active_counts()
+        cohorts = np.flatnonzero(counts[:, 0])
+        matrix = counts[cohorts] / counts[cohorts, :1]
+        #a cohort of month i can only be observed for size - i months
+        matrix[np.arange(size)[None, :] >= (size - cohorts)[:, None]] = np.nan
+        labels = [f"{(first + month) // 12 + 1970}-{(first + month) % 12 + 1:02d}" for month in cohorts]
+        return pd.DataFrame(matrix, index=pd.Index(labels, name="Cohort"), columns=pd.RangeIndex(size, name="Months Since First Purchase"))
+
+    def active_counts(self):
+        #customers of cohort (row) buying age (column) months after their first month
+        first, last = self.month_range
+        size = last - first + 1
+        return np.bincount((self.active_cohort - first) * size + self.active_age, minlength=size * size).reshape(size, size).astype(float)
+
+    def mean_retention(self, age):
+        #share of all the customers buying again age months after their first month, over the cohorts observed that long
+        counts = self.active_counts()
+        observed = counts[:len(counts) - age]
+        return observed[:, age].sum() / observed[:, 0].sum() if age < len(counts) and observed[:, 0].sum() else float("nan")
@@ -1,101 +1,327 @@
 import os
-import requests
-import zipfile
+import copy
+from operator import methodcaller
+import numpy as np
 import pandas as pd
 import sys
-import matplotlib.pyplot as plt
-import matplotlib as mpl
-import seaborn as sns
 from Core.logger import *
 from Core.utils import *
+from Core.cache import DataCache
+from Core.plot_cache import PlotCache
+from Core.plot_specs import LEVEL_2_PLOTS, LEVEL_3_PLOTS, LEVEL_4_PLOTS
+from Core.aggregation import AggregationPlanner, KpiFacts, PLOT_FACTS
+from Core.customers import CustomerAnalytics, CUSTOMER_PLOT_FACTS
+from Core.basket import MarketBasket, TOP_RULES
+from Core.forecast import revenue_forecast, chart_data, series_forecast, FORECAST_PLOT_FACTS, HORIZON, ORIGINS, MODELS
+from Core.pipeline import Pipeline
+from Core.partitions import PartitionIndex
+from Core.snapshot import Snapshot
+from Core.sketches import KpiSketches
+from Core.metrics import Metrics
+from Core.config import EXCHANGE_RATE, DATA_URL
+from Core.fetch import DatasetFetcher
 
 logger = Logger().setup_logs()
 
 class DataLoader:
-    def __init__(self):
+    #description of the rows a sliced loader covers, None for the whole dataset
+    scope = None
+
+    def __init__(self, rebuild_cache=False, plot_workers=None, plot_cache=True, approximate=False, exchange_rate=EXCHANGE_RATE, data_url=DATA_URL, chart_format="png", scatter_cap=5000):
         self.data_dir = "./Data"
         self.data_zip = "./Data/online_retail_data.zip"
         self.data = "./Data/Online Retail.xlsx"
+        self.data_url = data_url
+        self.rebuild_cache = rebuild_cache
+        self.facts = None
+        #the raw columns kept after cleaning, the KPIs only need the keys
+        self.raw_columns = ["InvoiceNo", "CustomerID"]
+        self.approximate = approximate
+        self.exchange_rate = exchange_rate
+        self.scatter_cap = scatter_cap
+        self._setup_rendering(plot_workers, plot_cache, chart_format=chart_format)
+        #nothing is read or computed until a report asks for it
+        self._setup_pipeline()
+
+    def read_data(self):
         #Data Folder
         if not os.path.exists(self.data_dir):
             logger.info("Data Folder Not Found. Adding Data Folder.")
             os.mkdir(self.data_dir)
-        #Zip Data
-        if not os.path.exists(self.data_zip):
-            url = "https://archive.ics.uci.edu/static/public/352/online+retail.zip"
+        #the workbook is extracted from the downloaded zip, which is streamed, resumed and verified
+        if not os.path.exists(self.data):
+            fetcher = DatasetFetcher(self.data_url, self.data_zip)
             try:
-                response = requests.get(url)
-                if response.status_code == 200:
-                    print("Getting Data from the Source.")
-                    logger.info("Successfully retrieved the response from the data source and downloaded the data ZIP file.")
-                    with open(self.data_zip, 'wb') as file:
-                        file.write(response.content)
-                        logger.info("Successfully downloaded the Data ZIP file.")
+                with Metrics.span("download"):
+                    fetcher.fetch()
+                with Metrics.span("extract"):
+                    fetcher.extract(os.path.basename(self.data), self.data)
             except Exception as e:
-                print(f"An issue occurred while downloading data from the source: {url}. Error: {e}")
-                logger.error(f"An issue occurred while downloading data from the source: {url}. Error: {e}")
+                print(f"An issue occurred while downloading data from the source: {self.data_url}. Error: {e}")
+                logger.error(f"An issue occurred while downloading data from the source: {self.data_url}. Error: {e}")
                 sys.exit(1)
-        # File Data
-        if not os.path.exists(self.data):
-            logger.info("Extracting the Data from ZIP file.")
-            with zipfile.ZipFile(self.data_zip, "r") as zip_ref:
-                zip_ref.extractall(self.data_dir)
-                logger.info("Extracted Successfully Data from ZIP file.") 
-        #reading the excel file        
+        #reading the cached columnar copy, falling back to the excel file
+        self.cache = DataCache(self.data)
+        if self.rebuild_cache:
+            self.cache.invalidate()
         try:
-            logger.info("Started Reading Data File.")
-            self.dataframe = pd.read_excel(self.data)
+            with Metrics.span("ingest") as record:
+                dataframe = self.cache.load()
+                from_cache = dataframe is not None
+                if not from_cache:
+                    logger.info("Started Reading Data File.")
+                    dataframe = DataCache.normalize(pd.read_excel(self.data))
+                record.update(rows=len(dataframe), source="cache" if from_cache else "excel")
             columns = ['InvoiceNo', 'StockCode', 'Description', 'Quantity', 'InvoiceDate',
        'UnitPrice', 'CustomerID', 'Country']
-            if list(self.dataframe.columns) != columns:
+            if list(dataframe.columns) != columns:
                 print(f"The columns are missing or not in the expected order: {columns}")
                 logger.error(f"The columns are missing or not in the expected order: {columns}")
                 #terminating the system - columns do not match
                 sys.exit(0)
-            self.unclean_dataframe = self.dataframe
+            if not from_cache:
+                with Metrics.span("cache_save", rows=len(dataframe)):
+                    self.cache.save(dataframe)
+            before = dataframe.memory_usage(deep=True).sum()
+            with Metrics.span("compact", rows=len(dataframe)):
+                dataframe = self.compact(dataframe)
+            self.log_memory("raw transaction table", dataframe, before)
         except Exception as e:
             print(f"Got the Error while Reading the Dataset from the File: {e}")
             logger.error(f"Got the Error while Reading the Dataset from the File: {e}")
             sys.exit(1)
-        self.data_cleaning()
-
-    def data_cleaning(self):
-        self.dataframe = self.dataframe.dropna(subset=["CustomerID"])
-        #removing the cancel orders
-        self.dataframe = self.dataframe[~self.dataframe["InvoiceNo"].astype(str).str.startswith('C')]
-        #removing the negative or zero unitPrice
-        self.dataframe = self.dataframe[self.dataframe["UnitPrice"] > 0]
+        return dataframe
+
+    def _setup_pipeline(self, facts=None):
+        """
+        Declares every dataset the reports read as a lazy Pipeline node. A
+        Level 1 report only pulls raw -> clean -> features -> kpis; the Month
+        / Year keys and the chart datasets are computed when a chart needs
+        them. Loaders that aggregate on their own seed their finished facts.
+        """
+        self.pipeline = Pipeline()
+        self.pipeline.add("level_1", self._level_1_data, ["kpis"])
+        #the total revenue forecast only needs the monthly sums every loader has
+        self.pipeline.add("revenue_forecast", revenue_forecast, ["monthly_revenue", "last_date"])
+        self.pipeline.add("monthly_revenue_forecast", chart_data, ["monthly_revenue", "revenue_forecast"])
+        if facts is not None:
+            self.facts = facts
+            self.pipeline.seed(kpis=facts.kpis(), last_date=facts.last_date, **{field: getattr(facts, field) for field in PLOT_FACTS.values()})
+            self.pipeline.add("level_2", self._level_2_data, ["revenue_forecast", "last_date"])
+            return
+        self.pipeline.add("raw", self.read_data, transient=True)
+        self.pipeline.add("raw_keys", lambda raw: raw[self.raw_columns], ["raw"])
+        self.pipeline.add("clean", self.data_cleaning, ["raw"], transient=True)
+        self.pipeline.add("features", self.feature_adding, ["clean"])
+        self.pipeline.add("periods", self.period_keys, ["features"])
+        self.pipeline.add("planner", lambda features, raw_keys: AggregationPlanner(features, raw_keys, self.scatter_cap), ["features", "raw_keys"])
+        self.pipeline.add("kpis", self._kpi_facts, ["planner", "features", "raw_keys"])
+        self.pipeline.add("monthly_revenue", lambda planner, periods: planner.period_revenue(periods["Month"], "Month"), ["planner", "periods"])
+        self.pipeline.add("yearly_revenue", lambda planner, periods: planner.period_revenue(periods["Year"], "Year"), ["planner", "periods"])
+        self.pipeline.add("last_date", lambda features: features["InvoiceDate"].max(), ["features"])
+        for field in ["country_revenue", "customer_revenue", "customers_by_country", "product_quantity", "quantity_revenue", "correlation"]:
+            self.pipeline.add(field, methodcaller(field), ["planner"])
+        #the Level 3 basket rules and Level 4 need every transaction, only the loaders holding the rows have it
+        self.pipeline.add("market_basket", MarketBasket, ["features"])
+        self.pipeline.add("basket_rules", self._basket_data, ["market_basket"])
+        self.pipeline.add("customer_analytics", CustomerAnalytics, ["features"])
+        self.pipeline.add("rfm_segments", methodcaller("segments"), ["customer_analytics"])
+        self.pipeline.add("cohort_retention", methodcaller("retention"), ["customer_analytics"])
+        self.pipeline.add("level_4", self._level_4_data, ["customer_analytics", "rfm_segments"])
+        self.pipeline.add("series_forecast", lambda features, periods, last_date: series_forecast(features, periods["Month"].to_numpy(), last_date), ["features", "periods", "last_date"])
+        self.pipeline.add("level_2", self._level_2_data, ["revenue_forecast", "last_date", "series_forecast"])
+        #partition indexes for slicing, built on first use
+        self.pipeline.add("features_by_Country", lambda features: PartitionIndex.by_category(features["Country"]), ["features"])
+        self.pipeline.add("features_by_Month", lambda periods: PartitionIndex(periods["Month"].to_numpy()), ["periods"])
+        self.pipeline.add("raw_keys_by_Country", lambda raw_keys: PartitionIndex.by_category(raw_keys["Country"]), ["raw_keys"])
+        self.pipeline.add("raw_keys_by_Month", lambda raw_keys: PartitionIndex(self.period_keys(raw_keys)["Month"].to_numpy()), ["raw_keys"])
+
+    def _setup_rendering(self, plot_workers=None, plot_cache=True, plot_dir=None, chart_format="png"):
+        self.plot_workers = plot_workers
+        self.plot_cache = PlotCache() if plot_cache else None
+        self.plot_dir = plot_dir
+        #"png" files under ./Data, or "vector" drawings kept in memory
+        self.chart_format = chart_format
+        self.rendered = {}
+
+    @staticmethod
+    def compact(dataframe):
+        #dictionary-encoded text columns and narrow integers, values are unchanged
+        for column in ["InvoiceNo", "StockCode", "Description", "Country"]:
+            if column in dataframe and not isinstance(dataframe[column].dtype, pd.CategoricalDtype):
+                dataframe[column] = dataframe[column].astype("category")
+        quantity = dataframe["Quantity"]
+        if quantity.min() >= np.iinfo(np.int32).min and quantity.max() <= np.iinfo(np.int32).max:
+            dataframe["Quantity"] = quantity.astype(np.int32)
+        customer = dataframe["CustomerID"].dropna()
+        if (customer % 1 == 0).all() and customer.max() <= np.iinfo(np.int32).max:
+            dataframe["CustomerID"] = dataframe["CustomerID"].astype("Int32")
+        return dataframe
+
+    @staticmethod
+    def compact_features(dataframe):
+        #Revenue already holds the dollar amount and UnitPrice only feeds the correlation matrix from here on
+        dataframe["UnitPrice"] = dataframe["UnitPrice"].astype(np.float32)
+        return dataframe
+
+    @staticmethod
+    def log_memory(label, dataframe, before=None):
+        after = dataframe.memory_usage(deep=True).sum()
+        if before:
+            logger.info(f"Memory usage of the {label}: {Utils.size_format(before)} -> {Utils.size_format(after)} ({Utils.decimal_format(100 - after / before * 100)}% smaller).")
+        else:
+            logger.info(f"Memory usage of the {label}: {Utils.size_format(after)}.")
+
+    @staticmethod
+    def starts_with(column, prefix):
+        #on a categorical only the distinct values are tested, then broadcast through the codes
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            flags = np.append(column.cat.categories.astype(str).str.startswith(prefix), False)
+            return flags[column.cat.codes.to_numpy()]
+        return column.astype(str).str.startswith(prefix).to_numpy(dtype=bool)
+
+    @staticmethod
+    def clean(dataframe):
+        #one combined mask: known customer, not a cancel order, positive unitPrice
+        keep = dataframe["CustomerID"].notna().to_numpy() & ~DataLoader.starts_with(dataframe["InvoiceNo"], 'C') & (dataframe["UnitPrice"] > 0).to_numpy()
+        #the filtered frame is materialized once
+        return dataframe[keep]
+
+    @staticmethod
+    def add_revenue(dataframe, exchange_rate=EXCHANGE_RATE):
+        #adding the Revenue column, in dollars
+        dataframe["Revenue"] = dataframe["Quantity"].to_numpy() * (dataframe["UnitPrice"].to_numpy(dtype=np.float64) * exchange_rate)
+        return dataframe
+
+    @staticmethod
+    def period_keys(dataframe):
+        #the month (yyyymm) and year integer keys from months since 1970, ReportFacts turns them back into labels
+        months = dataframe["InvoiceDate"].to_numpy().astype("datetime64[M]").astype(np.int64)
+        year = months // 12 + 1970
+        return pd.DataFrame({"Month": (year * 100 + months % 12 + 1).astype(np.int32), "Year": year.astype(np.int16)}, index=dataframe.index)
+
+    @staticmethod
+    def add_features(dataframe, exchange_rate=EXCHANGE_RATE):
+        dataframe = DataLoader.add_revenue(dataframe, exchange_rate)
+        periods = DataLoader.period_keys(dataframe)
+        dataframe["Year"] = periods["Year"]
+        dataframe["Month"] = periods["Month"]
+        return dataframe
+
+    def data_cleaning(self, dataframe):
+        dataframe = self.clean(dataframe)
         logger.info("Data Cleaning Completed.")
-        self.feature_adding()
-
-    def feature_adding(self):
-        #adding column where price is in the dollar 
-        self.dataframe["UnitPriceDollar"] = self.dataframe["UnitPrice"].apply(lambda x:x*1.34)
-        #adding the Revenue column
-        self.dataframe["Revenue"] = self.dataframe["Quantity"] * self.dataframe["UnitPriceDollar"]
-        #adding the month and year columns 
-        self.dataframe["Month"] = self.dataframe["InvoiceDate"].dt.to_period("M").astype(str)
-        self.dataframe["Year"] = self.dataframe["InvoiceDate"].dt.to_period("Y").astype(str)
+        return dataframe
+
+    def feature_adding(self, dataframe):
+        dataframe = self.compact_features(self.add_revenue(dataframe, self.exchange_rate))
+        self.log_memory("cleaned transaction table", dataframe)
         logger.info("Features Added to the Data Frame Successfully.")
+        return dataframe
+
+    @classmethod
+    def from_frames(cls, raw_keys, features, scope=None, plot_dir=None, plot_cache=True, approximate=False, exchange_rate=EXCHANGE_RATE, chart_format="png", scatter_cap=5000):
+        """
+        A loader over raw keys and a cleaned frame prepared elsewhere, e.g. one
+        partition sent to a worker process. Charts are drawn in-process.
+        """
+        loader = cls(plot_workers=1, plot_cache=plot_cache, approximate=approximate, exchange_rate=exchange_rate, scatter_cap=scatter_cap)
+        loader.scope = scope
+        loader._setup_rendering(1, plot_cache, plot_dir, chart_format)
+        loader.pipeline.seed(raw_keys=raw_keys, features=features)
+        return loader
+
+    def write_snapshot(self, path, partitions=()):
+        """
+        Writes the raw keys, the cleaned frame and their partition indexes by
+        partitions ("Country", "Month") to a Snapshot at path, for worker
+        processes to attach() instead of receiving pickled rows.
+        """
+        frames = {frame: self.pipeline[frame] for frame in ["raw_keys", "features"]}
+        arrays, labels = {}, {}
+        for name in [f"{frame}_by_{partition}" for frame in frames for partition in partitions]:
+            index = self.pipeline[name]
+            arrays.update({f"{name}.{field}": getattr(index, field) for field in ["order", "keys", "offsets"]})
+            labels[name] = list(index.labels) if index.labels is not None else None
+        with Metrics.span("snapshot", rows=len(frames["features"])):
+            return Snapshot.write(path, frames, arrays, {"labels": labels})
+
+    @classmethod
+    def attach(cls, path):
+        """
+        A loader over a snapshot of write_snapshot(). Its frames and partition
+        indexes are read-only views on the mapped file, shared by every
+        process attached to it; it is only meant to select() slices from.
+        """
+        snapshot = Snapshot(path)
+        loader = cls(plot_workers=1, plot_cache=False)
+        indexes = {name: PartitionIndex.from_arrays(*(snapshot.array(f"{name}.{field}") for field in ["order", "keys", "offsets"]), {label: code for code, label in enumerate(labels)} if labels is not None else None) for name, labels in snapshot.attrs["labels"].items()}
+        loader.pipeline.seed(raw_keys=snapshot.frame("raw_keys"), features=snapshot.frame("features"), **indexes)
+        return loader
 
+    def keep_raw_columns(self, columns):
+        #slices need more of the raw table than the KPIs, declared before it is reduced
+        if "features" not in self.pipeline.nodes:
+            raise ValueError("Only the in-memory loader can be sliced, not streamed or stored aggregates")
+        missing = [column for column in columns if column not in self.raw_columns]
+        if missing and "raw_keys" in self.pipeline.values:
+            raise ValueError(f"The raw data was already reduced to {self.raw_columns}, slice before the first report")
+        self.raw_columns = self.raw_columns + missing
 
-    def _generate_kpis(self):
-        self.unclean_total_transaction = self.unclean_dataframe["InvoiceNo"].nunique()
-        self.total_transaction = self.dataframe["InvoiceNo"].nunique() 
-        self.total_revenue = self.dataframe["Revenue"].sum()
-        self.per_cancel_order = 100 - ((self.total_transaction / self.unclean_total_transaction) * 100)
-        self.unclean_unique_customers = self.unclean_dataframe["CustomerID"].nunique()
-        self.unique_customers = self.dataframe["CustomerID"].nunique() 
-        self.per_cancel_customer = 100 - ((self.unique_customers / self.unclean_unique_customers) * 100)
-        self.avg_revenue = self.total_revenue / self.total_transaction
-        self.num_countries = len(self.dataframe['Country'].unique())
-        self.top_product = self.dataframe['Description'].value_counts().idxmax()
-        self.top_country_customers = self.dataframe['Country'].value_counts().idxmax()
+    def select(self, frame, report_slice):
+        #the rows of a slice (see Core/batch.py) of the raw_keys or features frame, through its partition index
+        return report_slice.select(self.pipeline[frame], self.pipeline[f"{frame}_by_{report_slice.partition}"])
+
+    def subset(self, report_slice):
+        """
+        A loader over the rows of report_slice. It shares this loader's raw keys
+        and cleaned frame, so the data is still read and cleaned once, and
+        computes its own aggregates and charts (under ./Data/Slices/<name>).
+        """
+        self.keep_raw_columns(report_slice.columns)
+        subset = copy.copy(self)
+        subset.scope = report_slice.scope
+        subset._setup_rendering(self.plot_workers, self.plot_cache is not None, os.path.join("./Data/Slices", report_slice.name), self.chart_format)
+        subset._setup_pipeline()
+        #the subset selects from this loader's frames instead of reading the file
+        subset.pipeline.add("raw_keys", lambda: self.select("raw_keys", report_slice))
+        subset.pipeline.add("features", lambda: self.select("features", report_slice))
+        return subset
+
+    def _kpi_facts(self, planner, features, raw_keys):
+        if self.approximate:
+            #the sketches stand in for the distinct counts and top keys, the exact ones are never computed
+            sketches = KpiSketches().update(raw_keys, features)
+            return KpiFacts(total_revenue=planner.total_revenue(), num_countries=planner.num_countries(), **sketches.estimates())
+        return planner.kpis()
+
+    def plot_data(self, names):
+        datasets = {**PLOT_FACTS, **CUSTOMER_PLOT_FACTS, **FORECAST_PLOT_FACTS}
+        return {name: self.pipeline[datasets[name]] for name in names}
+
+    def _generate_kpis(self, facts):
+        self.unclean_total_transaction = facts.unclean_total_transaction
+        self.total_transaction = facts.total_transaction
+        self.total_revenue = facts.total_revenue
+        self.per_cancel_order = facts.per_cancel_order
+        self.unclean_unique_customers = facts.unclean_unique_customers
+        self.unique_customers = facts.unique_customers
+        self.per_cancel_customer = facts.per_cancel_customer
+        self.avg_revenue = facts.avg_revenue
+        self.num_countries = facts.num_countries
+        self.top_product = facts.top_product
+        self.top_country_customers = facts.top_country_customers
+        self.approximate = facts.approximate
         logger.info("KPI's generated Successfully.")
 
     def _handle_level_1(self):
-        self._generate_kpis()
+        return self.pipeline["level_1"]
+
+    def _level_1_data(self, facts):
+        self._generate_kpis(facts)
         data_desc = "This is a Transactional data set which contains all the Transactions occurring between 01/12/2010 and 09/12/2011 for a UK-based and Registered non store Online Retail. The Company mainly Sells unique all occasion gifts. Many Customers of the Company are Wholesalers."
+        if self.scope:
+            data_desc += f" This report only covers the Transactions of {self.scope}."
         column_descriptions = {
             "InvoiceNo": "A 6-digit integral number uniquely assigned to each Transaction. If this code starts with letter 'c', it indicates a Cancellation",
             "StockCode": "A 5-digit integral number uniquely assigned to each distinct product",
@@ -116,20 +342,24 @@ class DataLoader:
             "CustomerID": ["Categorical","Numeric"],
             "Country": ["Categorical","Text"]
             }
+        #estimates from the approximate sketches are marked
+        a = "≈ " if self.approximate else ""
         kpis = {
-            "Total Transaction": f"{Utils.formater(self.total_transaction)}",
+            "Total Transaction": f"{a}{Utils.formater(self.total_transaction)}",
             "Total Revenue": f"{Utils.currency_format(self.total_revenue)}",
-            "Average Revenue": f"{Utils.currency_format(self.avg_revenue)}",
-            "Unique Customers": f"{Utils.formater(self.unclean_unique_customers)}",
+            "Average Revenue": f"{a}{Utils.currency_format(self.avg_revenue)}",
+            "Unique Customers": f"{a}{Utils.formater(self.unclean_unique_customers)}",
         }
         interesting_facts = {
-            "interesting_fact1": f"The dataset originally contained {Utils.formater(self.unclean_total_transaction)} transaction records. After cleaning, {Utils.formater(self.total_transaction)} records remain. A total of {Utils.formater(self.unclean_total_transaction - self.total_transaction)} records were removed due to negative prices or quantities (representing canceled transactions) and missing Customer IDs.",
-            "interesting_fact2": f"The percentage of canceled orders in the dataset is {Utils.decimal_format(self.per_cancel_order)}%, which involves only {Utils.decimal_format(self.per_cancel_customer)}% of the customers.",
+            "interesting_fact1": f"The dataset originally contained {a}{Utils.formater(self.unclean_total_transaction)} transaction records. After cleaning, {a}{Utils.formater(self.total_transaction)} records remain. A total of {a}{Utils.formater(self.unclean_total_transaction - self.total_transaction)} records were removed due to negative prices or quantities (representing canceled transactions) and missing Customer IDs.",
+            "interesting_fact2": f"The percentage of canceled orders in the dataset is {a}{Utils.decimal_format(self.per_cancel_order)}%, which involves only {a}{Utils.decimal_format(self.per_cancel_customer)}% of the customers.",
             "interesting_fact3": f"The dataset contains {Utils.formater(self.num_countries)} unique countries.",
-            "interesting_fact4" : f"The most frequently purchased product in the dataset is {self.top_product}.",
-            "interesting_fact5": f"The country with the highest number of customers is {self.top_country_customers}.",
-            "interesting_fact6": f"The dataset originally contained {Utils.formater(self.unclean_unique_customers)} unique customers. After data cleaning, {Utils.formater(self.unique_customers)} unique customers remain."
+            "interesting_fact4" : f"The most frequently purchased product in the dataset is {a}{self.top_product}.",
+            "interesting_fact5": f"The country with the highest number of customers is {a}{self.top_country_customers}.",
+            "interesting_fact6": f"The dataset originally contained {a}{Utils.formater(self.unclean_unique_customers)} unique customers. After data cleaning, {a}{Utils.formater(self.unique_customers)} unique customers remain."
             }
+        if self.approximate:
+            interesting_facts["interesting_fact7"] = facts.error_note
         logger.info("Level 1 Data Successfully Created.")
         return {
             "description" : data_desc,
@@ -139,181 +369,86 @@ class DataLoader:
             "interesting_facts": interesting_facts            
         }
     
-    def _handle_level_2(self):
-        # 1. Plot - Monthly Revenue
-        try:
-            monthly_revenue = self.dataframe.groupby('Month')['Revenue'].sum().sort_index()
-            plt.figure(figsize=(12, 5))
-            ax = sns.lineplot(x=monthly_revenue.index, y=monthly_revenue.values, marker='o')
-            ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter('{x:,.0f}'))
-            plt.title("Monthly Revenue Trend")
-            plt.xticks(rotation=45)
-            plt.ylim(0, monthly_revenue.max() * 1.1)
-            plt.ylabel("Total Revenue ($)")
-            plt.xlabel("Month")
-            plt.grid(True) 
-            plt.savefig("./Data/1. monthly_revenue_plot.png", dpi=300, bbox_inches='tight')
-            plt.close()
-            logger.info("Successfully created and saved the Monthly Revenue Trend Plot.")
-        except Exception as e:
-            print(f"Got Error in 1st Plot: Monthly Revenue Trend: {e}")
-            logger.error(f"Got Error in 1st Plot: Monthly Revenue Trend: {e}")
-
-        # 2. Plot - Yearly Revenue
-        try:
-            yearly_revenue = self.dataframe.groupby('Year')['Revenue'].sum().sort_index()
-            plt.figure(figsize=(12, 5))
-            ax = sns.barplot(x=yearly_revenue.index, y=yearly_revenue.values)
-            ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter('{x:,.0f}'))
-            for i, value in enumerate(yearly_revenue.values):
-                plt.text(i, value + 1000, f'{value:,.0f}', ha='center', va='bottom', fontsize=10)
-            plt.title("Yearly Revenue Trend")
-            plt.ylim(0, yearly_revenue.max() * 1.1)
-            plt.ylabel("Total Revenue ($)")
-            plt.xlabel("Year")
-            plt.grid(True) 
-            plt.savefig("./Data/2. yearly_revenue_plot.png", dpi=300, bbox_inches='tight')
-            plt.close()
-            logger.info("Successfully created and saved the Yearly Revenue Trend Plot.")
-        except Exception as e:
-            print(f"Got Error in 2nd Plot: Yearly Revenue Trend: {e}")
-            logger.error(f"Got Error in 2nd Plot: Yearly Revenue Trend: {e}")
+    def _level_4_data(self, analytics, segments):
+        rows = [["Segment", "Customers", "Share", "Recency (days)", "Invoices", "Revenue", "Revenue Share"]]
+        for segment, values in segments.iterrows():
+            rows.append([segment, Utils.formater(int(values["Customers"])), f"{Utils.decimal_format(values['Customer Share'])}%", Utils.decimal_format(values["Recency"]), Utils.decimal_format(values["Frequency"]), Utils.currency_format(values["Monetary"]), f"{Utils.decimal_format(values['Revenue Share'])}%"])
+        customers = int(segments["Customers"].sum())
+        facts = {
+            "customer_fact1": f"{Utils.formater(customers)} customers are scored from 1 to 5 by quintile on Recency (days since their last purchase), Frequency (invoices) and Monetary value (revenue), and grouped into segments by their Recency and Frequency scores.",
+            "customer_fact2": f"The largest segment is {segments.index[0]} with {Utils.decimal_format(segments['Customer Share'].iloc[0])}% of the customers."
+        }
+        if "Champions" in segments.index:
+            champions = segments.loc["Champions"]
+            facts["customer_fact3"] = f"The Champions, {Utils.decimal_format(champions['Customer Share'])}% of the customers, bring {Utils.decimal_format(champions['Revenue Share'])}% of the revenue."
+        at_risk = segments.loc[segments.index.isin(["At Risk", "Can't Lose Them"])]
+        if len(at_risk):
+            facts["customer_fact4"] = f"{Utils.formater(int(at_risk['Customers'].sum()))} frequent customers ({Utils.decimal_format(at_risk['Customer Share'].sum())}%) have not purchased recently and are At Risk or Can't Lose Them."
+        retention = [analytics.mean_retention(age) for age in (1, 3)]
+        if not np.isnan(retention[0]):
+            facts["customer_fact5"] = f"On average {Utils.decimal_format(retention[0] * 100)}% of a monthly cohort buys again in the month after its first purchase" + (f" and {Utils.decimal_format(retention[1] * 100)}% three months after." if not np.isnan(retention[1]) else ".")
+        logger.info("Level 4 Data Successfully Created.")
+        return {"segment_table": rows, "customer_facts": facts}
 
-        # 3. Plot - Top 10 Country by revenue
-        try:
-            country_revenue = self.dataframe.groupby('Country')['Revenue'].sum().sort_values(ascending=False).head(10)
-            plt.figure(figsize=(12, 5))
-            ax = sns.barplot(x=country_revenue.index, y=country_revenue.values, hue=country_revenue.index)
-            ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter('{x:,.0f}'))
-            plt.ylim(0, country_revenue.max() * 1.1)
-            for i, value in enumerate(country_revenue.values):
-                plt.text(i, value + 1000, f'{value:,.0f}', ha='center', va='bottom', fontsize=10)
-            plt.title("Top 10 Countries by Revenue")
-            plt.xlabel("Country")
-            plt.ylabel("Total Revenue ($)")
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            plt.grid(True) 
-            plt.savefig("./Data/3. top_10_country_by_revenue.png", dpi=300, bbox_inches='tight')
-            plt.close()
-            logger.info("Successfully created and saved the Top 10 Countries by Revenue Plot.")
-        except Exception as e:
-            print(f"Got Error in Plot: Top 10 Countries by Revenue: {e}")
-            logger.error(f"Got Error in Plot: Top 10 Countries by Revenue: {e}")
+    def _level_2_data(self, total, last_date, series=None):
+        label = total.labels[0]
+        rows = [["Series", "Model", "Backtest Error", f"{label} Forecast", "80% Band"]]
+        def row(name, model, error, forecast, lower, upper):
+            return [name, model, f"{Utils.decimal_format(error)}%" if not np.isnan(error) else "-", Utils.currency_format(forecast), f"{Utils.currency_format(lower)} - {Utils.currency_format(upper)}"]
+        rows.append(row("Total", MODELS[total.model[0]], total.error_share[0] * 100, total.forecast[0, 0], total.lower[0, 0], total.upper[0, 0]))
+        facts = {"forecast_fact1": f"Revenue is forecast {HORIZON} months ahead with the model (Seasonal Naive, Exponential Smoothing or Linear Trend) that made the smallest error when forecasting each of the last {ORIGINS} complete months from the months before it."}
+        if series is not None:
+            for kind in ["Country", "Product"]:
+                top = series[series["Kind"] == kind].nlargest(10, "Revenue")
+                rows += [row(name, *values) for name, values in zip(top.index, top[["Model", "Error Share", "Forecast", "Lower", "Upper"]].itertuples(index=False))]
+            counts, models = series["Kind"].value_counts(), series["Model"].value_counts()
+            facts["forecast_fact1"] += f" Besides the total, {Utils.formater(int(counts.get('Country', 0)))} countries and the top {Utils.formater(int(counts.get('Product', 0)))} products by revenue are fitted together, " + ", ".join(f"{Utils.formater(int(models.get(model, 0)))} with {model}" for model in MODELS) + "."
+        facts["forecast_fact2"] = f"The total revenue of {label} is forecast at {Utils.currency_format(total.forecast[0, 0])} by {MODELS[total.model[0]]}, with an 80% band from {Utils.currency_format(total.lower[0, 0])} to {Utils.currency_format(total.upper[0, 0])}."
+        if MODELS.index("Seasonal Naive") not in total.candidates:
+            facts["forecast_fact3"] = "There are not enough complete months to backtest the Seasonal Naive model, which repeats the month a year earlier, so it is not used."
+        if pd.notna(last_date) and label == f"{last_date:%Y-%m}":
+            facts["forecast_fact4"] = f"The data ends on {last_date:%d/%m/%Y}, so {label} is a partial month; it is left out of the fitting and forecast in full."
+        logger.info("Revenue Forecast Data Successfully Created.")
+        return {"forecast_table": rows, "forecast_facts": facts}
 
-        # 4. Plot - Top 10 Purchase
-        try:
-            purchase_by_custome = self.dataframe.groupby(['CustomerID', 'Country'])['Revenue'].sum().sort_values(ascending=False).head(10)
-            purchase_by_custome = purchase_by_custome.reset_index()
-            plt.figure(figsize=(12,5))
-            ax = sns.barplot(x=purchase_by_custome["CustomerID"].astype(int).astype(str), y=purchase_by_custome["Revenue"], hue=purchase_by_custome["Country"])
-            ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter('{x:,.0f}'))
-            plt.ylim(0, purchase_by_custome["Revenue"].max() * 1.1 )
-            for i, value in enumerate(purchase_by_custome["Revenue"]):
-                plt.text(i, value + 1000, f'{value:,.0f}', ha='center', va='bottom', fontsize=10)
-            plt.title("Top 10 Customer by Purchase by Country")
-            plt.xlabel("Customer ID")
-            plt.ylabel("Total Purchase ($)")
-            plt.tight_layout()
-            plt.grid(True) 
-            plt.savefig("./Data/4. top_10_customer_by_purchase.png", dpi=300, bbox_inches='tight')
-            plt.close()
-            logger.info("Successfully created and saved the Top 10 Customer by Purchase by Country Plot.")
-        except Exception as e:
-            print(f"Got Error in Plot: Top 10 Customer by Purchase by Country: {e}")
-            logger.error(f"Got Error in Plot: Top 10 Customer by Purchase by Country: {e}")
-        
-
-        self.plot = {
-            "monthly_revenue_plot": "./Data/1. monthly_revenue_plot.png",
-            "yearly_revenue_plot": "./Data/2. yearly_revenue_plot.png",
-            "top_10_country_by_revenue": "./Data/3. top_10_country_by_revenue.png",
-            "top_10_customer_by_purchase": "./Data/4. top_10_customer_by_purchase.png"
+    def _basket_data(self, basket):
+        rules = basket.rules()
+        rows = [["If Bought", "Also Bought", "Invoices", "Support", "Confidence", "Lift"]]
+        for rule in rules.head(TOP_RULES).itertuples():
+            rows.append([basket.name(rule.Antecedent), basket.name(rule.Consequent), Utils.formater(int(rule.Invoices)), f"{Utils.decimal_format(rule.Support * 100)}%", f"{Utils.decimal_format(rule.Confidence * 100)}%", Utils.decimal_format(rule.Lift)])
+        facts = {
+            "basket_fact1": f"{Utils.formater(len(basket.frequent))} of the {Utils.formater(len(basket.item_ids))} products appear in at least {Utils.decimal_format(basket.min_support * 100)}% of the {Utils.formater(basket.invoices)} invoices ({Utils.formater(basket.min_count)} invoices), and {Utils.formater(len(rules))} pairs of them are bought together that often.",
+            "basket_fact2": "Confidence is the share of the invoices with the first product that also hold the second one, and a Lift above 1 means the two are bought together more often than by chance."
         }
-        return self.plot
+        if len(rules):
+            top = rules.loc[rules["Invoices"].idxmax()]
+            facts["basket_fact3"] = f"The products most often bought together are {basket.name(int(top['Antecedent']))} and {basket.name(int(top['Consequent']))}, in {Utils.formater(int(top['Invoices']))} invoices ({Utils.decimal_format(top['Support'] * 100)}%)."
+        logger.info("Market Basket Data Successfully Created.")
+        return {"basket_table": rows if len(rules) else [], "basket_facts": facts}
 
-    def _handle_level_3(self):
-        # 5. Plot - Top 10 Country by No. of Customers
-        try: 
-            customers_by_country = self.dataframe.groupby("Country")["CustomerID"].count().sort_values(ascending=False).head(10)
-            plt.figure(figsize=(12,5))
-            ax = sns.barplot(x=customers_by_country.index, y=customers_by_country.values, hue=customers_by_country.index)
-            ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter('{x:,.0f}'))
-            plt.ylim(0, customers_by_country.values.max() * 1.1 )
-            for i, value in enumerate(customers_by_country.values):
-                plt.text(i, value + 1000, f'{value:,.0f}', ha='center', va='bottom', fontsize=10)
-            plt.grid(True)
-            plt.ylabel("No. of Customers")
-            plt.xlabel("Country")
-            plt.title("Top 10 Country by No. of Customers")
-            plt.tight_layout()
-            plt.savefig("./Data/5. top_10_country_by_no_of_customers.png", dpi=300, bbox_inches='tight')
-            plt.close()
-            logger.info("Successfully created and saved the Top 10 Country by No. of Customers Plot.")
-        except Exception as e:
-            print(f"Got Error in Plot: Top 10 Country by No. of Customers: {e}")
-            logger.error(f"Got Error in Plot: Top 10 Country by No. of Customers: {e}")
+    def _render_plots(self, names):
+        #draws every not yet rendered plot of names in one process pool
+        pending = [name for name in names if name not in self.rendered]
+        if pending:
+            plot_data = self.plot_data(pending)
+            #matplotlib is only imported once a chart is drawn
+            from Core.plots import Plots
+            with Metrics.span("plots", charts=len(pending)):
+                self.rendered.update(Plots.render(plot_data, workers=self.plot_workers, cache=self.plot_cache, plot_dir=self.plot_dir, chart_format=self.chart_format))
+        return {name: self.rendered[name] for name in names}
 
-        # 6. Plot - Quantity VS Revenue for Top 10 Countries
-        try:
-            df_clean_fil = self.dataframe[(self.dataframe["Quantity"] < 5000) & (self.dataframe["Revenue"] < 10000)]
-            top_countries = df_clean_fil.groupby("Country")["Revenue"].sum().nlargest(10).index
-            quantity_revenue = df_clean_fil[df_clean_fil["Country"].isin(top_countries)]
-            plt.figure(figsize=(12,5))
-            ax = sns.scatterplot(data=quantity_revenue, x="Quantity", y="Revenue", hue="Country")
-            ax.get_xaxis().set_major_formatter(mpl.ticker.StrMethodFormatter('{x:,.0f}'))
-            ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter('{x:,.0f}'))
-            plt.grid(True)
-            plt.ylabel("Revenue")
-            plt.xlabel("Quantity")
-            plt.title("Quantity VS Revenue for Top 10 Countries")
-            plt.legend(title="Country", bbox_to_anchor=(1.05, 1), loc='upper left')
-            plt.tight_layout()
-            plt.savefig("./Data/6. top_10_country_qunatity_vs_revenue.png", dpi=300, bbox_inches='tight')
-            plt.close()
-            logger.info("Successfully created and saved the Quantity VS Revenue for Top 10 Countries Plot.")
-        except Exception as e:
-            print(f"Got Error in Plot: Quantity VS Revenue for Top 10 Countries: {e}")
-            logger.error(f"Got Error in Plot: Quantity VS Revenue for Top 10 Countries: {e}")
-        
-        # 7. Plot - Top 10 Products by Quantity Sold
-        try:
-            product_quantity = self.dataframe.groupby("Description")["Quantity"].count().nlargest(10)
-            plt.figure(figsize=(12,5))
-            ax = sns.barplot(y=product_quantity.index.str.slice(0,12) + "..", x=product_quantity.values, hue=product_quantity.index)
-            ax.get_xaxis().set_major_formatter(mpl.ticker.StrMethodFormatter('{x:,.0f}'))
-            plt.xlim(0, product_quantity.values.max() * 1.1 )
-            for i, value in enumerate(product_quantity.values):
-                plt.text(value + 1, i, f'{value:,.0f}', ha='left', va='center', fontsize=10)
-            plt.grid(True)
-            plt.xlabel("Quantity")
-            plt.ylabel("Product Description")
-            plt.title("Top 10 Products by Quantity Sold")
-            plt.tight_layout()
-            plt.savefig("./Data/7. top_10_product_by_quantity_sold.png", dpi=300, bbox_inches='tight')
-            plt.close()
-            logger.info("Successfully created and saved the Top 10 Products by Quantity Sold Plot.")
-        except Exception as e:
-            print(f"Got Error in Plot: Top 10 Products by Quantity Sold: {e}")
-            logger.error(f"Got Error in Plot: Top 10 Products by Quantity Sold: {e}")
+    def _handle_level_2(self):
+        self.plot = self._render_plots(LEVEL_2_PLOTS)
+        return {**self.plot, **self.pipeline["level_2"]}
 
-        # 8. Plot - Correlation Matrix
-        try:
-            corr_df = self.dataframe[["Quantity", "Revenue", "UnitPrice"]].corr()
-            plt.figure(figsize=(8, 6))
-            sns.heatmap(corr_df, annot=True, fmt=".2f", cmap="crest")
-            plt.title("Correlation Matrix")
-            plt.tight_layout()
-            plt.savefig("./Data/8. correlation_matrix_heatmap.png", dpi=300, bbox_inches='tight')
-            plt.close()
-            logger.info("Successfully created and saved the Correlation Matrix Plot.")
-        except Exception as e:
-            print(f"Got Error in Plot: Correlation Matrix: {e}")
-            logger.error(f"Got Error in Plot: Correlation Matrix: {e}")
-        self.plot = {
-            "top_10_country_by_no_of_customers": "./Data/5. top_10_country_by_no_of_customers.png",
-            "top_10_country_qunatity_vs_revenue": "./Data/6. top_10_country_qunatity_vs_revenue.png",
-            "top_10_product_by_quantity_sold": "./Data/7. top_10_product_by_quantity_sold.png",
-            "correlation_matrix_heatmap": "./Data/8. correlation_matrix_heatmap.png"
-        }
-        return self.plot
\ No newline at end of file
+    def _handle_level_3(self):
+        self.plot = self._render_plots(LEVEL_3_PLOTS)
+        #streamed and stored aggregates have no invoices to pair, their Level 3 is the charts only
+        if "market_basket" in self.pipeline:
+            return {**self.plot, **self.pipeline["basket_rules"]}
+        return self.plot
+
+    def _handle_level_4(self):
+        if "customer_analytics" not in self.pipeline:
+            raise ValueError("The Level 4 customer analytics need every transaction in memory, not streamed or stored aggregates")
+        return {**self._render_plots(LEVEL_4_PLOTS), **self.pipeline["level_4"]}
@@ -0,0 +1,42 @@
+import numpy as np
+
+#the Quantity vs Revenue scatter only shows transactions below these bounds, which are also its axes
+QUANTITY_LIMIT = 5000
+REVENUE_LIMIT = 10000
+#cells per axis, one cell is about the size of a marker on the printed chart
+GRID = 200
+
+def grid_cells(quantity, revenue, grid=GRID):
+    #the cell of every point on a fixed grid over the chart's axes, so cells of different chunks agree
+    column = np.clip((np.asarray(quantity, dtype=float) * (grid / QUANTITY_LIMIT)).astype(np.int64), 0, grid - 1)
+    row = np.clip((np.asarray(revenue, dtype=float) * (grid / REVENUE_LIMIT)).astype(np.int64), 0, grid - 1)
+    return column * grid + row
+
+
+def thin_points(groups, cells, cap, rng, grid=GRID):
+    """
+    Positions of the scatter points worth drawing, in row order. Every
+    occupied grid cell of every group keeps one point, so sparse regions and
+    outliers are all drawn and the outline of the cloud is unchanged. A
+    uniform sample of up to cap points per group keeps the relative density
+    of the crowded regions. groups are integer codes (the countries), a
+    group of at most cap points is kept whole. The result is bounded by
+    groups x (cap + grid²) points however many rows there are.
+    """
+    keep = np.zeros(len(groups), dtype=bool)
+    if len(groups) == 0:
+        return np.flatnonzero(keep)
+    #dense codes, one cell table per group present
+    groups = np.unique(np.asarray(groups, dtype=np.int64), return_inverse=True)[1]
+    #any point of a cell represents it, one write per row
+    representative = np.full((int(groups.max()) + 1) * grid * grid, -1, dtype=np.int64)
+    representative[groups * grid * grid + cells] = np.arange(len(groups))
+    keep[representative[representative >= 0]] = True
+    sizes = np.bincount(groups)
+    for group in np.flatnonzero(sizes):
+        members = groups == group
+        if sizes[group] <= cap:
+            keep |= members
+        else:
+            keep[rng.choice(np.flatnonzero(members), cap, replace=False)] = True
+    return np.flatnonzero(keep)
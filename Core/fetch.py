@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+from Core.logger import *
+
+logger = Logger().setup_logs()
+
+class FetchError(Exception):
+    pass
+
+
+class ArchiveError(FetchError):
+    #a complete download that is not a valid archive, it cannot be resumed
+    pass
+
+
+class ChecksumError(ArchiveError):
+    #the archive differs from the pinned digest, downloading it again would not help
+    pass
+
+
+class DatasetFetcher:
+    """
+    Download of the dataset archive that never holds it in memory: the body
+    is streamed to a .part file in chunks, an interrupted transfer resumes
+    with an HTTP Range request (If-Range on the ETag, so a changed file is
+    fetched again), failures are retried with exponential backoff, and only
+    a complete, checksummed, valid zip is renamed into place. Sizes and
+    sha256 digests of the archive and the extracted member are kept in a
+    JSON manifest, so a truncated or corrupted file is detected on the next
+    run instead of breaking it.
+    """
+    def __init__(self, url, path, manifest=None, sha256=None, chunk_size=64 * 1024, timeout=(10, 60), retries=5, backoff=1.0):
+        self.url = url
+        self.path = path
+        self.manifest_path = manifest or os.path.join(os.path.dirname(path) or ".", "manifest.json")
+        #a pinned digest of the archive, otherwise the first verified download is trusted
+        self.sha256 = sha256
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.part = path + ".part"
+
+    def _manifest(self):
+        try:
+            with open(self.manifest_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _record(self, name, entry):
+        manifest = self._manifest()
+        if entry is None:
+            manifest.pop(name, None)
+        else:
+            manifest[name] = entry
+        tmp = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def digest(self, path):
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as file:
+            while chunk := file.read(self.chunk_size):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def _check_archive(self, path, sha256):
+        #the digest first, then the zip structure and every member's CRC
+        if self.sha256 and sha256 != self.sha256:
+            raise ChecksumError(f"Checksum mismatch for {self.url}: expected {self.sha256}, got {sha256}")
+        try:
+            with zipfile.ZipFile(path) as archive:
+                broken = archive.testzip()
+        except zipfile.BadZipFile as e:
+            raise ArchiveError(f"The downloaded archive is not a valid zip: {e}")
+        if broken is not None:
+            raise ArchiveError(f"The member {broken} of the downloaded archive is corrupted")
+
+    def verify(self):
+        """
+        True if the archive is in place and matches the manifest (or, without
+        a manifest entry, is a valid zip, which is then recorded).
+        """
+        if not os.path.exists(self.path):
+            return False
+        name = os.path.basename(self.path)
+        entry = self._manifest().get(name)
+        size = os.path.getsize(self.path)
+        if entry is not None and entry.get("complete") and entry["size"] != size:
+            return False
+        sha256 = self.digest(self.path)
+        if entry is not None and entry.get("complete"):
+            return sha256 == entry["sha256"] and (not self.sha256 or sha256 == self.sha256)
+        try:
+            self._check_archive(self.path, sha256)
+        except FetchError as e:
+            logger.error(f"The archive {self.path} failed verification: {e}")
+            return False
+        self._record(name, {"url": self.url, "size": size, "sha256": sha256, "etag": None, "complete": True})
+        return True
+
+    def fetch(self):
+        """
+        Makes sure a verified archive is at path, downloading or resuming it
+        as needed. Returns the path.
+        """
+        if self.verify():
+            return self.path
+        if os.path.exists(self.path):
+            #an archive that failed verification is kept as a partial download, a truncated one is then resumed
+            logger.info(f"The archive {self.path} failed verification, resuming it as a partial download.")
+            os.replace(self.path, self.part)
+        import requests
+        print("Getting Data from the Source.")
+        for attempt in range(self.retries + 1):
+            try:
+                self._download(requests)
+                sha256 = self.digest(self.part)
+                self._check_archive(self.part, sha256)
+                break
+            except (requests.RequestException, OSError, FetchError) as e:
+                if isinstance(e, ArchiveError) and os.path.exists(self.part):
+                    #a complete but bad file cannot be resumed, start over; a truncated one is kept for the Range request
+                    os.remove(self.part)
+                    self._record(os.path.basename(self.path), None)
+                if isinstance(e, ChecksumError):
+                    raise
+                if attempt == self.retries:
+                    raise FetchError(f"Downloading {self.url} failed after {self.retries + 1} attempts: {e}")
+                delay = self.backoff * 2 ** attempt
+                print(f"Download interrupted ({e}), retrying in {delay:.0f} s.")
+                logger.error(f"Download of {self.url} interrupted on attempt {attempt + 1}, retrying in {delay:.1f} s: {e}")
+                time.sleep(delay)
+        os.replace(self.part, self.path)
+        entry = self._manifest().get(os.path.basename(self.path), {})
+        self._record(os.path.basename(self.path), {"url": self.url, "size": os.path.getsize(self.path), "sha256": sha256, "etag": entry.get("etag"), "complete": True})
+        logger.info(f"Downloaded and verified {self.path} ({sha256}).")
+        return self.path
+
+    def _download(self, requests):
+        name = os.path.basename(self.path)
+        offset = os.path.getsize(self.part) if os.path.exists(self.part) else 0
+        etag = self._manifest().get(name, {}).get("etag")
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if etag:
+                headers["If-Range"] = etag
+        with requests.get(self.url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:
+                #nothing left to send: the partial file is complete, or longer than the file now is
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                if total.isdigit() and int(total) == offset:
+                    return
+                os.remove(self.part)
+                raise FetchError(f"The partial download does not match {self.url}, starting over")
+            response.raise_for_status()
+            if response.status_code == 206 and response.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                mode = "ab"
+                logger.info(f"Resuming the download of {self.url} at byte {offset}.")
+            else:
+                #no range support or the file changed, the whole body follows
+                mode, offset = "wb", 0
+            length = response.headers.get("Content-Length")
+            expected = offset + int(length) if length is not None and "Content-Encoding" not in response.headers else None
+            self._record(name, {"url": self.url, "etag": response.headers.get("ETag"), "complete": False})
+            with open(self.part, mode) as file:
+                for chunk in response.iter_content(self.chunk_size):
+                    file.write(chunk)
+        size = os.path.getsize(self.part)
+        if expected is not None and size != expected:
+            raise FetchError(f"The download stopped at {size} of {expected} bytes")
+
+    def extract(self, member, target):
+        """
+        Extracts only member of the archive to target, through a temporary
+        file renamed into place once the member's CRC has been checked.
+        """
+        tmp = f"{target}.{os.getpid()}.tmp"
+        try:
+            with zipfile.ZipFile(self.path) as archive, archive.open(member) as source, open(tmp, "wb") as file:
+                shutil.copyfileobj(source, file, self.chunk_size)
+        except KeyError:
+            raise FetchError(f"The archive {self.path} has no member {member}")
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.replace(tmp, target)
+        self._record(os.path.basename(target), {"archive": os.path.basename(self.path), "member": member, "size": os.path.getsize(target), "sha256": self.digest(target)})
+        logger.info(f"Extracted {member} from {self.path} to {target}.")
+        return target
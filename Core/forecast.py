@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+
+#the forecast dataset behind the Level 2 chart
+FORECAST_PLOT_FACTS = {
+    "monthly_revenue_plot": "monthly_revenue_forecast"
+}
+
+MODELS = ["Seasonal Naive", "Exponential Smoothing", "Linear Trend"]
+SEASON = 12
+#months forecast, and months of one-step-ahead rolling-origin backtest
+HORIZON = 3
+ORIGINS = 6
+#smoothing factors tried for every series at once
+ALPHAS = np.linspace(0.05, 0.95, 19)
+#the bands hold 80% of the backtest errors of a normal model
+BAND_Z = 1.2816
+#products forecast besides every country, by revenue
+TOP_PRODUCTS = 1000
+
+def seasonal_naive(history, horizon):
+    #the same month a season earlier, NaN without a full season of history
+    series, months = history.shape
+    if months < SEASON:
+        return np.full((series, horizon), np.nan)
+    return history[:, months - SEASON + np.arange(horizon) % SEASON]
+
+
+def exponential_smoothing(history, horizon):
+    """
+    Simple exponential smoothing, flat forecasts of the last level. The
+    factor of every series is the one of ALPHAS with the smallest in-sample
+    one-step error; the levels of all series and factors are updated
+    together, one month at a time.
+    """
+    level = np.repeat(history[:, :1], len(ALPHAS), axis=1)
+    errors = np.zeros_like(level)
+    for month in range(1, history.shape[1]):
+        error = history[:, month:month + 1] - level
+        errors += error ** 2
+        level = level + ALPHAS * error
+    best = np.argmin(errors, axis=1)
+    return np.repeat(level[np.arange(len(history)), best][:, None], horizon, axis=1)
+
+
+def linear_trend(history, horizon):
+    #least squares line over the months, in closed form for all series
+    months = history.shape[1]
+    t = np.arange(months) - (months - 1) / 2
+    slope = history @ t / max(t @ t, 1e-12)
+    return history.mean(axis=1)[:, None] + slope[:, None] * ((months - 1) / 2 + np.arange(1, horizon + 1))
+
+
+FORECASTERS = [seasonal_naive, exponential_smoothing, linear_trend]
+#months of history each model needs
+MIN_HISTORY = [SEASON, 2, 3]
+
+def month_labels(first, count):
+    #"yyyy-mm" labels of count months from first, a month index (year * 12 + month - 1)
+    months = first + np.arange(count)
+    return [f"{month // 12}-{month % 12 + 1:02d}" for month in months]
+
+
+def month_number(label):
+    year, month = str(label).split("-")
+    return int(year) * 12 + int(month) - 1
+
+
+def complete_months(last_month, last_date):
+    #the month index after the last complete month, data ending before the last day of its month is a partial month
+    if last_date is not None and not pd.isna(last_date) and (last_date + pd.Timedelta(days=1)).month == last_date.month:
+        return last_month
+    return last_month + 1
+
+
+class SeriesForecast:
+    """
+    Forecasts of many monthly series at once, values being a series x month
+    array of complete months. Every model is fitted to all series together;
+    a rolling-origin backtest (fit on the months before each of the last
+    ORIGINS months, forecast that month) gives each model's errors, and every
+    series keeps the model with the smallest mean absolute error. The band
+    widens with the square root of the horizon from the root mean square
+    error of the chosen model's backtest. Models needing more history than
+    the first backtest origin leaves are not candidates.
+    """
+    def __init__(self, values, first_month, horizon=HORIZON, origins=ORIGINS):
+        values = np.asarray(values, dtype=float)
+        self.values = values
+        self.first_month = first_month
+        self.horizon = horizon
+        months = values.shape[1]
+        self.origins = np.arange(max(months - origins, min(MIN_HISTORY)), months)
+        self.candidates = [model for model, history in enumerate(MIN_HISTORY) if len(self.origins) and history <= self.origins[0]]
+        #model x series x origin one-step errors
+        self.errors = np.full((len(MODELS), len(values), len(self.origins)), np.nan)
+        for model in self.candidates:
+            for i, origin in enumerate(self.origins):
+                self.errors[model, :, i] = values[:, origin] - FORECASTERS[model](values[:, :origin], 1)[:, 0]
+        mae = np.full((len(MODELS), len(values)), np.inf)
+        if self.candidates:
+            mae[self.candidates] = np.abs(self.errors[self.candidates]).mean(axis=2)
+        else:
+            #too short to backtest, smoothing needs a single month
+            mae[1] = 0
+        self.model = np.argmin(mae, axis=0)
+        rows = np.arange(len(values))
+        chosen = self.errors[self.model, rows]
+        self.rmse = np.sqrt((chosen ** 2).mean(axis=1)) if len(self.origins) else np.full(len(values), np.nan)
+        #share of the backtest months' revenue missed, NaN for series without any
+        actual = np.abs(values[:, self.origins]).sum(axis=1)
+        self.error_share = np.divide(np.abs(chosen).sum(axis=1), actual, out=np.full(len(values), np.nan), where=actual > 0)
+        usable = self.candidates or [1]
+        forecasts = np.stack([FORECASTERS[model](values, horizon) if model in usable else np.full((len(values), horizon), np.nan) for model in range(len(MODELS))])
+        self.forecast = forecasts[self.model, rows]
+        spread = BAND_Z * np.nan_to_num(self.rmse)[:, None] * np.sqrt(np.arange(1, horizon + 1))
+        self.lower = np.maximum(self.forecast - spread, 0)
+        self.upper = self.forecast + spread
+
+    @property
+    def labels(self):
+        #the months forecast
+        return month_labels(self.first_month + self.values.shape[1], self.horizon)
+
+    def summary(self, names):
+        """
+        One row per series: the model, the backtest error and the forecast
+        of the next month with its band.
+        """
+        return pd.DataFrame({
+            "Model": np.array(MODELS)[self.model],
+            "Error Share": self.error_share * 100,
+            "Forecast": self.forecast[:, 0],
+            "Lower": self.lower[:, 0],
+            "Upper": self.upper[:, 0]
+        }, index=pd.Index(names, name="Series"))
+
+
+def revenue_forecast(monthly_revenue, last_date=None):
+    """
+    The forecast of the total revenue, monthly_revenue being the "yyyy-mm"
+    labelled sums of a report. Months without sales count as 0, a partial
+    last month is left out; a single partial month is all a short slice has.
+    """
+    months = np.array([month_number(label) for label in monthly_revenue.index])
+    first = int(months.min())
+    end = max(complete_months(int(months.max()), last_date), first + 1)
+    values = np.zeros(end - first)
+    keep = months < end
+    values[months[keep] - first] = monthly_revenue.to_numpy(dtype=float)[keep]
+    return SeriesForecast(values[None, :], first)
+
+
+def chart_data(monthly_revenue, forecast):
+    """
+    The Monthly Revenue chart: the history, Partial marking the months from
+    the first one forecast on, and the Forecast with its Lower / Upper band,
+    starting from the last complete month so the line joins the history.
+    """
+    future = forecast.labels
+    labels = list(monthly_revenue.index)
+    chart = pd.DataFrame({"Revenue": monthly_revenue.to_numpy(dtype=float)}, index=pd.Index(labels, name=monthly_revenue.index.name))
+    chart = chart.reindex(labels + [label for label in future if label not in labels])
+    last = month_labels(forecast.first_month + forecast.values.shape[1] - 1, 1)[0]
+    for column, values in [("Forecast", forecast.forecast), ("Lower", forecast.lower), ("Upper", forecast.upper)]:
+        chart[column] = np.nan
+        chart.loc[future, column] = values[0]
+        if last in chart.index:
+            chart.loc[last, column] = chart.loc[last, "Revenue"]
+    chart["Partial"] = chart["Revenue"].notna() & np.isin(chart.index, future)
+    chart.attrs["model"] = MODELS[forecast.model[0]]
+    return chart
+
+
+def monthly_totals(codes, months, weights, series, first, count):
+    #series x month sums, codes of -1 and months outside first .. first + count are left out
+    keep = (codes >= 0) & (months >= first) & (months < first + count)
+    cells = codes[keep] * count + months[keep] - first
+    return np.bincount(cells, weights=weights[keep], minlength=series * count).reshape(series, count)
+
+
+def series_forecast(dataframe, month_keys, last_date=None, top_products=TOP_PRODUCTS):
+    """
+    Forecasts of every country and of the top_products products by revenue,
+    fitted as one batch. month_keys are the yyyymm keys of the rows. One row
+    per series: its Kind (Country / Product), history Revenue and the
+    SeriesForecast summary.
+    """
+    keys = np.asarray(month_keys)
+    months = keys // 100 * 12 + keys % 100 - 1
+    first = int(months.min())
+    count = max(complete_months(int(months.max()), last_date), first + 1) - first
+    revenue = dataframe["Revenue"].to_numpy(dtype=float)
+    values, names, kinds, totals = [], [], [], []
+    for kind, column, limit in [("Country", "Country", None), ("Product", "Description", top_products)]:
+        codes, uniques = pd.factorize(dataframe[column])
+        total = np.bincount(codes[codes >= 0], weights=revenue[codes >= 0], minlength=len(uniques))
+        chosen = np.argsort(-total, kind="stable")[:limit]
+        #the chosen series numbered by revenue, the rest and missing values (code -1, the extra last slot) -1
+        lookup = np.full(len(uniques) + 1, -1)
+        lookup[chosen] = np.arange(len(chosen))
+        values.append(monthly_totals(lookup[codes], months, revenue, len(chosen), first, count))
+        names += [str(name).strip() for name in np.asarray(uniques)[chosen]]
+        kinds += [kind] * len(chosen)
+        totals.append(total[chosen])
+    forecast = SeriesForecast(np.concatenate(values), first)
+    summary = forecast.summary(names)
+    summary.insert(0, "Kind", kinds)
+    summary.insert(1, "Revenue", np.concatenate(totals))
+    return summary
@@ -0,0 +1,92 @@
+import os
+import sys
+import pickle
+import numpy as np
+from Core.logger import *
+from Core.utils import *
+from Core.cache import DataCache
+from Core.data_loader import DataLoader, EXCHANGE_RATE
+from Core.streaming import PartialAggregates, StreamingLoader
+from Core.metrics import Metrics
+
+logger = Logger().setup_logs()
+
+class IncrementalStore:
+    """
+    Persisted PartialAggregates behind the reports. New transaction files
+    (deltas) are cleaned with the usual rules and folded in, so the cost of an
+    update depends on the delta size, not on the history already stored. Each
+    delta is recorded by content hash and is never applied twice.
+    """
+    version = 7
+
+    def __init__(self, path="./Data/State/aggregates.pkl", scatter_cap=5000, approximate=False, exchange_rate=EXCHANGE_RATE):
+        self.path = path
+        #the mode and exchange rate are fixed when the state is created, a loaded state keeps its own
+        self.aggregates = PartialAggregates(scatter_cap, approximate, exchange_rate)
+        self.applied = []
+        if os.path.exists(self.path):
+            self.load()
+
+    def load(self):
+        with open(self.path, "rb") as file:
+            state = pickle.load(file)
+        if state.get("version") != self.version:
+            raise ValueError(f"Aggregate state {self.path} has an unsupported version: {state.get('version')}")
+        self.aggregates = state["aggregates"]
+        self.applied = state["applied"]
+        logger.info(f"Loaded the Aggregate State covering {Utils.formater(self.aggregates.raw_rows)} rows from {len(self.applied)} files.")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as file:
+            pickle.dump({"version": self.version, "aggregates": self.aggregates, "applied": self.applied}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        logger.info(f"Saved the Aggregate State to {self.path}.")
+
+    def apply(self, delta_path, chunksize=100_000):
+        digest = DataCache.file_hash(delta_path)
+        if digest in (entry["sha256"] for entry in self.applied):
+            print(f"Skipping {delta_path}, it has already been applied.")
+            logger.info(f"Skipping {delta_path}, it has already been applied.")
+            return False
+        with Metrics.span("append", path=delta_path) as record:
+            delta = PartialAggregates(self.aggregates.scatter_cap, self.aggregates.approximate, self.aggregates.exchange_rate)
+            #seeding from the content keeps the scatter sample reproducible
+            rows = StreamingLoader.fold_file(delta_path, chunksize, delta, np.random.default_rng(int(digest[:16], 16)))
+            self.aggregates.merge(delta)
+            self.applied.append({"path": delta_path, "sha256": digest, "rows": rows})
+            self.save()
+            record["rows"] = rows
+        logger.info(f"Applied {Utils.formater(rows)} new rows from {delta_path} to the Aggregate State.")
+        return True
+
+    def reset(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.aggregates = PartialAggregates(self.aggregates.scatter_cap, self.aggregates.approximate, self.aggregates.exchange_rate)
+        self.applied = []
+        logger.info(f"Aggregate State at {self.path} reset.")
+
+
+class IncrementalLoader(DataLoader):
+    """
+    DataLoader served from an IncrementalStore after folding in any new deltas.
+    """
+    def __init__(self, state_path="./Data/State/aggregates.pkl", deltas=(), chunksize=100_000, plot_workers=None, plot_cache=True, approximate=False, exchange_rate=EXCHANGE_RATE, chart_format="png", scatter_cap=5000):
+        self._setup_rendering(plot_workers, plot_cache, chart_format=chart_format)
+        try:
+            self.store = IncrementalStore(state_path, scatter_cap, approximate=approximate, exchange_rate=exchange_rate)
+        except (OSError, ValueError, pickle.UnpicklingError) as e:
+            print(f"Got the Error while Reading the Aggregate State: {e}")
+            logger.error(f"Got the Error while Reading the Aggregate State: {e}")
+            sys.exit(1)
+        for delta in deltas:
+            self.store.apply(delta, chunksize)
+        if self.store.aggregates.rows == 0:
+            print(f"The Aggregate State at {state_path} is empty, append a transaction file first.")
+            logger.error(f"The Aggregate State at {state_path} is empty, append a transaction file first.")
+            sys.exit(1)
+        self.scatter_cap = self.store.aggregates.scatter_cap
+        self._setup_pipeline(self.store.aggregates.facts())
@@ -16,4 +16,15 @@ class Logger:
                     level = logging.INFO,
                     format = "%(asctime)s:%(name)s:%(levelname)s:%(message)s", 
                     datefmt = "%d/%m/%Y %I:%M:%S %p")
-        return logging.getLogger("RetailApp")
\ No newline at end of file
+        return logging.getLogger("RetailApp")
+
+    def setup_metrics(self):
+        #per-stage timings as one JSON object per line, kept apart from log.log
+        metrics = logging.getLogger("RetailApp.metrics")
+        if not metrics.handlers:
+            handler = logging.FileHandler(os.path.join(self.log_dir, "metrics.jsonl"), delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            metrics.addHandler(handler)
+            metrics.setLevel(logging.INFO)
+            metrics.propagate = False
+        return metrics
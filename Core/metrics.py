@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import resource
+import functools
+from contextlib import contextmanager
+from Core.logger import *
+
+logger = Logger().setup_logs()
+metrics_logger = Logger().setup_metrics()
+
+def peak_rss():
+    #high-water mark of the resident set in bytes, resettable on Linux
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss():
+    #elsewhere the high-water mark only grows, so deltas read as 0 once a peak is passed
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+class Metrics:
+    """
+    Per-stage instrumentation. A span records wall time, CPU time, peak RSS
+    delta and row counts of a stage; records go to Logs/metrics.jsonl as JSON
+    lines and are kept for the end-of-run summary. Spans nest, and with
+    profiling on, each innermost span runs under cProfile so the slowest one
+    can be dumped.
+    """
+    run = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    records = []
+    profile = False
+    _stack = []
+    _slowest = None
+
+    @classmethod
+    @contextmanager
+    def span(cls, stage, rows=None, emit=True, **fields):
+        """
+        Times the body as stage. The yielded record can be updated, e.g. with
+        the row count once it is known. emit=False only returns the record,
+        for spans run in worker processes and recorded by the parent.
+        """
+        record = {"stage": stage, "parent": cls._stack[-1]["stage"] if cls._stack else None, "start": time.time(), "rows": rows, **fields}
+        if cls._stack:
+            parent = cls._stack[-1]
+            #the parent is no longer an innermost span, its profile is dropped
+            if parent["_profiler"] is not None:
+                parent["_profiler"].disable()
+                parent["_profiler"] = None
+            parent["_peak"] = max(parent["_peak"], peak_rss())
+        reset_peak_rss()
+        record["_rss"] = record["_peak"] = peak_rss()
+        record["_profiler"] = cProfile.Profile() if cls.profile else None
+        cls._stack.append(record)
+        wall, cpu = time.perf_counter(), time.process_time()
+        if record["_profiler"] is not None:
+            record["_profiler"].enable()
+        try:
+            yield record
+        finally:
+            profiler = record.pop("_profiler")
+            if profiler is not None:
+                profiler.disable()
+            record["wall_s"] = round(time.perf_counter() - wall, 4)
+            record["cpu_s"] = round(time.process_time() - cpu, 4)
+            peak = max(record.pop("_peak"), peak_rss())
+            record["rss_peak_delta_mb"] = round((peak - record.pop("_rss")) / 2**20, 2)
+            cls._stack.pop()
+            if cls._stack:
+                cls._stack[-1]["_peak"] = max(cls._stack[-1]["_peak"], peak)
+            if profiler is not None and (cls._slowest is None or record["wall_s"] > cls._slowest[0]):
+                cls._slowest = (record["wall_s"], stage, profiler)
+            if emit:
+                cls.record(record)
+
+    @classmethod
+    def timed(cls, stage):
+        """
+        Decorator form of span for methods that make up a whole stage.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with cls.span(stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def record(cls, record):
+        if record.get("parent") is None and cls._stack:
+            record["parent"] = cls._stack[-1]["stage"]
+        record = {"run": cls.run, **record}
+        cls.records.append(record)
+        metrics_logger.info(json.dumps(record, default=str))
+
+    @classmethod
+    def summary(cls):
+        """
+        Table of the recorded stages, nested under their parent stage.
+        """
+        depth = {}
+        lines = [f"{'Stage':<48}{'Wall (s)':>10}{'CPU (s)':>10}{'Peak RSS +MB':>14}{'Rows':>14}"]
+        #records are written as stages finish, the table lists them as they started
+        for record in sorted(cls.records, key=lambda record: record["start"]):
+            depth[record["stage"]] = depth.get(record["parent"], -1) + 1
+            rows = "" if record.get("rows") is None else f"{record['rows']:,}"
+            name = "  " * depth[record["stage"]] + record["stage"]
+            lines.append(f"{name:<48}{record['wall_s']:>10.3f}{record['cpu_s']:>10.3f}{record['rss_peak_delta_mb']:>14.2f}{rows:>14}")
+        return "\n".join(lines)
+
+    @classmethod
+    def dump_profile(cls, path):
+        """
+        Writes the cProfile stats of the slowest innermost stage to path.
+        """
+        if cls._slowest is None:
+            return None
+        seconds, stage, profiler = cls._slowest
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profiler.dump_stats(path)
+        logger.info(f"Profile of the slowest stage {stage} ({seconds:.3f} s) written to {path}.")
+        return stage, seconds, pstats.Stats(path)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+class PartitionIndex:
+    """
+    Rows of a frame grouped by an integer key (Country category codes,
+    yyyymm months): the row positions ordered by key, from one stable
+    argsort, plus the start offset of every key. A partition, or a set of
+    them, is then selected in time proportional to its size instead of a
+    scan of the whole frame, and per partition totals are segmented sums.
+    """
+    def __init__(self, keys, labels=None):
+        keys = np.asarray(keys)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys, starts = np.unique(keys[self.order], return_index=True)
+        self.offsets = np.append(starts, len(keys))
+        #label -> key, for category codes
+        self.labels = labels
+
+    @classmethod
+    def from_arrays(cls, order, keys, offsets, labels=None):
+        #an index built elsewhere, e.g. attached from a Snapshot
+        index = cls.__new__(cls)
+        index.order, index.keys, index.offsets, index.labels = order, keys, offsets, labels
+        return index
+
+    @classmethod
+    def by_category(cls, column):
+        if not isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype("category")
+        return cls(column.cat.codes.to_numpy(), {label: code for code, label in enumerate(column.cat.categories)})
+
+    def key(self, label):
+        return self.labels.get(label, -1) if self.labels is not None else label
+
+    def positions(self, keys):
+        """
+        Row positions of the partitions of keys, in the frame's row order.
+        Keys without rows are skipped.
+        """
+        keys = np.asarray(keys, dtype=self.keys.dtype)
+        found = np.searchsorted(self.keys, keys)
+        found = found[(found < len(self.keys)) & (self.keys[np.minimum(found, len(self.keys) - 1)] == keys)]
+        if len(found) == 0:
+            return np.empty(0, dtype=np.int64)
+        if len(found) == 1:
+            return self.order[self.offsets[found[0]]:self.offsets[found[0] + 1]]
+        #the stable argsort keeps every partition in row order, only the merge needs a sort
+        return np.sort(np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in found]))
+
+    def sizes(self):
+        return pd.Series(np.diff(self.offsets), index=self.keys)
+
+    def totals(self, values):
+        #sum of values per key, over the rows ordered by key
+        values = np.asarray(values)[self.order]
+        return pd.Series(np.add.reduceat(values, self.offsets[:-1]) if len(values) else values[:0], index=self.keys)
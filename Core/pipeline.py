@@ -0,0 +1,62 @@
+import pandas as pd
+from Core.logger import *
+from Core.metrics import Metrics
+
+logger = Logger().setup_logs()
+
+class Pipeline:
+    """
+    Lazily evaluated dependency graph. Every node declares the nodes it reads,
+    is computed on first access only and is memoized, so a report pulls in
+    just what it needs and later reports reuse earlier results. A transient
+    node (e.g. an intermediate frame) is released once every node reading it
+    has been computed. Values can also be seeded, e.g. from aggregates that
+    were computed elsewhere.
+    """
+    def __init__(self):
+        self.nodes = {}
+        self.values = {}
+        self._resolving = set()
+
+    def add(self, name, function, inputs=(), transient=False):
+        self.nodes[name] = {"function": function, "inputs": tuple(inputs), "transient": transient}
+        return self
+
+    def seed(self, **values):
+        self.values.update(values)
+        return self
+
+    def __contains__(self, name):
+        return name in self.values or name in self.nodes
+
+    def __getitem__(self, name):
+        if name in self.values:
+            return self.values[name]
+        if name not in self.nodes:
+            raise KeyError(f"The pipeline has no node named {name}")
+        if name in self._resolving:
+            raise ValueError(f"The pipeline node {name} depends on itself")
+        node = self.nodes[name]
+        self._resolving.add(name)
+        try:
+            inputs = [self[source] for source in node["inputs"]]
+            with Metrics.span(name) as record:
+                value = node["function"](*inputs)
+                if isinstance(value, (pd.DataFrame, pd.Series)):
+                    record["rows"] = len(value)
+        finally:
+            self._resolving.discard(name)
+        self.values[name] = value
+        self._release(node["inputs"])
+        return value
+
+    def _release(self, names):
+        for name in names:
+            if self.nodes.get(name, {}).get("transient") and name in self.values:
+                readers = [reader for reader, node in self.nodes.items() if name in node["inputs"]]
+                if all(reader in self.values for reader in readers):
+                    del self.values[name]
+                    logger.info(f"Released the intermediate {name} from the pipeline.")
+
+    def computed(self):
+        return list(self.values)
@@ -0,0 +1,107 @@
+import os
+import json
+import shutil
+import hashlib
+import inspect
+import pandas as pd
+from Core.logger import *
+
+logger = Logger().setup_logs()
+
+class PlotCache:
+    """
+    Content-addressed store of rendered charts. A chart's key is the hash of
+    its input data, its plot parameters (figure size, dpi, title, formatter)
+    and the source of its drawing function, so a hit can reuse the stored PNG
+    (or recorded vector chart) without touching matplotlib. The directory is
+    capped in size and evicted least recently used first.
+    """
+    def __init__(self, cache_dir="./Data/PlotCache", max_bytes=64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def data_digest(digest, data):
+        if isinstance(data, (pd.Series, pd.DataFrame)):
+            digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+            names = list(data.columns) if isinstance(data, pd.DataFrame) else [data.name]
+            digest.update(repr((names, list(data.index.names), str(data.dtypes))).encode())
+        else:
+            digest.update(repr(data).encode())
+
+    def key(self, name, data, params, draw):
+        digest = hashlib.sha256()
+        digest.update(name.encode())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        digest.update(inspect.getsource(draw).encode())
+        self.data_digest(digest, data)
+        return digest.hexdigest()
+
+    def _entry(self, key, suffix=".png"):
+        return os.path.join(self.cache_dir, f"{key}{suffix}")
+
+    def fetch(self, key, path):
+        """
+        Copy the cached chart for key to path; returns False on a miss.
+        """
+        entry = self._entry(key)
+        try:
+            shutil.copyfile(entry, path)
+            #mtime doubles as the LRU clock
+            os.utime(entry)
+        except FileNotFoundError:
+            #a miss, or evicted meanwhile by another process
+            return False
+        return True
+
+    def store(self, key, path):
+        if not os.path.exists(path):
+            return
+        #one temporary file per process, the cache can be shared by parallel report workers
+        tmp = f"{self._entry(key)}.{os.getpid()}.tmp"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, self._entry(key))
+        self.evict()
+
+    def fetch_bytes(self, key, suffix):
+        #charts kept in memory (the vector format) are cached as their bytes; None on a miss
+        entry = self._entry(key, suffix)
+        try:
+            with open(entry, "rb") as file:
+                data = file.read()
+            os.utime(entry)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def store_bytes(self, key, data, suffix):
+        tmp = f"{self._entry(key, suffix)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as file:
+            file.write(data)
+        os.replace(tmp, self._entry(key, suffix))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for file in os.listdir(self.cache_dir):
+            if file.endswith((".png", ".json")):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, file))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file))
+        total = sum(size for _, size, _ in entries)
+        for _, size, file in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, file))
+            except FileNotFoundError:
+                pass
+            total -= size
+            logger.info(f"Evicted cached plot {file} from the Plot Cache.")
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
@@ -0,0 +1,38 @@
+import os
+
+#chart names, files and parameters, kept apart from Core/plots.py so they can be read without importing matplotlib
+PLOT_PATHS = {
+    "monthly_revenue_plot": "./Data/1. monthly_revenue_plot.png",
+    "yearly_revenue_plot": "./Data/2. yearly_revenue_plot.png",
+    "top_10_country_by_revenue": "./Data/3. top_10_country_by_revenue.png",
+    "top_10_customer_by_purchase": "./Data/4. top_10_customer_by_purchase.png",
+    "top_10_country_by_no_of_customers": "./Data/5. top_10_country_by_no_of_customers.png",
+    "top_10_country_qunatity_vs_revenue": "./Data/6. top_10_country_qunatity_vs_revenue.png",
+    "top_10_product_by_quantity_sold": "./Data/7. top_10_product_by_quantity_sold.png",
+    "correlation_matrix_heatmap": "./Data/8. correlation_matrix_heatmap.png",
+    "rfm_segments_plot": "./Data/9. rfm_segments_plot.png",
+    "cohort_retention_heatmap": "./Data/10. cohort_retention_heatmap.png"
+}
+
+PLOT_PARAMS = {
+    "monthly_revenue_plot": {"figsize": (12, 5), "dpi": 300, "title": "Monthly Revenue Trend", "formatter": "{x:,.0f}"},
+    "yearly_revenue_plot": {"figsize": (12, 5), "dpi": 300, "title": "Yearly Revenue Trend", "formatter": "{x:,.0f}"},
+    "top_10_country_by_revenue": {"figsize": (12, 5), "dpi": 300, "title": "Top 10 Countries by Revenue", "formatter": "{x:,.0f}"},
+    "top_10_customer_by_purchase": {"figsize": (12, 5), "dpi": 300, "title": "Top 10 Customer by Purchase by Country", "formatter": "{x:,.0f}"},
+    "top_10_country_by_no_of_customers": {"figsize": (12, 5), "dpi": 300, "title": "Top 10 Country by No. of Customers", "formatter": "{x:,.0f}"},
+    "top_10_country_qunatity_vs_revenue": {"figsize": (12, 5), "dpi": 300, "title": "Quantity VS Revenue for Top 10 Countries", "formatter": "{x:,.0f}"},
+    "top_10_product_by_quantity_sold": {"figsize": (12, 5), "dpi": 300, "title": "Top 10 Products by Quantity Sold", "formatter": "{x:,.0f}"},
+    "correlation_matrix_heatmap": {"figsize": (8, 6), "dpi": 300, "title": "Correlation Matrix", "formatter": ".2f"},
+    "rfm_segments_plot": {"figsize": (12, 5), "dpi": 300, "title": "Customers by RFM Segment", "formatter": "{x:,.0f}"},
+    "cohort_retention_heatmap": {"figsize": (12, 7), "dpi": 300, "title": "Monthly Cohort Retention", "formatter": ".0%"}
+}
+
+def plot_paths(names, plot_dir=None):
+    #the default chart files, or the same file names under plot_dir
+    return {name: PLOT_PATHS[name] if plot_dir is None else os.path.join(plot_dir, os.path.basename(PLOT_PATHS[name])) for name in names}
+
+PLOT_TITLES = {name: params["title"] for name, params in PLOT_PARAMS.items()}
+
+LEVEL_2_PLOTS = ["monthly_revenue_plot", "yearly_revenue_plot", "top_10_country_by_revenue", "top_10_customer_by_purchase"]
+LEVEL_3_PLOTS = ["top_10_country_by_no_of_customers", "top_10_country_qunatity_vs_revenue", "top_10_product_by_quantity_sold", "correlation_matrix_heatmap"]
+LEVEL_4_PLOTS = ["rfm_segments_plot", "cohort_retention_heatmap"]
@@ -0,0 +1,282 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import matplotlib as mpl
+#charts are only ever written to files, the non-interactive backend is also safe in worker processes
+mpl.use("Agg")
+import matplotlib.pyplot as plt
+import seaborn as sns
+from Core.logger import *
+from Core.metrics import Metrics
+from Core.plot_specs import plot_paths, PLOT_PARAMS, PLOT_TITLES
+from Core.config import PRINT_DPI
+#registers the vector format with savefig
+from Core.vector import FORMAT, ChartDrawing
+
+logger = Logger().setup_logs()
+
+def _render_task(name, data, path, params):
+    #runs in a worker process, only the plot's own small dataset is pickled over; the timing goes back to the parent
+    #without a path the chart is recorded in memory and its bytes go back too
+    with Metrics.span(f"plot:{name}", rows=len(data), emit=False) as record:
+        target = io.BytesIO() if path is None else path
+        getattr(Plots, name)(data, target, params)
+    return record, target.getvalue() if path is None else None
+
+
+class Plots:
+    """
+    Chart drawing for the Level 2 and Level 3 reports. Every plot takes only
+    its pre-aggregated data, so any loader (in-memory or streaming) can feed it
+    and the plots can be drawn in parallel worker processes.
+    """
+    @classmethod
+    def render(cls, plot_data, workers=None, cache=None, plot_dir=None, chart_format="png"):
+        """
+        plot_data maps a plot name to its pre-aggregated data. Charts found in
+        the PlotCache are reused as is; the rest are drawn across a process
+        pool (workers=1 draws in-process). Failures are isolated per plot.
+        PNG charts are written to ./Data, or to plot_dir if given, and their
+        paths returned. The vector format records them in memory instead and
+        returns ChartDrawings (None for a failed chart).
+        """
+        vector = chart_format == FORMAT
+        params = {name: cls.params(name, chart_format) for name in plot_data}
+        paths = dict.fromkeys(plot_data) if vector else plot_paths(plot_data, plot_dir)
+        if plot_dir is not None and not vector:
+            os.makedirs(plot_dir, exist_ok=True)
+        charts = dict.fromkeys(plot_data)
+        keys = {}
+        if cache is not None:
+            versions = {"matplotlib": mpl.__version__, "seaborn": sns.__version__}
+            hits = set()
+            for name, data in plot_data.items():
+                keys[name] = cache.key(name, data, {**params[name], **versions}, getattr(cls, name))
+                if vector:
+                    recorded = cache.fetch_bytes(keys[name], ".json")
+                    if recorded is not None:
+                        charts[name] = ChartDrawing.from_bytes(recorded)
+                if charts[name] is not None or not vector and cache.fetch(keys[name], paths[name]):
+                    hits.add(name)
+                    logger.info(f"Reused the cached {PLOT_TITLES[name]} Plot.")
+            plot_data = {name: data for name, data in plot_data.items() if name not in hits}
+        errors, recorded = cls._draw(plot_data, paths, params, workers)
+        for name in plot_data:
+            cls._report(name, errors.get(name))
+            if name in errors:
+                continue
+            if vector:
+                charts[name] = ChartDrawing.from_bytes(recorded[name])
+                if cache is not None:
+                    cache.store_bytes(keys[name], recorded[name], ".json")
+            elif cache is not None:
+                cache.store(keys[name], paths[name])
+        return charts if vector else paths
+
+    @staticmethod
+    def params(name, chart_format="png"):
+        #a vector chart is recorded in points, only its rasterized artists have a resolution
+        if chart_format == FORMAT:
+            return {**PLOT_PARAMS[name], "format": FORMAT, "dpi": PRINT_DPI}
+        return PLOT_PARAMS[name]
+
+    @staticmethod
+    def _draw(plot_data, paths, params, workers):
+        errors, recorded = {}, {}
+        workers = min(workers or os.cpu_count() or 1, max(len(plot_data), 1))
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {name: pool.submit(_render_task, name, data, paths[name], params[name]) for name, data in plot_data.items()}
+                    for name, future in futures.items():
+                        if future.exception() is not None:
+                            errors[name] = future.exception()
+                        else:
+                            record, recorded[name] = future.result()
+                            Metrics.record(record)
+                return errors, recorded
+            except (OSError, RuntimeError) as e:
+                logger.error(f"Process pool for plotting unavailable, drawing in-process: {e}")
+        for name, data in plot_data.items():
+            try:
+                record, recorded[name] = _render_task(name, data, paths[name], params[name])
+                Metrics.record(record)
+            except Exception as e:
+                errors[name] = e
+        return errors, recorded
+
+    @staticmethod
+    def _save(path, params):
+        #path is a file, or a buffer for the vector format
+        plt.savefig(path, dpi=params["dpi"], bbox_inches='tight', format=params.get("format"))
+        plt.close()
+
+    @staticmethod
+    def _report(name, error):
+        title = PLOT_TITLES[name]
+        if error is None:
+            logger.info(f"Successfully created and saved the {title} Plot.")
+        else:
+            print(f"Got Error in Plot: {title}: {error}")
+            logger.error(f"Got Error in Plot: {title}: {error}")
+
+    # 1. Plot - Monthly Revenue
+    @staticmethod
+    def monthly_revenue_plot(monthly_revenue, path, params):
+        #the history alone, or with the forecast months and their band
+        chart = monthly_revenue.to_frame("Revenue") if isinstance(monthly_revenue, pd.Series) else monthly_revenue
+        plt.figure(figsize=params["figsize"])
+        x = np.arange(len(chart))
+        complete = chart["Revenue"].notna() & ~chart.get("Partial", pd.Series(False, index=chart.index)).astype(bool)
+        ax = sns.lineplot(x=x[complete.to_numpy()], y=chart["Revenue"][complete].to_numpy(), marker='o', label="Revenue")
+        if "Forecast" in chart:
+            partial = chart["Partial"].to_numpy(dtype=bool)
+            if partial.any():
+                ax.plot(x[partial], chart["Revenue"].to_numpy()[partial], "o", markerfacecolor="none", color=ax.lines[0].get_color(), label="Partial month")
+            future = chart["Forecast"].notna().to_numpy()
+            ax.plot(x[future], chart["Forecast"].to_numpy()[future], "--", marker='o', color="tab:orange", label=f"Forecast ({chart.attrs.get('model', 'model')})")
+            ax.fill_between(x[future], chart["Lower"].to_numpy()[future], chart["Upper"].to_numpy()[future], color="tab:orange", alpha=0.2, label="80% band")
+            ax.legend(loc="best")
+        ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter(params["formatter"]))
+        plt.title(params["title"])
+        plt.xticks(x, chart.index, rotation=45)
+        plt.ylim(0, np.nanmax(chart.reindex(columns=["Revenue", "Upper"]).to_numpy(dtype=float)) * 1.1)
+        plt.ylabel("Total Revenue ($)")
+        plt.xlabel("Month")
+        plt.grid(True)
+        Plots._save(path, params)
+
+    # 2. Plot - Yearly Revenue
+    @staticmethod
+    def yearly_revenue_plot(yearly_revenue, path, params):
+        plt.figure(figsize=params["figsize"])
+        ax = sns.barplot(x=yearly_revenue.index, y=yearly_revenue.values)
+        ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter(params["formatter"]))
+        for i, value in enumerate(yearly_revenue.values):
+            plt.text(i, value + 1000, f'{value:,.0f}', ha='center', va='bottom', fontsize=10)
+        plt.title(params["title"])
+        plt.ylim(0, yearly_revenue.max() * 1.1)
+        plt.ylabel("Total Revenue ($)")
+        plt.xlabel("Year")
+        plt.grid(True)
+        Plots._save(path, params)
+
+    # 3. Plot - Top 10 Country by revenue
+    @staticmethod
+    def top_10_country_by_revenue(country_revenue, path, params):
+        plt.figure(figsize=params["figsize"])
+        ax = sns.barplot(x=country_revenue.index, y=country_revenue.values, hue=country_revenue.index)
+        ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter(params["formatter"]))
+        plt.ylim(0, country_revenue.max() * 1.1)
+        for i, value in enumerate(country_revenue.values):
+            plt.text(i, value + 1000, f'{value:,.0f}', ha='center', va='bottom', fontsize=10)
+        plt.title(params["title"])
+        plt.xlabel("Country")
+        plt.ylabel("Total Revenue ($)")
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        plt.grid(True)
+        Plots._save(path, params)
+
+    # 4. Plot - Top 10 Purchase
+    @staticmethod
+    def top_10_customer_by_purchase(purchase_by_custome, path, params):
+        purchase_by_custome = purchase_by_custome.reset_index()
+        plt.figure(figsize=params["figsize"])
+        ax = sns.barplot(x=purchase_by_custome["CustomerID"].astype(int).astype(str), y=purchase_by_custome["Revenue"], hue=purchase_by_custome["Country"])
+        ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter(params["formatter"]))
+        plt.ylim(0, purchase_by_custome["Revenue"].max() * 1.1 )
+        for i, value in enumerate(purchase_by_custome["Revenue"]):
+            plt.text(i, value + 1000, f'{value:,.0f}', ha='center', va='bottom', fontsize=10)
+        plt.title(params["title"])
+        plt.xlabel("Customer ID")
+        plt.ylabel("Total Purchase ($)")
+        plt.tight_layout()
+        plt.grid(True)
+        Plots._save(path, params)
+
+    # 5. Plot - Top 10 Country by No. of Customers
+    @staticmethod
+    def top_10_country_by_no_of_customers(customers_by_country, path, params):
+        plt.figure(figsize=params["figsize"])
+        ax = sns.barplot(x=customers_by_country.index, y=customers_by_country.values, hue=customers_by_country.index)
+        ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter(params["formatter"]))
+        plt.ylim(0, customers_by_country.values.max() * 1.1 )
+        for i, value in enumerate(customers_by_country.values):
+            plt.text(i, value + 1000, f'{value:,.0f}', ha='center', va='bottom', fontsize=10)
+        plt.grid(True)
+        plt.ylabel("No. of Customers")
+        plt.xlabel("Country")
+        plt.title(params["title"])
+        plt.tight_layout()
+        Plots._save(path, params)
+
+    # 6. Plot - Quantity VS Revenue for Top 10 Countries
+    @staticmethod
+    def top_10_country_qunatity_vs_revenue(quantity_revenue, path, params):
+        plt.figure(figsize=params["figsize"])
+        #the markers are rasterized in vector charts, one image instead of a path per point
+        ax = sns.scatterplot(data=quantity_revenue, x="Quantity", y="Revenue", hue="Country", rasterized=True)
+        ax.get_xaxis().set_major_formatter(mpl.ticker.StrMethodFormatter(params["formatter"]))
+        ax.get_yaxis().set_major_formatter(mpl.ticker.StrMethodFormatter(params["formatter"]))
+        plt.grid(True)
+        plt.ylabel("Revenue")
+        plt.xlabel("Quantity")
+        plt.title(params["title"])
+        plt.legend(title="Country", bbox_to_anchor=(1.05, 1), loc='upper left')
+        plt.tight_layout()
+        Plots._save(path, params)
+
+    # 7. Plot - Top 10 Products by Quantity Sold
+    @staticmethod
+    def top_10_product_by_quantity_sold(product_quantity, path, params):
+        plt.figure(figsize=params["figsize"])
+        ax = sns.barplot(y=product_quantity.index.str.slice(0,12) + "..", x=product_quantity.values, hue=product_quantity.index)
+        ax.get_xaxis().set_major_formatter(mpl.ticker.StrMethodFormatter(params["formatter"]))
+        plt.xlim(0, product_quantity.values.max() * 1.1 )
+        for i, value in enumerate(product_quantity.values):
+            plt.text(value + 1, i, f'{value:,.0f}', ha='left', va='center', fontsize=10)
+        plt.grid(True)
+        plt.xlabel("Quantity")
+        plt.ylabel("Product Description")
+        plt.title(params["title"])
+        plt.tight_layout()
+        Plots._save(path, params)
+
+    # 8. Plot - Correlation Matrix
+    @staticmethod
+    def correlation_matrix_heatmap(corr_df, path, params):
+        plt.figure(figsize=params["figsize"])
+        sns.heatmap(corr_df, annot=True, fmt=params["formatter"], cmap="crest")
+        plt.title(params["title"])
+        plt.tight_layout()
+        Plots._save(path, params)
+
+    # 9. Plot - Customers by RFM Segment
+    @staticmethod
+    def rfm_segments_plot(segments, path, params):
+        plt.figure(figsize=params["figsize"])
+        ax = sns.barplot(y=segments.index, x=segments["Customers"].values, hue=segments.index)
+        ax.get_xaxis().set_major_formatter(mpl.ticker.StrMethodFormatter(params["formatter"]))
+        plt.xlim(0, segments["Customers"].max() * 1.3)
+        for i, (customers, share) in enumerate(zip(segments["Customers"], segments["Revenue Share"])):
+            plt.text(customers, i, f' {customers:,.0f} ({share:.1f}% of revenue)', ha='left', va='center', fontsize=10)
+        plt.grid(True)
+        plt.xlabel("No. of Customers")
+        plt.ylabel("Segment")
+        plt.title(params["title"])
+        plt.tight_layout()
+        Plots._save(path, params)
+
+    # 10. Plot - Monthly Cohort Retention
+    @staticmethod
+    def cohort_retention_heatmap(retention, path, params):
+        plt.figure(figsize=params["figsize"])
+        #month 0 is always 100%, the colours are scaled to the later months
+        later = retention.iloc[:, 1:].max().max() if retention.shape[1] > 1 else 1
+        sns.heatmap(retention, annot=len(retention) <= 24, fmt=params["formatter"], annot_kws={"fontsize": 7}, cmap="crest", vmin=0, vmax=later if later > 0 else 1, mask=retention.isna(), cbar_kws={"format": mpl.ticker.PercentFormatter(1.0)})
+        plt.title(params["title"])
+        plt.tight_layout()
+        Plots._save(path, params)
@@ -1,41 +1,221 @@
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, KeepTogether, Image, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, KeepTogether, Image, Table, TableStyle, Flowable
+from reportlab.pdfgen.canvas import FILL_NON_ZERO
+from reportlab.lib.utils import ImageReader
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import inch
+import io
+import os
+import base64
 from datetime import datetime
 from Core.logger import *
+from Core.metrics import Metrics
+from Core.config import PRINT_DPI
 
 logger = Logger().setup_logs()
 
+#size the charts are shown at in the reports
+CHART_WIDTH, CHART_HEIGHT = 6.0 * inch, 3.5 * inch
+IMAGE_FORMATS = ["png", "jpeg"]
+#resampled charts kept for the later reports of the process
+CACHE_ENTRIES = 64
+
+#the header row and grid of every Level 1 table
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')
+])
+
+class VectorChart(Flowable):
+    """
+    A chart recorded by Core/vector.py, drawn with the canvas' own path
+    operators and stretched to the printed size like the PNG charts.
+    """
+    def __init__(self, drawing, width=CHART_WIDTH, height=CHART_HEIGHT):
+        super().__init__()
+        self.drawing = drawing
+        self.width = width
+        self.height = height
+        self._images = {}
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    @staticmethod
+    def _path(canvas, segments):
+        #segment codes as in matplotlib.path.Path, quadratic curves are raised to cubic ones
+        path = canvas.beginPath()
+        i, x, y = 0, 0, 0
+        while i < len(segments):
+            match segments[i]:
+                case 1:
+                    x, y = segments[i + 1:i + 3]
+                    path.moveTo(x, y)
+                    i += 3
+                case 2:
+                    x, y = segments[i + 1:i + 3]
+                    path.lineTo(x, y)
+                    i += 3
+                case 3:
+                    cx, cy, ex, ey = segments[i + 1:i + 5]
+                    path.curveTo(x + 2 / 3 * (cx - x), y + 2 / 3 * (cy - y), ex + 2 / 3 * (cx - ex), ey + 2 / 3 * (cy - ey), ex, ey)
+                    x, y = ex, ey
+                    i += 5
+                case 4:
+                    path.curveTo(*segments[i + 1:i + 7])
+                    x, y = segments[i + 5:i + 7]
+                    i += 7
+                case _:
+                    path.close()
+                    i += 1
+        return path
+
+    def _clip(self, canvas, clip):
+        rect, segments = clip
+        if rect is not None:
+            path = canvas.beginPath()
+            path.rect(*rect)
+            canvas.clipPath(path, stroke=0, fill=0)
+        if segments is not None:
+            canvas.clipPath(self._path(canvas, segments), stroke=0, fill=0, fillMode=FILL_NON_ZERO)
+
+    def draw(self):
+        canvas = self.canv
+        canvas.saveState()
+        canvas.scale(self.width / self.drawing.width, self.height / self.drawing.height)
+        for number, op in enumerate(self.drawing.ops):
+            canvas.saveState()
+            self._clip(canvas, op["clip"])
+            if "img" in op:
+                if number not in self._images:
+                    self._images[number] = ImageReader(io.BytesIO(base64.b64decode(op["img"])))
+                canvas.drawImage(self._images[number], op["x"], op["y"], op["w"], op["h"], mask="auto")
+            else:
+                if op["fill"] is not None:
+                    canvas.setFillColorRGB(*op["fill"][:3], alpha=op["fill"][3])
+                if op["stroke"] is not None:
+                    canvas.setStrokeColorRGB(*op["stroke"][:3], alpha=op["stroke"][3])
+                    canvas.setLineWidth(op["lw"])
+                    canvas.setLineCap(op["cap"])
+                    canvas.setLineJoin(op["join"])
+                    if op["dash"] is not None:
+                        canvas.setDash(op["dash"][1], op["dash"][0])
+                canvas.drawPath(self._path(canvas, op["d"]), stroke=op["stroke"] is not None, fill=op["fill"] is not None, fillMode=FILL_NON_ZERO)
+            canvas.restoreState()
+        canvas.restoreState()
+
+
 class ReportGenerator:
-    def __init__(self, level, level_1_data="", level_2_data="", level_3_data=""):
-        self.styles = getSampleStyleSheet()
-        self.styles.add(ParagraphStyle(name="FooterStyle", parent=self.styles["Normal"], alignment=1))
-        self.styles.add(ParagraphStyle(name="TitleStyle", parent=self.styles["Title"], alignment=1))
-        self.styles.add(ParagraphStyle(name="InfoStyle", parent=self.styles["Normal"], alignment=1))
-        self.styles.add(ParagraphStyle(name='NormalStyle', parent=self.styles['BodyText'], alignment=0))
-        self.styles.add(ParagraphStyle(name='CenteredHeading1', parent=self.styles['Heading1'], alignment=1))
-        self.styles.add(ParagraphStyle(name='CenteredHeading2', parent=self.styles['Heading2'], alignment=0))
-        self._gen_report(level, level_1_data, level_2_data, level_3_data)
+    """
+    Writes the Level 1-4 PDF reports. The stylesheet is built once per
+    process. Each PNG chart is resampled to dpi at its printed size and
+    encoded once (flate-compressed PNG or JPEG at jpeg_quality), instead of
+    embedding the 300 dpi render; vector charts are drawn as they are.
+    Flowables are built anew for every report, doc.build lays them out in
+    place.
+    """
+    _styles = None
+    _footer_paragraph = None
+    #(path, mtime, size, dpi, format, quality) -> encoded image bytes
+    _images = {}
+
+    def __init__(self, level, level_1_data="", level_2_data="", level_3_data="", level_4_data="", output=None, dpi=PRINT_DPI, image_format="png", jpeg_quality=85):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"The chart image format is one of {', '.join(IMAGE_FORMATS)}, got: {image_format}")
+        self.styles = self.stylesheet()
+        self.dpi = dpi
+        self.image_format = image_format
+        self.jpeg_quality = jpeg_quality
+        self._gen_report(level, level_1_data, level_2_data, level_3_data, level_4_data, output or f"Level_{level}_Report.pdf")
+
+    @classmethod
+    def stylesheet(cls):
+        if cls._styles is None:
+            styles = getSampleStyleSheet()
+            styles.add(ParagraphStyle(name="FooterStyle", parent=styles["Normal"], alignment=1))
+            styles.add(ParagraphStyle(name="TitleStyle", parent=styles["Title"], alignment=1))
+            styles.add(ParagraphStyle(name="InfoStyle", parent=styles["Normal"], alignment=1))
+            styles.add(ParagraphStyle(name='NormalStyle', parent=styles['BodyText'], alignment=0))
+            styles.add(ParagraphStyle(name='CenteredHeading1', parent=styles['Heading1'], alignment=1))
+            styles.add(ParagraphStyle(name='CenteredHeading2', parent=styles['Heading2'], alignment=0))
+            cls._styles = styles
+        return cls._styles
+
+    @staticmethod
+    def _remember(cache, key, value):
+        #oldest entries go first
+        cache[key] = value
+        while len(cache) > CACHE_ENTRIES:
+            del cache[next(iter(cache))]
 
     def _footer(self, canvas, doc):
-        footer_para = Paragraph("Made with ♥ by Abhishek Tiwari", self.styles["FooterStyle"])
-        w, h = footer_para.wrap(doc.width, doc.bottomMargin)
-        footer_para.drawOn(canvas, doc.leftMargin, 10)
+        if ReportGenerator._footer_paragraph is None:
+            footer_para = Paragraph("Made with ♥ by Abhishek Tiwari", self.styles["FooterStyle"])
+            footer_para.wrap(doc.width, doc.bottomMargin)
+            ReportGenerator._footer_paragraph = footer_para
+        ReportGenerator._footer_paragraph.drawOn(canvas, doc.leftMargin, 10)
+
+    def chart_flowable(self, chart):
+        #a PNG path, or a ChartDrawing of the vector format
+        if isinstance(chart, str):
+            return self.chart_image(chart)
+        return VectorChart(chart)
+
+    def chart_image(self, path):
+        """
+        The chart at path as an Image flowable of the printed size. dpi 0
+        embeds the file as it is.
+        """
+        if not self.dpi:
+            return Image(path, width=CHART_WIDTH, height=CHART_HEIGHT)
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, self.dpi, self.image_format, self.jpeg_quality)
+        data = ReportGenerator._images.get(key)
+        if data is None:
+            with Metrics.span("pdf:image", path=path, dpi=self.dpi, format=self.image_format):
+                data = self._resample(path)
+            self._remember(ReportGenerator._images, key, data)
+        return Image(io.BytesIO(data), width=CHART_WIDTH, height=CHART_HEIGHT)
+
+    def _resample(self, path):
+        from PIL import Image as PILImage
+        size = (round(CHART_WIDTH / inch * self.dpi), round(CHART_HEIGHT / inch * self.dpi))
+        with PILImage.open(path) as chart:
+            chart.load()
+            if chart.mode in ("RGBA", "LA", "P"):
+                #the charts are opaque, flattening them onto white spares reportlab a soft mask per image
+                chart = chart.convert("RGBA")
+                flat = PILImage.new("RGB", chart.size, "white")
+                flat.paste(chart, mask=chart.getchannel("A"))
+                chart = flat
+            else:
+                chart = chart.convert("RGB")
+        if chart.width > size[0] and chart.height > size[1]:
+            chart = chart.resize(size, PILImage.LANCZOS)
+        buffer = io.BytesIO()
+        if self.image_format == "jpeg":
+            #JPEG data is embedded as it is (DCTDecode)
+            chart.save(buffer, "JPEG", quality=self.jpeg_quality, optimize=True)
+        else:
+            #reportlab decodes the PNG and flate-compresses the pixels itself, so it is only stored fast here
+            chart.save(buffer, "PNG", compress_level=1)
+        return buffer.getvalue()
 
     def _title_page(self):
+        date = datetime.today().strftime('%B %d, %Y')
         story = []
         story.append(Spacer(1, 300))
         story.append(Paragraph("Data Analysis Report - Online Retail", self.styles["TitleStyle"]))
         story.append(Spacer(1, 6))
         story.append(Paragraph(f"Report Generated by: RetailApp Application", self.styles["InfoStyle"]))
         story.append(Spacer(1, 5))
-        story.append(Paragraph(f"Date: {datetime.today().strftime('%B %d, %Y')}", self.styles["InfoStyle"]))
+        story.append(Paragraph(f"Date: {date}", self.styles["InfoStyle"]))
         story.append(PageBreak())
         logger.info(f"Title Page Data Created for PDF.")
         return story
-    
+
     def _level_type(self,level):
         story = []
         match level:
@@ -45,9 +225,15 @@ class ReportGenerator:
                 story.append(Paragraph("LEVEL - 2 ANALYSIS", self.styles["CenteredHeading1"]))
             case 3:
                 story.append(Paragraph("LEVEL - 3 ANALYSIS", self.styles["CenteredHeading1"]))
+            case 4:
+                story.append(Paragraph("LEVEL - 4 ANALYSIS", self.styles["CenteredHeading1"]))
         return story
-        
-    
+
+    def _table(self, table_data, col_width):
+        table = Table(table_data, colWidths=col_width, hAlign="LEFT")
+        table.setStyle(TABLE_STYLE)
+        return table
+
     def _level_1_report(self, data):
         story = []
         story.append(Spacer(1, 6))
@@ -57,35 +243,17 @@ class ReportGenerator:
         #table - column desc
         story.append(Paragraph("Column Descriptions", self.styles["CenteredHeading2"]))
         story.append(Spacer(1, 6))
-        table_data = [["Column", "Description"]] 
+        table_data = [["Column", "Description"]]
         table_data += [[index, Paragraph(value, self.styles["NormalStyle"])] for index, value in data["column_descriptions"].items()]
-        col_width = [100, 400]
-        table = Table(table_data, colWidths=col_width, hAlign="LEFT")
-        table.setStyle(
-            TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')
-            ])
-        )
-        story.append(table)
+        story.append(self._table(table_data, [100, 400]))
         story.append(Spacer(1, 12))
 
         # data type table
         story.append(Paragraph("Column Data Types", self.styles["CenteredHeading2"]))
         story.append(Spacer(1, 6))
-        table_data_type = [["Column", "Type", "Data Type"]] 
+        table_data_type = [["Column", "Type", "Data Type"]]
         table_data_type += [[Paragraph(index, self.styles["NormalStyle"]), Paragraph(value[0], self.styles["NormalStyle"]), Paragraph(value[1], self.styles["NormalStyle"])] for index,value in data["data_types"].items()]
-        col_width_type = [100, 100, 100]
-        table_data_type = Table(table_data_type, colWidths=col_width_type, hAlign="LEFT")
-        table_data_type.setStyle(
-            TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')
-            ])
-        )
-        story.append(table_data_type)
+        story.append(self._table(table_data_type, [100, 100, 100]))
         story.append(Spacer(1, 12))
 
         #kpis
@@ -93,16 +261,7 @@ class ReportGenerator:
         story.append(Spacer(1, 6))
         table_data_kpi = [["Metric", "Value"]]
         table_data_kpi += [[Paragraph(index, self.styles["NormalStyle"]), Paragraph(value, self.styles["NormalStyle"])] for index, value in data["kpis"].items()]
-        col_width_kpi= [100, 100]
-        table_data_kpi = Table(table_data_kpi, colWidths=col_width_kpi, hAlign="LEFT")
-        table_data_kpi.setStyle(
-            TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold')
-            ])
-        )
-        story.append(table_data_kpi)
+        story.append(self._table(table_data_kpi, [100, 100]))
         story.append(Spacer(1, 12))
 
         #interesting facts
@@ -113,75 +272,113 @@ class ReportGenerator:
             story.append(Spacer(1, 1))
         logger.info(f"Level 1 Data Created for PDF.")
         return story
-    
-    def _level_2_report(self, data):
+
+    def _charts(self, level, data, plot_title):
         story = []
         story.append(Spacer(1, 12))
-        plot_title = {
-            "monthly_revenue_plot": "Monthly Revenue Trend",
-            "yearly_revenue_plot": "Yearly Revenue Trend",
-            "top_10_country_by_revenue": "Top 10 Countries by Revenue",
-            "top_10_customer_by_purchase": "Top 10 Customer by Purchase by Country"
-        }
         for key, title in plot_title.items():
-            if key in data:
+            if data.get(key) is not None:
                 block = KeepTogether([
                     Paragraph(f"{title}", self.styles["CenteredHeading2"]),
                     Spacer(1, 6),
-                    Image(data[key], width=6.0*inch, height=3.5*inch),
+                    self.chart_flowable(data[key]),
                     Spacer(1, 12)
                 ])
                 story.append(block)
-        logger.info(f"Level 2 Data Created for PDF.")
+        logger.info(f"Level {level} Data Created for PDF.")
         return story
-    
-    def _level_3_report(self, data):
+
+    def _level_2_report(self, data):
+        plot_title = {
+            "monthly_revenue_plot": "Monthly Revenue Trend",
+            "yearly_revenue_plot": "Yearly Revenue Trend",
+            "top_10_country_by_revenue": "Top 10 Countries by Revenue",
+            "top_10_customer_by_purchase": "Top 10 Customer by Purchase by Country"
+        }
+        story = self._charts(2, data, plot_title)
+        if "forecast_facts" in data:
+            story += self._forecast(data)
+        return story
+
+    def _forecast(self, data):
         story = []
+        story.append(Paragraph("Revenue Forecast", self.styles["CenteredHeading2"]))
+        story.append(Spacer(1, 6))
+        header, *rows = data["forecast_table"]
+        table_data = [header] + [[Paragraph(value, self.styles["NormalStyle"]) for value in row] for row in rows]
+        story.append(self._table(table_data, [120, 105, 55, 75, 140]))
         story.append(Spacer(1, 12))
+        for fact in data["forecast_facts"].values():
+            story.append(Paragraph(f"• {fact}", self.styles["NormalStyle"]))
+            story.append(Spacer(1, 1))
+        return story
+
+    def _level_3_report(self, data):
         plot_title = {
             "top_10_country_by_no_of_customers": "Top 10 Country by No. of Customers",
             "top_10_country_qunatity_vs_revenue": "Quantity VS Revenue for Top 10 Countries",
             "top_10_product_by_quantity_sold": "Top 10 Products by Quantity Sold",
             "correlation_matrix_heatmap": "Correlation Matrix"
         }
-        for key, title in plot_title.items():
-            if key in data:
-                block = KeepTogether([
-                    Paragraph(f"{title}", self.styles["CenteredHeading2"]),
-                    Spacer(1, 6),
-                    Image(data[key], width=6.0*inch, height=3.5*inch),
-                    Spacer(1, 12)
-                ])
-                story.append(block)
-        logger.info(f"Level 3 Data Created for PDF.")
+        story = self._charts(3, data, plot_title)
+        if "basket_facts" in data:
+            story += self._basket(data)
         return story
-        
-    
-    def _gen_report(self, level, level_1_data, level_2_data, level_3_data):
-        match level:
-            case 1:
-                story = self._title_page() + self._level_type(level) + self._level_1_report(level_1_data)
-                doc = SimpleDocTemplate("Level_1_Report.pdf", pagesize=A4)
-                logger.info(f"Writing Level 1 Data to PDF.")
-                doc.build(story, onFirstPage=self._footer, onLaterPages=self._footer)
-            case 2:
-                story = self._title_page() + self._level_type(level) + self._level_1_report(level_1_data) + self._level_2_report(level_2_data)
-                doc = SimpleDocTemplate("Level_2_Report.pdf", pagesize=A4)
-                logger.info(f"Writing Level  Data to PDF.")
-                doc.build(story, onFirstPage=self._footer, onLaterPages=self._footer)
-            case 3:
-                story = self._title_page() + self._level_type(level) + self._level_1_report(level_1_data) + self._level_2_report(level_2_data) + self._level_3_report(level_3_data)
-                doc = SimpleDocTemplate("Level_3_Report.pdf", pagesize=A4)
-                logger.info(f"Writing Level 3 Data to PDF.")
-                doc.build(story, onFirstPage=self._footer, onLaterPages=self._footer)
-
-
-
-
 
+    def _basket(self, data):
+        story = []
+        story.append(Paragraph("Frequently Bought Together", self.styles["CenteredHeading2"]))
+        story.append(Spacer(1, 6))
+        if data["basket_table"]:
+            header, *rows = data["basket_table"]
+            table_data = [header] + [[Paragraph(value, self.styles["NormalStyle"]) for value in row] for row in rows]
+            story.append(self._table(table_data, [135, 135, 55, 55, 65, 45]))
+            story.append(Spacer(1, 12))
+        for fact in data["basket_facts"].values():
+            story.append(Paragraph(f"• {fact}", self.styles["NormalStyle"]))
+            story.append(Spacer(1, 1))
+        return story
 
+    def _level_4_report(self, data):
+        plot_title = {
+            "rfm_segments_plot": "Customers by RFM Segment",
+            "cohort_retention_heatmap": "Monthly Cohort Retention"
+        }
+        return self._segments(data) + self._charts(4, data, plot_title)
 
+    def _segments(self, data):
+        story = []
+        story.append(Spacer(1, 12))
+        story.append(Paragraph("Customer Segments (RFM)", self.styles["CenteredHeading2"]))
+        story.append(Spacer(1, 6))
+        header, *rows = data["segment_table"]
+        table_data = [header] + [[Paragraph(value, self.styles["NormalStyle"]) for value in row] for row in rows]
+        story.append(self._table(table_data, [95, 65, 55, 65, 60, 85, 65]))
+        story.append(Spacer(1, 12))
+        for fact in data["customer_facts"].values():
+            story.append(Paragraph(f"• {fact}", self.styles["NormalStyle"]))
+            story.append(Spacer(1, 1))
+        return story
 
 
-        
-        
+    def _gen_report(self, level, level_1_data, level_2_data, level_3_data, level_4_data, output):
+        with Metrics.span(f"pdf:level_{level}"):
+            with Metrics.span("pdf:story"):
+                match level:
+                    case 1:
+                        story = self._title_page() + self._level_type(level) + self._level_1_report(level_1_data)
+                    case 2:
+                        story = self._title_page() + self._level_type(level) + self._level_1_report(level_1_data) + self._level_2_report(level_2_data)
+                    case 3:
+                        story = self._title_page() + self._level_type(level) + self._level_1_report(level_1_data) + self._level_2_report(level_2_data) + self._level_3_report(level_3_data)
+                    case 4:
+                        story = self._title_page() + self._level_type(level) + self._level_1_report(level_1_data) + self._level_2_report(level_2_data) + self._level_3_report(level_3_data) + self._level_4_report(level_4_data)
+                    case _:
+                        return
+            #output is a path, or a binary file object such as the report server's buffers
+            if isinstance(output, str):
+                os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+            doc = SimpleDocTemplate(output, pagesize=A4)
+            logger.info(f"Writing Level {level} Data to PDF {output if isinstance(output, str) else 'in memory'}.")
+            with Metrics.span("pdf:build"):
+                doc.build(story, onFirstPage=self._footer, onLaterPages=self._footer)
@@ -0,0 +1,291 @@
+import io
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit
+import numpy as np
+from Core.logger import *
+from Core.metrics import Metrics
+from Core.plot_specs import LEVEL_2_PLOTS, LEVEL_3_PLOTS, plot_paths
+
+logger = Logger().setup_logs()
+
+CHARTS = LEVEL_2_PLOTS + LEVEL_3_PLOTS
+SERVER_PLOT_DIR = "./Data/Server"
+#latest requests per route kept for the latency percentiles and the recent throughput
+LATENCY_WINDOW = 4096
+RECENT_SECONDS = 60
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+def _prepare():
+    #imports the rendering stack once per worker, before the first request needs it
+    import Core.plots
+    import Core.report_generator
+    return os.getpid()
+
+
+def _chart_task(name, data, plot_dir, chart_format, plot_cache):
+    #runs on the worker pool; the PlotCache directory is safe to share between processes
+    from Core.plots import Plots
+    from Core.plot_cache import PlotCache
+    with Metrics.span(f"serve:chart:{name}", rows=len(data), emit=False) as record:
+        path = plot_paths([name], plot_dir)[name]
+        if os.path.exists(path):
+            #a failed render must not leave the previous file to be served
+            os.remove(path)
+        chart = Plots.render({name: data}, workers=1, cache=PlotCache() if plot_cache else None, plot_dir=plot_dir, chart_format=chart_format)[name]
+        if isinstance(chart, str) and not os.path.exists(chart):
+            chart = None
+    return chart, record
+
+
+def _report_task(level, data, pdf_options):
+    from Core.report_generator import ReportGenerator
+    with Metrics.span(f"serve:level_{level}", emit=False) as record:
+        buffer = io.BytesIO()
+        ReportGenerator(level, *data, output=buffer, **pdf_options)
+    return buffer.getvalue(), record
+
+
+def _json_default(value):
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+class ReportServer:
+    """
+    Long-running local HTTP service over one loader. The dataset is read,
+    cleaned and aggregated once at startup and kept warm, so a request only
+    pays for what it renders:
+
+        GET /kpis                       KPI facts and the Level 1 figures, JSON
+        GET /charts/<chart name>.png    one chart
+        GET /reports/level_<1-3>.pdf    a full report
+        GET /metrics                    latency and throughput per route, JSON
+
+    Charts and PDFs are rendered on a pool of worker processes, matplotlib
+    and ReportGenerator's shared caches are not thread-safe; with a single
+    worker they run one at a time on the data thread instead. A result is
+    computed once: concurrent identical requests wait for the same render,
+    later ones are served from memory.
+    """
+    def __init__(self, loader, host="127.0.0.1", port=8080, workers=None, pdf_options=None, plot_dir=SERVER_PLOT_DIR):
+        self.loader = loader
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.pdf_options = pdf_options or {}
+        self.plot_dir = plot_dir
+        self.pool = None
+        self.data_thread = None
+        #key -> task of every result computed or in progress
+        self.results = {}
+        self.routes = {}
+        self.coalesced = 0
+        self.hits = 0
+        self.in_flight = 0
+        #open client connections, closed on stop so that keep-alive clients do not hold the shutdown
+        self.connections = set()
+        self.started = None
+        self.ready = threading.Event()
+        self._stop = None
+        self._loop = None
+
+    def _start_pools(self):
+        if self.workers > 1:
+            try:
+                #the workers are forked before any other thread is started
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+                for _ in range(self.workers):
+                    self.pool.submit(_prepare)
+            except (OSError, RuntimeError) as e:
+                logger.error(f"Process pool for the report server unavailable, rendering on the data thread: {e}")
+                self.pool = None
+        #the loader's pipeline is only touched from this thread
+        self.data_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-data")
+        if self.pool is None:
+            self.pool = self.data_thread
+
+    def warm(self):
+        """
+        Pulls everything the endpoints read from the loader, on the data thread.
+        """
+        with Metrics.span("serve:warm"):
+            self.level_1 = self.loader._handle_level_1()
+            self.kpis = self.loader.pipeline["kpis"]
+            self.plot_data = self.loader.plot_data(CHARTS)
+            #the basket rules of the Level 3 report, when the loader holds the transactions
+            self.basket = self.loader.pipeline["basket_rules"] if "market_basket" in self.loader.pipeline else {}
+            #the revenue forecast table of the Level 2 report
+            self.forecast = self.loader.pipeline["level_2"]
+        logger.info("Report Server Data Loaded and Aggregated.")
+
+    async def _run(self, function, *args):
+        result, record = await asyncio.get_running_loop().run_in_executor(self.pool, function, *args)
+        Metrics.record(record)
+        return result
+
+    async def resource(self, key, compute):
+        """
+        The result of compute() for key, computed once. Concurrent callers
+        share the render in progress, which a disconnecting client does not
+        cancel; a failed render is dropped so that it can be retried.
+        """
+        task = self.results.get(key)
+        if task is None:
+            task = self.results[key] = asyncio.ensure_future(compute())
+            task.add_done_callback(lambda done: self.results.pop(key, None) if done.cancelled() or done.exception() is not None else None)
+        elif task.done():
+            self.hits += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def chart(self, name, chart_format="png"):
+        async def compute():
+            chart = await self._run(_chart_task, name, self.plot_data[name], self.plot_dir, chart_format, self.loader.plot_cache is not None)
+            if chart is None:
+                raise RuntimeError(f"The chart {name} could not be rendered")
+            return chart
+        return await self.resource(("chart", name, chart_format), compute)
+
+    async def report(self, level):
+        async def compute():
+            names = LEVEL_2_PLOTS + (LEVEL_3_PLOTS if level == 3 else []) if level > 1 else []
+            charts = dict(zip(names, await asyncio.gather(*(self.chart(name, self.loader.chart_format) for name in names))))
+            data = [self.level_1, {**{name: charts[name] for name in LEVEL_2_PLOTS if name in charts}, **self.forecast}, {**{name: charts[name] for name in LEVEL_3_PLOTS if name in charts}, **self.basket}]
+            return await self._run(_report_task, level, data[:level], self.pdf_options)
+        return await self.resource(("report", level), compute)
+
+    def kpi_json(self):
+        facts = {**vars(self.kpis), "per_cancel_order": self.kpis.per_cancel_order, "per_cancel_customer": self.kpis.per_cancel_customer, "avg_revenue": self.kpis.avg_revenue}
+        return json.dumps({"scope": self.loader.scope, "facts": facts, "kpis": self.level_1["kpis"], "interesting_facts": self.level_1["interesting_facts"]}, default=_json_default).encode()
+
+    def metrics_json(self):
+        now = time.time()
+        uptime = now - self.started
+        routes = {}
+        for route, stats in self.routes.items():
+            latencies = np.array([latency for _, latency in stats["latencies"]]) * 1000
+            recent = sum(finished > now - RECENT_SECONDS for finished, _ in stats["latencies"])
+            routes[route] = {
+                "requests": stats["requests"],
+                "errors": stats["errors"],
+                "throughput_rps": round(stats["requests"] / uptime, 3),
+                "recent_rps": round(recent / min(RECENT_SECONDS, uptime), 3),
+                **{f"p{q}_ms": round(float(np.percentile(latencies, q)), 3) for q in (50, 95, 99)},
+                "max_ms": round(float(latencies.max()), 3)
+            }
+        return json.dumps({
+            "uptime_s": round(uptime, 3),
+            "requests": sum(stats["requests"] for stats in self.routes.values()),
+            "in_flight": self.in_flight,
+            "coalesced": self.coalesced,
+            "memory_hits": self.hits,
+            "workers": self.workers,
+            "routes": routes
+        }).encode()
+
+    async def dispatch(self, method, path):
+        #(route label, status, content type, body)
+        if method not in ("GET", "HEAD"):
+            return "other", 405, "application/json", b'{"error": "only GET is supported"}'
+        match path.strip("/").split("/"):
+            case [""]:
+                index = {"kpis": "/kpis", "charts": [f"/charts/{name}.png" for name in CHARTS], "reports": [f"/reports/level_{level}.pdf" for level in (1, 2, 3)], "metrics": "/metrics"}
+                return "/", 200, "application/json", json.dumps(index).encode()
+            case ["kpis"]:
+                return "/kpis", 200, "application/json", self.kpi_json()
+            case ["metrics"]:
+                return "/metrics", 200, "application/json", self.metrics_json()
+            case ["charts", file] if file.removesuffix(".png") in CHARTS and file.endswith(".png"):
+                path = await self.chart(file.removesuffix(".png"))
+                with open(path, "rb") as chart:
+                    return "/charts", 200, "image/png", chart.read()
+            case ["reports", "level_1.pdf" | "level_2.pdf" | "level_3.pdf" as file]:
+                return f"/reports/{file}", 200, "application/pdf", await self.report(int(file[6]))
+            case _:
+                return "other", 404, "application/json", json.dumps({"error": f"no such resource: {path}"}).encode()
+
+    async def respond(self, method, target):
+        start = time.perf_counter()
+        self.in_flight += 1
+        try:
+            route, status, content_type, body = await self.dispatch(method, urlsplit(target).path)
+        except Exception as e:
+            logger.error(f"Report Server failed to serve {target}: {e}")
+            route, status, content_type, body = "error", 500, "application/json", json.dumps({"error": str(e)}).encode()
+        finally:
+            self.in_flight -= 1
+        stats = self.routes.setdefault(route, {"requests": 0, "errors": 0, "latencies": deque(maxlen=LATENCY_WINDOW)})
+        stats["requests"] += 1
+        stats["errors"] += status >= 500
+        stats["latencies"].append((time.time(), time.perf_counter() - start))
+        return status, content_type, body
+
+    async def handle(self, reader, writer):
+        #HTTP/1.1 with keep-alive, a request body is read and ignored
+        self.connections.add(writer)
+        try:
+            while request := await reader.readline():
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request.decode("latin-1").split()
+                    if int(headers.get("content-length", 0)):
+                        await reader.readexactly(int(headers["content-length"]))
+                except ValueError:
+                    writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    break
+                status, content_type, body = await self.respond(method, target)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                head = f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                writer.write(head.encode("latin-1") + (body if method != "HEAD" else b""))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._start_pools()
+        print("Loading the Data for the Report Server, Please Wait.")
+        await self._loop.run_in_executor(self.data_thread, self.warm)
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        self.started = time.time()
+        print(f"Serving the Reports at http://{self.host}:{self.port}/ with {self.workers} workers, Ctrl+C to stop.")
+        logger.info(f"Report Server listening on {self.host}:{self.port} with {self.workers} workers.")
+        self.ready.set()
+        async with server:
+            await self._stop.wait()
+            server.close()
+            for writer in list(self.connections):
+                writer.close()
+
+    def stop(self):
+        #from any thread
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("Stopped the Report Server.")
+        finally:
+            if self.pool is not None and self.pool is not self.data_thread:
+                self.pool.shutdown(cancel_futures=True)
+            if self.data_thread is not None:
+                self.data_thread.shutdown(cancel_futures=True)
+            logger.info("Report Server stopped.")
@@ -0,0 +1,136 @@
+import os
+import json
+import mmap
+import numpy as np
+import pandas as pd
+from pandas.arrays import BooleanArray, FloatingArray, IntegerArray
+from Core.logger import *
+
+logger = Logger().setup_logs()
+
+MAGIC = b"RDISNAP1"
+#every buffer starts on a cache line
+ALIGNMENT = 64
+SNAPSHOT_DIR = "./Data/Snapshots"
+#nullable columns, stored as their values and NA mask
+MASKED_ARRAYS = (IntegerArray, FloatingArray, BooleanArray)
+
+def _aligned(size):
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+class Snapshot:
+    """
+    Frames and arrays in one memory-mapped file, shared by worker processes
+    without pickling. An 8 byte magic and the length of a JSON header are
+    followed by the header and the raw buffers: numeric and datetime
+    columns as fixed-width arrays, nullable integers as values plus mask,
+    categorical and text columns as their codes plus a dictionary string
+    table (UTF-8 blob and offsets). Attaching maps the file read-only and
+    every column of frame() is a view on the mapping, so the pages are
+    shared through the page cache; only the string dictionaries are decoded
+    in each process.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a dataset snapshot: {path}")
+        size = int(np.frombuffer(self.buffer, np.uint64, 1, len(MAGIC))[0])
+        self.header = json.loads(self.buffer[len(MAGIC) + 8:len(MAGIC) + 8 + size])
+        self.start = _aligned(len(MAGIC) + 8 + size)
+
+    @staticmethod
+    def write(path, frames=None, arrays=None, attrs=None):
+        """
+        Writes the frames (name -> DataFrame), the 1-d arrays (name ->
+        ndarray) and JSON attrs to path, through a temporary file so that a
+        snapshot being attached is never seen half written.
+        """
+        blocks = []
+        end = 0
+        def block(values):
+            #[offset in the data section, length, dtype] of a buffer
+            nonlocal end
+            values = np.ascontiguousarray(values)
+            blocks.append((end, values))
+            spec = [end, len(values), values.dtype.str]
+            end += _aligned(values.nbytes)
+            return spec
+        def strings(values):
+            encoded = [str(value).encode("utf-8") for value in values]
+            return {"offsets": block(np.cumsum([0] + [len(value) for value in encoded], dtype=np.int64)), "data": block(np.frombuffer(b"".join(encoded), dtype=np.uint8))}
+        tables = {}
+        for name, frame in (frames or {}).items():
+            columns = []
+            for column, values in frame.items():
+                spec = {"name": column}
+                if isinstance(values.dtype, (pd.CategoricalDtype, pd.StringDtype)) or values.dtype == object:
+                    #text columns are dictionary encoded, and read back as categoricals
+                    values = values.astype("category") if not isinstance(values.dtype, pd.CategoricalDtype) else values
+                    categories = values.cat.categories
+                    text = categories.dtype == object or isinstance(categories.dtype, pd.StringDtype)
+                    spec.update(kind="category", codes=block(values.cat.codes.to_numpy()), ordered=bool(values.cat.ordered), categories_dtype=str(categories.dtype),
+                                categories=strings(categories) if text else block(categories.to_numpy()), text=text)
+                elif isinstance(values.array, MASKED_ARRAYS):
+                    spec.update(kind="masked", dtype=str(values.dtype), data=block(values.array._data), mask=block(values.array._mask))
+                else:
+                    spec.update(kind="array", data=block(values.to_numpy()))
+                columns.append(spec)
+            index = frame.index
+            tables[name] = {
+                "rows": len(frame),
+                "columns": columns,
+                "index": [index.start, index.stop, index.step] if isinstance(index, pd.RangeIndex) else block(index.to_numpy()),
+                "range_index": isinstance(index, pd.RangeIndex)
+            }
+        header = json.dumps({"tables": tables, "arrays": {name: block(values) for name, values in (arrays or {}).items()}, "attrs": attrs or {}}).encode("utf-8")
+        start = _aligned(len(MAGIC) + 8 + len(header))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(MAGIC + np.uint64(len(header)).tobytes() + header)
+            for offset, values in blocks:
+                file.seek(start + offset)
+                values.tofile(file)
+            file.truncate(start + end)
+        os.replace(temporary, path)
+        logger.info(f"Dataset snapshot of {', '.join(tables) or 'arrays'} written to {path} ({(start + end) / (1024 * 1024):,.2f} MB).")
+        return path
+
+    def _view(self, spec):
+        #a read-only array over the mapping, nothing is copied
+        offset, length, dtype = spec
+        return np.frombuffer(self.buffer, np.dtype(dtype), length, self.start + offset)
+
+    def _strings(self, spec):
+        offsets, data = self._view(spec["offsets"]).tolist(), self._view(spec["data"]).tobytes()
+        return [data[start:stop].decode("utf-8") for start, stop in zip(offsets[:-1], offsets[1:])]
+
+    def _column(self, spec):
+        match spec["kind"]:
+            case "category":
+                categories = self._strings(spec["categories"]) if spec["text"] else self._view(spec["categories"])
+                dtype = pd.CategoricalDtype(pd.Index(categories, dtype=spec["categories_dtype"]), ordered=spec["ordered"])
+                return pd.Categorical.from_codes(self._view(spec["codes"]), dtype=dtype, validate=False)
+            case "masked":
+                array_type = pd.api.types.pandas_dtype(spec["dtype"]).construct_array_type()
+                return array_type(self._view(spec["data"]), self._view(spec["mask"]))
+            case _:
+                return self._view(spec["data"])
+
+    def frame(self, name):
+        """
+        The DataFrame name as a read-only view on the mapping.
+        """
+        table = self.header["tables"][name]
+        index = pd.RangeIndex(*table["index"]) if table["range_index"] else pd.Index(self._view(table["index"]), copy=False)
+        return pd.DataFrame({spec["name"]: self._column(spec) for spec in table["columns"]}, index=index, copy=False)
+
+    def array(self, name):
+        return self._view(self.header["arrays"][name])
+
+    @property
+    def attrs(self):
+        return self.header["attrs"]
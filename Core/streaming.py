@@ -0,0 +1,211 @@
+import sys
+from dataclasses import replace
+import numpy as np
+import pandas as pd
+from Core.logger import *
+from Core.utils import *
+from Core.cache import DataCache
+from Core.data_loader import DataLoader, EXCHANGE_RATE
+from Core.aggregation import ReportFacts, CORR_COLUMNS
+from Core.density import QUANTITY_LIMIT, REVENUE_LIMIT, grid_cells
+from Core.sketches import KpiSketches
+from Core.metrics import Metrics
+
+logger = Logger().setup_logs()
+
+COLUMNS = ['InvoiceNo', 'StockCode', 'Description', 'Quantity', 'InvoiceDate', 'UnitPrice', 'CustomerID', 'Country']
+
+class PartialAggregates:
+    """
+    Mergeable summary of a slice of the transactions: sums, counts, per-key
+    maps and distinct-key sets, plus a bounded per-country sample of points
+    and one point per occupied density cell for the scatter plot. Merging two partials gives the same result as
+    aggregating their rows together.
+    """
+    sum_fields = ["month_revenue", "year_revenue", "country_revenue", "customer_revenue",
+                  "country_rows", "product_rows", "country_filtered_revenue"]
+
+    def __init__(self, scatter_cap=5000, approximate=False, exchange_rate=EXCHANGE_RATE):
+        self.scatter_cap = scatter_cap
+        self.exchange_rate = exchange_rate
+        #approximate mode keeps fixed-size sketches instead of the distinct-key sets
+        self.approximate = approximate
+        self.sketches = KpiSketches() if approximate else None
+        self.raw_rows = 0
+        self.rows = 0
+        self.total_revenue = 0.0
+        self.raw_invoices = set()
+        self.raw_customers = set()
+        self.invoices = set()
+        self.customers = set()
+        for field in self.sum_fields:
+            setattr(self, field, None)
+        #centered moments of Quantity / Revenue / UnitPrice for the correlation matrix
+        self.moment_n = 0
+        self.moment_mean = np.zeros(len(CORR_COLUMNS))
+        self.moment_cross = np.zeros((len(CORR_COLUMNS), len(CORR_COLUMNS)))
+        self.sample = None
+        self.last_date = None
+        #one point per (Country, density cell), so the sample's outliers are never lost
+        self.cells = None
+
+    @classmethod
+    def from_chunk(cls, raw, scatter_cap=5000, rng=None, approximate=False, exchange_rate=EXCHANGE_RATE):
+        rng = rng or np.random.default_rng()
+        part = cls(scatter_cap, approximate, exchange_rate)
+        part.raw_rows = len(raw)
+        #same rules as the in-memory loader
+        df = DataLoader.add_features(DataLoader.clean(raw), exchange_rate)
+        part.rows = len(df)
+        part.total_revenue = float(df["Revenue"].sum())
+        part.last_date = df["InvoiceDate"].max() if part.rows else None
+        if approximate:
+            part.sketches.update(raw, df)
+        else:
+            part.raw_invoices = set(raw["InvoiceNo"].dropna().unique())
+            part.raw_customers = set(raw["CustomerID"].dropna().unique())
+            part.invoices = set(df["InvoiceNo"].unique())
+            part.customers = set(df["CustomerID"].unique())
+        part.month_revenue = df.groupby('Month')['Revenue'].sum()
+        part.year_revenue = df.groupby('Year')['Revenue'].sum()
+        part.country_revenue = df.groupby('Country')['Revenue'].sum()
+        part.customer_revenue = df.groupby(['CustomerID', 'Country'])['Revenue'].sum()
+        #rows without a Country survive cleaning and count as one more country, as in memory
+        part.country_rows = df.groupby("Country", dropna=False)["CustomerID"].count()
+        part.product_rows = df.groupby("Description")["Quantity"].count()
+        filtered = df[(df["Quantity"] < QUANTITY_LIMIT) & (df["Revenue"] < REVENUE_LIMIT)]
+        part.country_filtered_revenue = filtered.groupby("Country")["Revenue"].sum()
+        #bottom-k sampling on a random key keeps the sample uniform and mergeable
+        sample = filtered[["Quantity", "Revenue", "Country"]].assign(_key=rng.random(len(filtered)))
+        part.sample = part._cap_sample(sample)
+        part.cells = sample.assign(_cell=grid_cells(sample["Quantity"], sample["Revenue"])).drop_duplicates(["Country", "_cell"])
+        if part.rows:
+            values = df[CORR_COLUMNS].to_numpy(dtype=float)
+            part.moment_n = len(values)
+            part.moment_mean = values.mean(axis=0)
+            centered = values - part.moment_mean
+            part.moment_cross = centered.T @ centered
+        return part
+
+    def _cap_sample(self, sample):
+        if not self.scatter_cap:
+            return sample
+        return sample.sort_values("_key").groupby("Country", sort=False).head(self.scatter_cap)
+
+    def merge(self, other):
+        if other.exchange_rate != self.exchange_rate:
+            raise ValueError(f"Cannot merge aggregates converted at {other.exchange_rate} into aggregates converted at {self.exchange_rate}")
+        self.raw_rows += other.raw_rows
+        self.rows += other.rows
+        self.total_revenue += other.total_revenue
+        self.raw_invoices |= other.raw_invoices
+        self.raw_customers |= other.raw_customers
+        self.invoices |= other.invoices
+        self.customers |= other.customers
+        if self.sketches is not None and other.sketches is not None:
+            self.sketches.merge(other.sketches)
+        for field in self.sum_fields:
+            mine, theirs = getattr(self, field), getattr(other, field)
+            if mine is None:
+                setattr(self, field, theirs)
+            elif theirs is not None:
+                setattr(self, field, mine.add(theirs, fill_value=0))
+        if other.sample is not None:
+            self.sample = other.sample if self.sample is None else self._cap_sample(pd.concat([self.sample, other.sample]))
+        if other.cells is not None:
+            self.cells = other.cells if self.cells is None else pd.concat([self.cells, other.cells]).drop_duplicates(["Country", "_cell"])
+        dates = [date for date in (self.last_date, other.last_date) if date is not None]
+        self.last_date = max(dates) if dates else None
+        #pairwise merge of centered moments (Chan et al.)
+        n = self.moment_n + other.moment_n
+        if other.moment_n:
+            delta = other.moment_mean - self.moment_mean
+            self.moment_cross = self.moment_cross + other.moment_cross + np.outer(delta, delta) * self.moment_n * other.moment_n / n
+            self.moment_mean = self.moment_mean + delta * other.moment_n / n
+            self.moment_n = n
+        return self
+
+    def facts(self):
+        top_countries = self.country_filtered_revenue.nlargest(10).index
+        sample = self.sample
+        if self.cells is not None and self.scatter_cap:
+            #the random key identifies a row, a point both sampled and a cell's representative is drawn once
+            sample = pd.concat([sample, self.cells.drop(columns="_cell")]).drop_duplicates("_key")
+        sample = sample[sample["Country"].isin(top_countries)]
+        countries = self.country_rows[self.country_rows.index.notna()]
+        facts = ReportFacts(
+            unclean_total_transaction=len(self.raw_invoices),
+            total_transaction=len(self.invoices),
+            total_revenue=self.total_revenue,
+            unclean_unique_customers=len(self.raw_customers),
+            unique_customers=len(self.customers),
+            num_countries=len(self.country_rows),
+            top_product=self.product_rows.idxmax(),
+            top_country_customers=countries.idxmax(),
+            monthly_revenue=ReportFacts.period_labels(self.month_revenue.sort_index()),
+            yearly_revenue=ReportFacts.period_labels(self.year_revenue.sort_index()),
+            country_revenue=self.country_revenue.sort_values(ascending=False).head(10),
+            customer_revenue=self.customer_revenue.rename("Revenue").sort_values(ascending=False).head(10),
+            customers_by_country=countries.astype(int).sort_values(ascending=False).head(10),
+            product_quantity=self.product_rows.astype(int).nlargest(10),
+            quantity_revenue=sample.drop(columns="_key").sort_index(),
+            correlation=ReportFacts.correlation_from_moments(self.moment_cross),
+            last_date=self.last_date
+        )
+        if self.approximate:
+            facts = replace(facts, **self.sketches.estimates())
+        return facts
+
+
+class StreamingLoader(DataLoader):
+    """
+    DataLoader for CSV / Parquet exports larger than memory. The file is read
+    once in bounded chunks; each chunk is cleaned, feature-added and folded
+    into PartialAggregates, whose ReportFacts then serve Level 1-3.
+    """
+    def __init__(self, path, chunksize=100_000, scatter_cap=5000, seed=0, plot_workers=None, plot_cache=True, approximate=False, exchange_rate=EXCHANGE_RATE, chart_format="png"):
+        self.path = path
+        self.chunksize = chunksize
+        self._setup_rendering(plot_workers, plot_cache, chart_format=chart_format)
+        self.scatter_cap = scatter_cap
+        self.aggregates = PartialAggregates(scatter_cap, approximate, exchange_rate)
+        self.fold_file(path, chunksize, self.aggregates, np.random.default_rng(seed))
+        self._setup_pipeline(self.aggregates.facts())
+
+    @classmethod
+    def fold_file(cls, path, chunksize, aggregates, rng):
+        chunks = rows = 0
+        try:
+            logger.info(f"Started Streaming Data File {path} in chunks of {chunksize} rows.")
+            with Metrics.span("stream", path=path) as record:
+                for chunk in cls.read_chunks(path, chunksize):
+                    if list(chunk.columns) != COLUMNS:
+                        print(f"The columns are missing or not in the expected order: {COLUMNS}")
+                        logger.error(f"The columns are missing or not in the expected order: {COLUMNS}")
+                        sys.exit(0)
+                    aggregates.merge(PartialAggregates.from_chunk(chunk, aggregates.scatter_cap, rng, aggregates.approximate, aggregates.exchange_rate))
+                    chunks += 1
+                    rows += len(chunk)
+                record.update(rows=rows, chunks=chunks)
+        except (OSError, ValueError, ImportError) as e:
+            print(f"Got the Error while Streaming the Dataset from the File: {e}")
+            logger.error(f"Got the Error while Streaming the Dataset from the File: {e}")
+            sys.exit(1)
+        logger.info(f"Streamed {Utils.formater(rows)} rows in {chunks} chunks from {path}.")
+        return rows
+
+    @staticmethod
+    def read_chunks(path, chunksize):
+        if path.lower().endswith(".parquet"):
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+                yield DataCache.normalize(batch.to_pandas())
+        elif path.lower().endswith(".xlsx"):
+            #workbooks cannot be read in pieces, they form a single chunk
+            yield DataCache.normalize(pd.read_excel(path))
+        elif path.lower().endswith((".csv", ".csv.gz")):
+            text = {column: str for column in DataCache.text_columns}
+            for chunk in pd.read_csv(path, chunksize=chunksize, dtype={**text, "CustomerID": float}, parse_dates=["InvoiceDate"]):
+                yield DataCache.normalize(chunk)
+        else:
+            raise ValueError(f"Streaming supports .csv, .parquet and .xlsx files, got: {path}")
@@ -0,0 +1,172 @@
+import os
+import numpy as np
+import pandas as pd
+from Core.logger import *
+from Core.utils import *
+from Core.cache import DataCache
+
+logger = Logger().setup_logs()
+
+SIZES = {"10k": 10_000, "1M": 1_000_000, "50M": 50_000_000}
+
+#country share of the customers, close to the UCI workbook
+COUNTRIES = {
+    "United Kingdom": 0.82, "Germany": 0.03, "France": 0.025, "EIRE": 0.012, "Spain": 0.012,
+    "Netherlands": 0.01, "Belgium": 0.01, "Switzerland": 0.008, "Portugal": 0.008, "Australia": 0.006,
+    "Norway": 0.006, "Italy": 0.006, "Channel Islands": 0.005, "Finland": 0.005, "Cyprus": 0.004,
+    "Sweden": 0.004, "Austria": 0.004, "Denmark": 0.004, "Japan": 0.003, "Poland": 0.003,
+    "USA": 0.003, "Canada": 0.002, "Singapore": 0.002, "Iceland": 0.002, "Unspecified": 0.002
+}
+
+COLOURS = ["WHITE", "RED", "PINK", "BLUE", "GREEN", "IVORY", "BLACK", "CREAM", "GOLD", "SILVER", "PAISLEY", "SPOTTY"]
+STYLES = ["HANGING HEART", "VINTAGE", "RETROSPOT", "REGENCY", "JUMBO", "PARTY", "CHRISTMAS", "ROSE", "BIRD", "STAR", "LACE", "POLKADOT"]
+ITEMS = ["T-LIGHT HOLDER", "LUNCH BAG", "CAKE STAND", "MUG", "BUNTING", "NAPKINS", "DOORMAT", "CAKE CASES",
+         "PICNIC BASKET", "TEA CUP", "ALARM CLOCK", "WATER BOTTLE", "TIN", "CANDLE", "GIFT WRAP", "PHOTO FRAME",
+         "SHOPPER", "CUSHION COVER", "CHALKBOARD", "GARLAND", "TISSUES", "PURSE", "STORAGE JAR", "SIGN",
+         "NOTEBOOK", "PEG BAG", "BAKING SET", "PLATE", "BOWL", "LANTERN"]
+
+def parse_size(size):
+    """
+    "10k" / "1M" / "50M" / "2500" to a row count
+    """
+    size = str(size).strip()
+    if size in SIZES:
+        return SIZES[size]
+    units = {"k": 1_000, "K": 1_000, "m": 1_000_000, "M": 1_000_000}
+    if size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+class SyntheticRetail:
+    """
+    Deterministic generator of transactions in the Online Retail schema, for
+    benchmarks and offline runs. Invoices hold several lines and belong to one
+    customer and country; about 1.7% of invoices are cancellations (a "C"
+    prefix and negative quantities), a quarter have no CustomerID, product
+    popularity follows a Zipf law and a few lines carry a zero price, a
+    missing description or a bulk quantity. The same rows, seed and chunksize
+    always give the same data.
+    """
+    start = pd.Timestamp("2010-12-01 08:26")
+    end = pd.Timestamp("2011-12-09 12:50")
+    lines_per_invoice = 20
+    cancel_rate = 0.017
+    guest_rate = 0.25
+
+    def __init__(self, rows, seed=0, chunksize=1_000_000):
+        self.rows = parse_size(rows)
+        self.seed = seed
+        self.chunksize = chunksize
+        rng = np.random.default_rng([seed, 0])
+        #product catalog: stock code, description and list price
+        products = len(COLOURS) * len(STYLES) * len(ITEMS)
+        order = rng.permutation(products)
+        self.descriptions = np.array([f"{COLOURS[i % len(COLOURS)]} {STYLES[i // len(COLOURS) % len(STYLES)]} {ITEMS[i // (len(COLOURS) * len(STYLES))]}" for i in order], dtype=object)
+        suffix = np.where(rng.random(products) < 0.1, rng.choice(list("ABCDEFG"), products), "")
+        self.stock_codes = np.char.add((21000 + np.arange(products)).astype(str), suffix).astype(object)
+        self.prices = np.maximum(np.round(rng.lognormal(np.log(2.5), 0.9, products), 2), 0.01)
+        self.product_weights = self.zipf_weights(products, 0.7)
+        #customers: activity is skewed and each customer lives in one country
+        customers = max(100, self.rows // 125)
+        self.customer_ids = 12346 + rng.permutation(customers).astype(np.float64)
+        self.customer_weights = self.zipf_weights(customers, 0.8)
+        self.countries = np.array(list(COUNTRIES), dtype=object)
+        weights = np.array(list(COUNTRIES.values()))
+        self.country_weights = weights / weights.sum()
+        self.customer_countries = rng.choice(len(self.countries), customers, p=self.country_weights)
+
+    @staticmethod
+    def zipf_weights(size, exponent):
+        weights = 1.0 / np.arange(1, size + 1) ** exponent
+        return weights / weights.sum()
+
+    def chunks(self):
+        """
+        Yields the transactions as DataFrames of at most chunksize rows, with
+        the same column types as a normalized read of the workbook.
+        """
+        first_invoice = next_invoice = 536365
+        expected_invoices = max(1, self.rows // self.lines_per_invoice)
+        span = (self.end - self.start).total_seconds()
+        for index, offset in enumerate(range(0, self.rows, self.chunksize)):
+            rng = np.random.default_rng([self.seed, index + 1])
+            rows = min(self.chunksize, self.rows - offset)
+            #a new invoice starts on a line with probability 1 / lines_per_invoice
+            new = rng.random(rows) < 1 / self.lines_per_invoice
+            new[0] = True
+            invoice = next_invoice - 1 + np.cumsum(new)
+            next_invoice = int(invoice[-1]) + 1
+            local = invoice - invoice[0]
+            invoices = int(local[-1]) + 1
+            #per invoice attributes, broadcast to the lines
+            cancelled = (rng.random(invoices) < self.cancel_rate)[local]
+            guest = (rng.random(invoices) < self.guest_rate)[local]
+            customer = rng.choice(len(self.customer_ids), invoices, p=self.customer_weights)[local]
+            country = np.where(guest, rng.choice(len(self.countries), invoices, p=self.country_weights)[local], self.customer_countries[customer])
+            #invoice dates follow the invoice numbers, getting denser towards the end of the year
+            progress = np.minimum((invoice - first_invoice) / expected_invoices, 1.0) ** 0.85
+            seconds = progress * span + rng.random(invoices)[local] * 600
+            #line attributes
+            product = rng.choice(len(self.descriptions), rows, p=self.product_weights)
+            quantity = rng.geometric(0.12, rows)
+            bulk = rng.random(rows) < 0.01
+            quantity[bulk] *= rng.integers(10, 100, int(bulk.sum()))
+            outlier = rng.random(rows) < 1e-5
+            quantity[outlier] = rng.integers(1_000, 80_000, int(outlier.sum()))
+            quantity = np.where(cancelled, -quantity, quantity)
+            price = self.prices[product].copy()
+            missing = rng.random(rows) < 0.0027
+            price[missing | (rng.random(rows) < 0.001)] = 0.0
+            description = self.descriptions[product].copy()
+            description[missing] = None
+            customer_id = np.where(guest | missing, np.nan, self.customer_ids[customer])
+            invoice_no = invoice.astype(str).astype(object)
+            invoice_no[cancelled] = "C" + invoice_no[cancelled]
+            chunk = pd.DataFrame({
+                "InvoiceNo": invoice_no,
+                "StockCode": self.stock_codes[product],
+                "Description": description,
+                "Quantity": quantity.astype(np.int64),
+                "InvoiceDate": (self.start + pd.to_timedelta(seconds, unit="s")).floor("min"),
+                "UnitPrice": price,
+                "CustomerID": customer_id,
+                "Country": self.countries[country]
+            }, index=pd.RangeIndex(offset, offset + rows))
+            yield DataCache.normalize(chunk)
+
+    def frame(self):
+        return pd.concat(self.chunks())
+
+    def write(self, path):
+        """
+        Writes the transactions to a .parquet, .csv(.gz) or .xlsx file chunk by
+        chunk, through a temporary file so a partial file is never left behind.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        lower = path.lower()
+        if lower.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            writer = None
+            for chunk in self.chunks():
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp, table.schema)
+                writer.write_table(table.cast(writer.schema))
+            writer.close()
+        elif lower.endswith((".csv", ".csv.gz")):
+            for index, chunk in enumerate(self.chunks()):
+                chunk.to_csv(tmp, mode="w" if index == 0 else "a", header=index == 0, index=False, compression="gzip" if lower.endswith(".gz") else None)
+        elif lower.endswith(".xlsx"):
+            if self.rows >= 1_048_576:
+                raise ValueError(f"An excel sheet holds at most 1,048,575 rows, got {Utils.formater(self.rows)}")
+            #pandas picks the excel writer from the extension, which the temporary file lacks
+            with open(tmp, "wb") as file:
+                self.frame().to_excel(file, index=False, engine="openpyxl")
+        else:
+            raise ValueError(f"Synthetic data can be written to .parquet, .csv, .csv.gz or .xlsx files, got: {path}")
+        os.replace(tmp, path)
+        logger.info(f"Generated {Utils.formater(self.rows)} synthetic transactions to {path}.")
+        return path
@@ -17,4 +17,11 @@ class Utils:
         """
         adding comma format
         """
-        return f"{num:,}"
\ No newline at end of file
+        return f"{num:,}"
+
+    @staticmethod
+    def size_format(num_bytes):
+        """
+        bytes to a readable MB figure
+        """
+        return f"{num_bytes / (1024 * 1024):,.2f} MB"
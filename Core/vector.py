@@ -0,0 +1,141 @@
+import io
+import json
+import base64
+import hashlib
+import numpy as np
+import matplotlib as mpl
+from matplotlib import cbook
+from matplotlib.backend_bases import FigureCanvasBase, RendererBase, register_backend
+from matplotlib.backends.backend_mixed import MixedModeRenderer
+from matplotlib.path import Path
+from PIL import Image
+
+#plt.savefig(buffer, format=FORMAT) records the figure instead of rasterizing it
+FORMAT = "vector"
+
+CAPS = {"butt": 0, "round": 1, "projecting": 2}
+JOINS = {"miter": 0, "round": 1, "bevel": 2}
+
+class ChartDrawing:
+    """
+    A chart recorded as vector operations: filled / stroked paths, in points
+    with the origin at the lower left, and the images of rasterized artists.
+    Text is recorded as glyph outlines, so no font is needed to draw it. It
+    is serialized as compact JSON, which the plot cache stores and worker
+    processes send back, and drawn natively by ReportGenerator.
+    """
+    def __init__(self, width, height, ops):
+        self.width = width
+        self.height = height
+        self.ops = ops
+        self.data = json.dumps({"width": width, "height": height, "ops": ops}, separators=(",", ":")).encode()
+        self.digest = hashlib.sha256(self.data).hexdigest()
+
+    @classmethod
+    def from_bytes(cls, data):
+        drawing = json.loads(data)
+        return cls(drawing["width"], drawing["height"], drawing["ops"])
+
+    def __reduce__(self):
+        return (ChartDrawing.from_bytes, (self.data,))
+
+
+def segments(path, transform, clip=None, simplify=None):
+    #a path as a flat list: the code of every segment followed by its end (and control) points
+    flat = []
+    for points, code in path.iter_segments(transform, remove_nans=True, clip=clip, simplify=simplify, curves=True):
+        flat.append(int(code))
+        if code != Path.CLOSEPOLY:
+            flat.extend(np.round(points, 2).tolist())
+    return flat
+
+
+class VectorRenderer(RendererBase):
+    """
+    Records what a figure draws. Only paths and images are implemented:
+    matplotlib breaks text, markers, collections and meshes down into paths.
+    """
+    def __init__(self, width, height, image_dpi):
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.image_dpi = image_dpi
+        self.ops = []
+
+    def flipy(self):
+        return False
+
+    def get_canvas_width_height(self):
+        return self.width, self.height
+
+    def points_to_pixels(self, points):
+        #one unit is one point
+        return points
+
+    def option_image_nocomposite(self):
+        return not mpl.rcParams["image.composite_image"]
+
+    def _clip(self, gc):
+        rect = gc.get_clip_rectangle()
+        path, affine = gc.get_clip_path()
+        return [np.round(rect.bounds, 2).tolist() if rect is not None else None, segments(path, affine) if path is not None else None]
+
+    def draw_path(self, gc, path, transform, rgbFace=None):
+        stroke = list(gc.get_rgb()) if gc.get_linewidth() > 0 and gc.get_rgb() is not None else None
+        if stroke is not None and stroke[3] == 0:
+            stroke = None
+        fill = None
+        if rgbFace is not None:
+            alpha = gc.get_alpha() if gc.get_forced_alpha() else (rgbFace[3] if len(rgbFace) > 3 else 1.0)
+            fill = [*rgbFace[:3], alpha] if alpha > 0 else None
+        if stroke is None and fill is None:
+            return
+        #like the PDF backend, only unfilled paths are clipped to the canvas and simplified
+        clip = (0, 0, self.width, self.height) if fill is None else None
+        flat = segments(path, transform, clip, path.should_simplify and fill is None)
+        if not flat:
+            return
+        offset, dashes = gc.get_dashes()
+        self.ops.append({
+            "d": flat,
+            "fill": fill,
+            "stroke": stroke,
+            "lw": round(gc.get_linewidth(), 3),
+            "dash": [offset, list(dashes)] if dashes is not None and len(dashes) else None,
+            "cap": CAPS[gc.get_capstyle()],
+            "join": JOINS[gc.get_joinstyle()],
+            "clip": self._clip(gc)
+        })
+
+    def draw_image(self, gc, x, y, im, transform=None):
+        #the rasterized artists, im has its bottom row first
+        h, w = im.shape[:2]
+        if w == 0 or h == 0:
+            return
+        buffer = io.BytesIO()
+        Image.fromarray(np.ascontiguousarray(im[::-1])).save(buffer, "PNG")
+        self.ops.append({
+            "img": base64.b64encode(buffer.getvalue()).decode("ascii"),
+            "x": round(x, 2), "y": round(y, 2),
+            "w": round(72.0 * w / self.image_dpi, 2), "h": round(72.0 * h / self.image_dpi, 2),
+            "clip": self._clip(gc)
+        })
+
+
+class FigureCanvasVector(FigureCanvasBase):
+    filetypes = {FORMAT: "Chart recorded for the PDF reports"}
+
+    def print_vector(self, filename, *, bbox_inches_restore=None, **kwargs):
+        #the savefig dpi is the resolution of rasterized artists, the recording is in points
+        dpi = self.figure.dpi
+        self.figure.dpi = 72
+        width, height = self.figure.get_size_inches()
+        vector = VectorRenderer(width * 72, height * 72, dpi)
+        renderer = MixedModeRenderer(self.figure, width, height, dpi, vector, bbox_inches_restore=bbox_inches_restore)
+        self.figure.draw(renderer)
+        drawing = ChartDrawing(round(vector.width, 2), round(vector.height, 2), vector.ops)
+        with cbook.open_file_cm(filename, "wb") as file:
+            file.write(drawing.data)
+
+
+register_backend(FORMAT, FigureCanvasVector, "Chart recorded for the PDF reports")
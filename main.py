@@ -1,12 +1,99 @@
-from Core.data_loader import *
+import argparse
+import sys
 from Core.logger import *
-from Core.report_generator import ReportGenerator
+from Core.metrics import Metrics
+from Core.config import EXCHANGE_RATE, DATA_URL, PRINT_DPI
+from Core.plot_specs import LEVEL_2_PLOTS, LEVEL_3_PLOTS, LEVEL_4_PLOTS
 
 logger = Logger().setup_logs()
 
 class RetailApp:
-    def __init__(self):
-        self.choic_menu()
+    def __init__(self, rebuild_cache=False, stream=None, chunk_size=100_000, plot_workers=None, plot_cache=True, state=None, append=(), approximate=False, exchange_rate=EXCHANGE_RATE, metrics=False, profile=None, levels=None, countries=(), date_ranges=(), output=None, fan_out=(), top_countries=10, report_workers=None, data_url=DATA_URL, pdf_dpi=PRINT_DPI, pdf_image_format="png", jpeg_quality=85, chart_format="png", scatter_cap=5000, serve=None, host="127.0.0.1"):
+        self.rebuild_cache = rebuild_cache
+        self.stream = stream
+        self.state = state
+        self.append = append
+        self.approximate = approximate
+        self.exchange_rate = exchange_rate
+        self.chunk_size = chunk_size
+        self.plot_workers = plot_workers
+        self.plot_cache = plot_cache
+        self.metrics = metrics
+        self.profile = profile
+        self.levels = levels
+        self.countries = countries
+        self.date_ranges = date_ranges
+        self.output = output
+        self.fan_out = fan_out
+        self.top_countries = top_countries
+        self.report_workers = report_workers
+        self.data_url = data_url
+        self.chart_format = chart_format
+        self.scatter_cap = scatter_cap
+        self.serve = serve
+        self.host = host
+        self.pdf_options = {"dpi": pdf_dpi, "image_format": pdf_image_format, "jpeg_quality": jpeg_quality}
+        self.failed = []
+        Metrics.profile = profile is not None
+        #--levels and --serve run without the menu
+        if self.serve is not None:
+            self.run_server()
+        elif self.levels:
+            self.batch()
+        else:
+            self.choic_menu()
+        self._report_metrics()
+        if self.failed:
+            sys.exit(1)
+
+    def _report_metrics(self):
+        if self.metrics and Metrics.records:
+            print(Metrics.summary())
+        if self.profile:
+            slowest = Metrics.dump_profile(self.profile)
+            if slowest:
+                stage, seconds, stats = slowest
+                print(f"cProfile of the slowest stage {stage} ({seconds:.3f} s) written to {self.profile}.")
+                stats.sort_stats("cumulative").print_stats(15)
+
+    @Metrics.timed("load")
+    def _load_data(self):
+        if self.state or self.append:
+            from Core.incremental import IncrementalLoader
+            return IncrementalLoader(self.state or "./Data/State/aggregates.pkl", self.append, chunksize=self.chunk_size, plot_workers=self.plot_workers, plot_cache=self.plot_cache, approximate=self.approximate, exchange_rate=self.exchange_rate, chart_format=self.chart_format, scatter_cap=self.scatter_cap)
+        if self.stream:
+            from Core.streaming import StreamingLoader
+            return StreamingLoader(self.stream, chunksize=self.chunk_size, plot_workers=self.plot_workers, plot_cache=self.plot_cache, approximate=self.approximate, exchange_rate=self.exchange_rate, chart_format=self.chart_format, scatter_cap=self.scatter_cap)
+        #pandas and the loaders are only imported once a report is requested, not before the menu
+        from Core.data_loader import DataLoader
+        return DataLoader(rebuild_cache=self.rebuild_cache, plot_workers=self.plot_workers, plot_cache=self.plot_cache, approximate=self.approximate, exchange_rate=self.exchange_rate, data_url=self.data_url, chart_format=self.chart_format, scatter_cap=self.scatter_cap)
+
+    def _generate_report(self, level, *data):
+        #reportlab is only imported to write a report
+        from Core.report_generator import ReportGenerator
+        ReportGenerator(level, *data, **self.pdf_options)
+
+    def batch(self):
+        from Core.batch import BatchReports, ReportSlice
+        try:
+            slices = [ReportSlice.for_country(country) for country in self.countries] + [ReportSlice.for_dates(date_range) for date_range in self.date_ranges]
+            with Metrics.span("batch"):
+                reports = BatchReports(self._load_data(), self.levels, slices, self.output, self.fan_out, self.top_countries, self.report_workers, self.pdf_options)
+                written, self.failed = reports.run()
+        except ValueError as e:
+            print(f"Got Error in the batch options: {e}")
+            logger.error(f"Got Error in the batch options: {e}")
+            sys.exit(1)
+        logger.info(f"Batch generated {len(written)} reports, {len(self.failed)} datasets failed.")
+
+    def run_server(self):
+        from Core.server import ReportServer
+        try:
+            ReportServer(self._load_data(), self.host, self.serve, self.report_workers, self.pdf_options).run()
+        except OSError as e:
+            print(f"Got Error while Starting the Report Server: {e}")
+            logger.error(f"Got Error while Starting the Report Server: {e}")
+            sys.exit(1)
 
     def choic_menu(self):
         try:
@@ -24,30 +111,49 @@ class RetailApp:
                     case 1:
                         logger.info("Generating the Level 1 Report")
                         print("Generating the Level 1 Report, Please Wait.")
-                        data = DataLoader()
-                        level_1_data = data._handle_level_1()
-                        ReportGenerator(user_input, level_1_data)
-                        print("Generated the Level 1 Report, Please Check in the Application Folder.")
-                        logger.info("Generated the Level 1 Report")
+                        with Metrics.span("report:level_1"):
+                            data = self._load_data()
+                            level_1_data = data._handle_level_1()
+                            self._generate_report(user_input, level_1_data)
+                            print("Generated the Level 1 Report, Please Check in the Application Folder.")
+                            logger.info("Generated the Level 1 Report")
                     case 2:
                         logger.info("Generating the Level 2 Report")
                         print("Generating the Level 2 Report, Please Wait.")
-                        data = DataLoader()
-                        level_1_data = data._handle_level_1()
-                        level_2_data = data._handle_level_2()
-                        ReportGenerator(user_input, level_1_data, level_2_data)
-                        print("Generated the Level 2 Report, Please Check in the Application Folder.")
-                        logger.info("Generated the Level 2 Report")
+                        with Metrics.span("report:level_2"):
+                            data = self._load_data()
+                            level_1_data = data._handle_level_1()
+                            level_2_data = data._handle_level_2()
+                            self._generate_report(user_input, level_1_data, level_2_data)
+                            print("Generated the Level 2 Report, Please Check in the Application Folder.")
+                            logger.info("Generated the Level 2 Report")
                     case 3:
                         logger.info("Generating the Level 3 Report")
                         print("Generating the Level 3 Report, Please Wait.")
-                        data = DataLoader()
-                        level_1_data = data._handle_level_1()
-                        level_2_data = data._handle_level_2()
-                        level_3_data = data._handle_level_3()
-                        ReportGenerator(user_input, level_1_data, level_2_data, level_3_data)
-                        print("Generated the Level 3 Report, Please Check in the Application Folder.")
-                        logger.info("Generated the Level 3 Report")
+                        with Metrics.span("report:level_3"):
+                            data = self._load_data()
+                            level_1_data = data._handle_level_1()
+                            #all eight charts share one process pool
+                            data._render_plots(LEVEL_2_PLOTS + LEVEL_3_PLOTS)
+                            level_2_data = data._handle_level_2()
+                            level_3_data = data._handle_level_3()
+                            self._generate_report(user_input, level_1_data, level_2_data, level_3_data)
+                            print("Generated the Level 3 Report, Please Check in the Application Folder.")
+                            logger.info("Generated the Level 3 Report")
+                    case 4:
+                        logger.info("Generating the Level 4 Report")
+                        print("Generating the Level 4 Report, Please Wait.")
+                        with Metrics.span("report:level_4"):
+                            data = self._load_data()
+                            level_1_data = data._handle_level_1()
+                            if "customer_analytics" in data.pipeline:
+                                data._render_plots(LEVEL_2_PLOTS + LEVEL_3_PLOTS + LEVEL_4_PLOTS)
+                            level_4_data = data._handle_level_4()
+                            level_2_data = data._handle_level_2()
+                            level_3_data = data._handle_level_3()
+                            self._generate_report(user_input, level_1_data, level_2_data, level_3_data, level_4_data)
+                            print("Generated the Level 4 Report, Please Check in the Application Folder.")
+                            logger.info("Generated the Level 4 Report")
                     case _:
                         print("Closing the Application")
                         logger.info("Closing the Application")
@@ -60,4 +166,47 @@ class RetailApp:
 
 
 if __name__ == "__main__":
-    RetailApp()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Online Retail Analytics App")
+    parser.add_argument("--rebuild-cache", action="store_true", help="discard the cached dataset and re-read the excel file")
+    parser.add_argument("--stream", metavar="PATH", help="stream a CSV/Parquet transaction file in chunks instead of loading it into memory")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="rows per chunk in streaming mode")
+    parser.add_argument("--plot-workers", type=int, default=None, help="processes used to draw the charts (default: one per core, 1 draws in-process)")
+    parser.add_argument("--no-plot-cache", action="store_true", help="always redraw the charts instead of reusing unchanged ones")
+    parser.add_argument("--state", metavar="PATH", help="serve the reports from persisted incremental aggregates (default ./Data/State/aggregates.pkl with --append)")
+    parser.add_argument("--append", metavar="FILE", action="append", default=[], help="fold a file of new transactions into the incremental aggregates, can be repeated")
+    parser.add_argument("--approximate", action="store_true", help="estimate distinct counts and top items with mergeable sketches (marked with ≈)")
+    parser.add_argument("--data-url", default=DATA_URL, help="where the dataset zip is downloaded from when Data/Online Retail.xlsx is missing (default the UCI archive)")
+    parser.add_argument("--exchange-rate", type=float, default=EXCHANGE_RATE, help=f"GBP to USD rate used for the revenue figures (default {EXCHANGE_RATE})")
+    parser.add_argument("--metrics", action="store_true", help="print a per-stage timing and memory summary at the end of the run (always logged to Logs/metrics.jsonl)")
+    parser.add_argument("--profile", metavar="PATH", help="write a cProfile dump of the slowest stage to PATH (use --plot-workers 1 to profile single charts)")
+    parser.add_argument("--levels", type=int, nargs="+", choices=[1, 2, 3, 4], help="generate these report levels without the menu, e.g. --levels 1 2 3 (4 adds the RFM and cohort customer analytics)")
+    parser.add_argument("--country", metavar="NAME", action="append", default=[], help="with --levels, also report on this country only, can be repeated")
+    parser.add_argument("--date-range", metavar="START:END", action="append", default=[], help="with --levels, also report on this InvoiceDate range only (YYYY-MM-DD, both days included, either side can be open), can be repeated")
+    parser.add_argument("--fan-out", nargs="+", choices=["country", "quarter", "month"], default=[], help="with --levels, also report on every partition: the top countries by revenue, every quarter or every month")
+    parser.add_argument("--top-countries", type=int, default=10, help="countries reported by --fan-out country (default 10)")
+    parser.add_argument("--report-workers", type=int, default=None, help="processes generating the slice reports, or rendering for --serve (default: one per core, 1 runs them in-process)")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="keep the data loaded and serve KPIs, charts and reports over HTTP on PORT (0 picks a free port)")
+    parser.add_argument("--host", default="127.0.0.1", help="address --serve listens on (default 127.0.0.1)")
+    parser.add_argument("--chart-format", choices=["png", "vector"], default="png", help="png charts under Data/, or vector charts recorded in memory and drawn natively in the PDFs (scatter markers rasterized)")
+    parser.add_argument("--scatter-cap", type=int, default=5000, help="points per country drawn in the Quantity vs Revenue scatter besides one per occupied density cell (default 5000, 0 draws every point)")
+    parser.add_argument("--pdf-dpi", type=int, default=PRINT_DPI, help=f"resolution the charts are resampled to in the PDFs (default {PRINT_DPI}, 0 embeds the 300 dpi renders)")
+    parser.add_argument("--pdf-image-format", choices=["png", "jpeg"], default="png", help="encoding of the charts in the PDFs: lossless png (flate) or smaller jpeg (default png)")
+    parser.add_argument("--jpeg-quality", type=int, default=85, help="JPEG quality of the charts with --pdf-image-format jpeg (default 85)")
+    parser.add_argument("--output", metavar="PATTERN", help="with --levels, report path with {level} and {slice} placeholders (default Level_{level}_Report.pdf, Reports/{slice}/Level_{level}_Report.pdf for slices)")
+    args = parser.parse_args()
+    if (args.country or args.date_range or args.fan_out or args.output) and not args.levels:
+        parser.error("--country, --date-range, --fan-out and --output need --levels")
+    if args.levels and 4 in args.levels and (args.stream or args.state or args.append):
+        parser.error("--levels 4 needs every transaction in memory, it cannot be combined with --stream, --state or --append")
+    if args.serve is not None and args.levels:
+        parser.error("--serve and --levels cannot be combined")
+    if args.output:
+        try:
+            args.output.format(level=1, slice="all")
+        except (KeyError, IndexError, ValueError) as e:
+            parser.error(f"--output only takes the {{level}} and {{slice}} placeholders: {e}")
+    if args.scatter_cap < 0:
+        parser.error("--scatter-cap is 0 or more")
+    if args.pdf_dpi < 0 or not 1 <= args.jpeg_quality <= 95:
+        parser.error("--pdf-dpi is 0 or more and --jpeg-quality between 1 and 95")
+    RetailApp(rebuild_cache=args.rebuild_cache, stream=args.stream, chunk_size=args.chunk_size, plot_workers=args.plot_workers, plot_cache=not args.no_plot_cache, state=args.state, append=args.append, approximate=args.approximate, exchange_rate=args.exchange_rate, metrics=args.metrics, profile=args.profile, levels=args.levels, countries=args.country, date_ranges=args.date_range, output=args.output, fan_out=args.fan_out, top_countries=args.top_countries, report_workers=args.report_workers, data_url=args.data_url, pdf_dpi=args.pdf_dpi, pdf_image_format=args.pdf_image_format, jpeg_quality=args.jpeg_quality, chart_format=args.chart_format, scatter_cap=args.scatter_cap, serve=args.serve, host=args.host)
\ No newline at end of file